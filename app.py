@@ -1,5 +1,7 @@
 import sys
+from PySide6.QtCore import QTimer
 from PySide6.QtWidgets import QApplication
+from properties.profiler import startupProfiler
 from ui.loadingUI import LoadingScreen
 
 def start():
@@ -7,5 +9,7 @@ def start():
     
     loading_screen = LoadingScreen()
     loading_screen.show()
+    # Runs once the event loop has painted the loading screen
+    QTimer.singleShot(0, lambda: startupProfiler.mark('Loading screen shown'))
     
     app.exec()
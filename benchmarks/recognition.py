@@ -0,0 +1,262 @@
+"""
+Benchmark of the recognition pipeline, stage by stage.
+
+The corpus is a folder of full-window screenshots grouped by resolution and screen:
+
+    <corpus>/<width>x<height>/<screen>/*.png
+
+where <screen> is one of weapons, echoes, items, characters, achievements or
+menu (for the terminal and shell ROIs). Every ROI of the screen in
+gameROI.COORDINATES is cut from each screenshot, so the same corpus feeds the
+per-ROI stages and the full grid functions.
+
+Usage (from the repository root):
+
+    python -m benchmarks.recognition <corpus> [--repeat 3] [--output results.json]
+"""
+import sys
+import json
+import time
+import random
+import platform
+import argparse
+import string
+import tempfile
+import cv2
+import numpy as np
+from pathlib import Path
+
+from game.gameROI import Coordinates, COORDINATES, OCR_MODES
+from game.screenInfo import ScreenInfo
+from scraping.utils import (
+    itemsIndex, charactersIndex, weaponsIndex, echoesIndex,
+    convertToBlackWhite, imageToString, digitRecognizer,
+    FileBackend, setCaptureBackend
+)
+from scraping.utils.cache import OCRCache
+from scraping.utils.common import OCR_FULL
+from scraping.utils.replay import ReplayController
+from scraping.weaponsScraper import processGridItem
+from scraping.echoesScraper import processGridEcho, recognizeEcho
+from scraping.itemsScraper import processItem
+
+SCREENS = ('weapons', 'echoes', 'items', 'characters', 'achievements', 'menu')
+NAME_INDEXES = {
+    'characters': charactersIndex,
+    'weapons': weaponsIndex,
+    'echoes': echoesIndex,
+    'items': itemsIndex
+}
+
+# How the scrapers read each ROI: whether the crop is binarized first, and the imageToString options
+OCR_OPTIONS = {
+    'terminal': (False, {'divisor': ''}),
+    'shell': (True, {'allowedChars': string.digits}),
+    'weapons.page': (True, {'divisor': '', 'allowedChars': string.digits + '/'}),
+    'weapons.name': (True, {'divisor': '', 'bannedChars': ' '}),
+    'weapons.value': (True, {'divisor': '', 'allowedChars': string.digits}),
+    'weapons.level': (False, {'divisor': '', 'allowedChars': string.digits + '/'}),
+    'weapons.rank': (True, {'divisor': '', 'allowedChars': string.digits}),
+    'echoes.page': (False, {'allowedChars': string.digits + '/'}),
+    'echoes.echoCard': (False, {'divisor': '', 'bannedChars': ' +'}),
+    'echoes.fullStatsName': (True, {'allowedChars': string.ascii_letters}),
+    'echoes.fullStatsValue': (True, {'allowedChars': string.digits + '.%'}),
+    'echoes.sonata': (False, {'divisor': '', 'bannedChars': ' '}),
+    'items.info': (True, {'bannedChars': ' '}),
+    'characters.resonatorName': (True, {'divisor': '', 'bannedChars': ' '}),
+    'characters.resonatorLevel': (True, {'divisor': '', 'allowedChars': string.digits + '/'}),
+    'characters.weaponName': (True, {'bannedChars': ' '}),
+    'characters.weaponLevel': (True, {'divisor': '', 'allowedChars': string.digits + '/'}),
+    'characters.weaponRank': (True, {'divisor': '', 'allowedChars': string.digits}),
+    'characters.skillLevel': (True, {'divisor': '', 'allowedChars': string.digits}),
+    'characters.skillButton': (True, {}),
+    'characters.chainButton': (False, {'divisor': '', 'bannedChars': f'{string.punctuation} '}),
+    'achievements.status': (True, {})
+}
+
+def screenROIs(resolution: tuple[int, int], screen: str) -> dict[str, Coordinates]:
+    """ROIs (with a size) read on a screen, by dotted path."""
+    for sizes in COORDINATES.values():
+        if resolution in sizes:
+            data = sizes[resolution]
+            break
+    else:
+        return dict()
+
+    if screen == 'menu':
+        return {key: data[key] for key in ('terminal', 'shell')}
+    return {
+        f'{screen}.{key}': roi for key, roi in data.get(screen, {}).items()
+        if isinstance(roi, Coordinates) and roi.w and roi.h
+    }
+
+def crop(image: np.ndarray, roi: Coordinates) -> np.ndarray:
+    return image[int(roi.y):int(roi.y + roi.h), int(roi.x):int(roi.x + roi.w)]
+
+def loadCorpus(folder: Path) -> list[tuple[tuple[int, int], str, np.ndarray]]:
+    corpus = []
+    for resolutionFolder in sorted(Path(folder).iterdir()):
+        try:
+            resolution = tuple(int(size) for size in resolutionFolder.name.split('x'))
+        except ValueError:
+            continue
+        for screen in SCREENS:
+            for file in sorted((resolutionFolder / screen).glob('*.png')):
+                corpus.append((resolution, screen, cv2.imread(str(file), cv2.IMREAD_COLOR)))
+    return corpus
+
+def summarize(timings: list[float]) -> dict:
+    if not timings:
+        return {'count': 0}
+    total = sum(timings)
+    return {
+        'count': len(timings),
+        'p50': float(np.percentile(timings, 50)) * 1000,
+        'p95': float(np.percentile(timings, 95)) * 1000,
+        'mean': total / len(timings) * 1000,
+        'itemsPerSecond': len(timings) / total if total else None
+    }
+
+def measure(function, inputs: list[tuple], repeat: int, setup=None) -> dict:
+    """
+    Time `function(*args)` for every args of `inputs`, `repeat` times.
+
+    `setup(*args)` runs before each call, outside of the timing.
+    Latencies are in milliseconds.
+    """
+    timings = []
+    for _ in range(repeat):
+        for args in inputs:
+            if setup is not None:
+                setup(*args)
+            start = time.perf_counter()
+            function(*args)
+            timings.append(time.perf_counter() - start)
+    return summarize(timings)
+
+def peakRSS() -> int | None:
+    """Peak resident memory of the process in bytes, if the platform reports it."""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+    except ImportError:
+        pass
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return getattr(info, 'peak_wset', info.rss)
+    except ImportError:
+        return None
+
+def misspell(name: str, rand: random.Random) -> str:
+    """Replace one character, as a typical OCR error would."""
+    if len(name) < 2:
+        return name
+    index = rand.randrange(len(name))
+    return name[:index] + rand.choice('abcdefghijklmnopqrstuvwxyz') + name[index + 1:]
+
+def benchmarkROIs(corpus: list, repeat: int) -> tuple[dict, dict]:
+    crops = dict()
+    for resolution, screen, image in corpus:
+        for path, roi in screenROIs(resolution, screen).items():
+            crops.setdefault(path, []).append(crop(image, roi))
+
+    blackWhite, ocrText = dict(), dict()
+    for path, images in sorted(crops.items()):
+        blackWhite[path] = measure(convertToBlackWhite, [(image,) for image in images], repeat)
+        # Only the ROIs the scrapers OCR, prepared as they are, so the timing is the OCR alone
+        if path not in OCR_OPTIONS:
+            continue
+        binarize, options = OCR_OPTIONS[path]
+        options = {**options, 'mode': OCR_MODES.get(path, OCR_FULL)}
+        ocrText[path] = measure(
+            lambda image: imageToString(image, **options),
+            [(convertToBlackWhite(image) if binarize else image,) for image in images], repeat
+        )
+    return blackWhite, ocrText
+
+def benchmarkMatches(repeat: int, samples: int = 200) -> dict:
+    rand = random.Random(0)
+    results = dict()
+    for table, index in NAME_INDEXES.items():
+        if not index.words:
+            continue
+        queries = [(misspell(rand.choice(index.words), rand),) for _ in range(samples)]
+        results[table] = measure(lambda name: index.getMatches(name, 1, 0.9), queries, repeat)
+    return results
+
+def benchmarkGrids(corpus: list, repeat: int) -> dict:
+    folder = Path(tempfile.mkdtemp(prefix='kamera-benchmark-'))
+    # Cold cache and digit atlas for every call, the warm path is a dictionary lookup
+    cache = OCRCache(folder / 'ocr.sqlite')
+    controller = ReplayController()
+
+    def cells(screen: str) -> list[tuple]:
+        inputs = []
+        for resolution, cellScreen, image in corpus:
+            if cellScreen == screen:
+                rois = screenROIs(resolution, screen)
+                images = {path.split('.', 1)[1]: crop(image, roi) for path, roi in rois.items()}
+                inputs.append((image, images, ScreenInfo(*resolution)))
+        return inputs
+
+    def coldCache(image, images, screenInfo):
+        cache.clear()
+        # The digit atlas would otherwise answer every cell after the first ones
+        digitRecognizer.reset()
+        setCaptureBackend(FileBackend([image]))
+
+    def gridItem(image, images, screenInfo):
+        processGridItem(dict(), list(), images, screenInfo, cache)
+
+    def gridEcho(image, images, screenInfo):
+        _, job = processGridEcho(controller, screenInfo, images, cache)
+        if job is not None:
+            recognizeEcho(*job, screenInfo, cache)
+
+    def item(image, images, screenInfo):
+        processItem(folder, images, screenInfo, cache)
+
+    return {
+        'processGridItem': measure(gridItem, cells('weapons'), repeat, coldCache),
+        'processGridEcho': measure(gridEcho, cells('echoes'), repeat, coldCache),
+        'processItem': measure(item, cells('items'), repeat, coldCache)
+    }
+
+def main(argv: list[str] = None) -> None:
+    parser = argparse.ArgumentParser(description='Benchmark the recognition stages on a corpus of screenshots.')
+    parser.add_argument('corpus', type=Path, help='Folder of <width>x<height>/<screen>/*.png screenshots')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs over the corpus for every stage')
+    parser.add_argument('--output', type=Path, help='JSON file of the results, printed when omitted')
+    args = parser.parse_args(argv)
+
+    corpus = loadCorpus(args.corpus)
+    blackWhite, ocrText = benchmarkROIs(corpus, args.repeat)
+    results = {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'processor': platform.processor(),
+            'corpus': str(args.corpus),
+            'screenshots': len(corpus),
+            'repeat': args.repeat,
+            'date': time.strftime('%Y-%m-%dT%H:%M:%S')
+        },
+        'stages': {
+            'convertToBlackWhite': blackWhite,
+            'imageToString': ocrText,
+            'getMatches': benchmarkMatches(args.repeat),
+            **benchmarkGrids(corpus, args.repeat)
+        },
+        'peakRSS': peakRSS()
+    }
+
+    output = json.dumps(results, indent=4)
+    if args.output:
+        args.output.write_text(output, encoding='utf-8')
+    else:
+        print(output)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
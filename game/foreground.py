@@ -1,8 +1,13 @@
 import re
 import ctypes
 import logging
-import win32gui
-import win32con
+
+try:
+	import win32gui
+	import win32con
+except ImportError:
+	# Only replays (scraping.utils.replay) run without the Windows API
+	win32gui = win32con = None
 
 import pywinctl as pwc
 import pymonctl as pmc
@@ -22,7 +22,8 @@ COORDINATES = {
             "scroll": {
                 "page": Coordinates(y=-31.25),
                 "characters": Coordinates(y=-56),
-                "sonata": Coordinates(y=70)
+                "sonata": Coordinates(y=70),
+                "achievements": Coordinates(y=-20)
             },
             "scrapers": {
                 "weapons": Coordinates(81.5, 191.5),
@@ -30,6 +31,11 @@ COORDINATES = {
                 "devItems": Coordinates(81.5, 596.5),
                 "resources": Coordinates(81.5, 731.5),
             },
+            "thumbnail": {
+                "icon": Coordinates(8, 4, 135, 130),
+                "rarity": Coordinates(0, 166, 151, 15),
+                "level": Coordinates(20, 134, 111, 32)
+            },
             "items": {
                 "start": Coordinates(205, 122, 151, 181),
                 "info": Coordinates(1296, 114, 558, 278),
@@ -58,6 +64,19 @@ COORDINATES = {
                 "searchButton": Coordinates(629, 149),
                 "achievementsButton": Coordinates(1674, 790),
                 "achievementsTab": Coordinates(835, 570),
+                "offsets": {
+                    "row": Coordinates(y=135)
+                },
+                "list": Coordinates(390, 200, 1465, 820),
+                "rowName": Coordinates(545, 215, 900, 45),
+                "categoryPositions": [
+                    Coordinates(200, 260),
+                    Coordinates(200, 360),
+                    Coordinates(200, 460),
+                    Coordinates(200, 560),
+                    Coordinates(200, 660),
+                    Coordinates(200, 760)
+                ]
             },
             "characters": {
                 "offsets": {
@@ -67,6 +86,7 @@ COORDINATES = {
                 },
                 "leftSide": Coordinates(82, 191),
                 "rightSide": Coordinates(1814, 203.50),
+                "panel": Coordinates(150, 90, 420, 320),
                 "resonatorName": Coordinates(250, 110, 280, 50),
                 "resonatorLevel": Coordinates(180, 200, 135, 80),
                 "weaponName": Coordinates(257, 126, 273, 34),
@@ -107,7 +127,8 @@ COORDINATES = {
             "scroll": {
                 "page": Coordinates(y=-31.70),
                 "characters": Coordinates(y=-56),
-                "sonata": Coordinates(y=70)
+                "sonata": Coordinates(y=70),
+                "achievements": Coordinates(y=-20)
             },
             "scrapers": {
                 "weapons": Coordinates(71.5, 167),
@@ -115,6 +136,11 @@ COORDINATES = {
                 "devItems": Coordinates(71.5, 521),
                 "resources": Coordinates(71.5, 639),
             },
+            "thumbnail": {
+                "icon": Coordinates(7, 3, 116, 112),
+                "rarity": Coordinates(0, 149, 130, 13),
+                "level": Coordinates(17, 120, 96, 28)
+            },
             "items": {
                 "start": Coordinates(180, 104, 130, 162),
                 "info": Coordinates(1136, 154, 485, 240),
@@ -143,6 +169,19 @@ COORDINATES = {
                 "searchButton": Coordinates(550, 129),
                 "achievementsButton": Coordinates(1465, 690),
                 "achievementsTab": Coordinates(735, 570),
+                "offsets": {
+                    "row": Coordinates(y=118)
+                },
+                "list": Coordinates(341, 172, 1282, 720),
+                "rowName": Coordinates(477, 185, 788, 40),
+                "categoryPositions": [
+                    Coordinates(175, 228),
+                    Coordinates(175, 315.5),
+                    Coordinates(175, 403),
+                    Coordinates(175, 490.5),
+                    Coordinates(175, 578),
+                    Coordinates(175, 665.5)
+                ]
             },
             "characters": {
                 "offsets": {
@@ -152,6 +191,7 @@ COORDINATES = {
                 },
                 "leftSide": Coordinates(68, 167.5),
                 "rightSide": Coordinates(1586.5, 177.5),
+                "panel": Coordinates(130, 85, 380, 290),
                 "resonatorName": Coordinates(220, 102, 280, 50),
                 "resonatorLevel": Coordinates(160, 180, 135, 80),
                 "weaponName": Coordinates(225, 118, 240, 34),
@@ -180,4 +220,26 @@ COORDINATES = {
             }
         }
     }
-}
\ No newline at end of file
+}
+
+# OCR pipeline used for each ROI (see scraping.utils.common.imageToString).
+# ROIs not listed here use the full detection + recognition pipeline.
+OCR_MODES = {
+    "terminal": "line",
+    "shell": "digits",
+    "weapons.page": "digits",
+    "weapons.name": "line",
+    "weapons.value": "digits",
+    "weapons.level": "digits",
+    "weapons.rank": "digits",
+    "echoes.page": "digits",
+    "thumbnail.level": "digits",
+    "achievements.status": "line",
+    "characters.resonatorName": "line",
+    "characters.weaponName": "line",
+    "characters.weaponLevel": "digits",
+    "characters.weaponRank": "digits",
+    "characters.skillLevel": "digits",
+    "characters.skillButton": "line",
+    "characters.chainButton": "line",
+}
@@ -3,6 +3,7 @@ import logging
 from difflib import get_close_matches as getMatches
 
 from game.foreground import WindowManager
+from game.gameROI import OCR_MODES
 from scraping.utils.common import definedText
 from scraping.utils import (
     screenshot, imageToString
@@ -30,7 +31,7 @@ class MainMenuController:
                 screenInfo.monitor
             )
 
-            result = imageToString(image, '').lower()
+            result = imageToString(image, '', mode=OCR_MODES['terminal']).lower()
             logger.debug(f"Detected text from screenshot: '{result}'")
             
             return 'terminal' if getMatches(result, [definedText['PrefabTextItem_1547656443_Text']]) else False # MULTILANG
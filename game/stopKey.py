@@ -1,6 +1,17 @@
-import win32api
+import os
+import sys
+import time
+import signal
 import logging
 
+try:
+	import win32api
+except ImportError:
+	# Only replays (scraping.utils.replay) run without the Windows API
+	win32api = None
+
+from game.foreground import WindowManager
+
 logger = logging.getLogger('KeyPressChecker')
 
 # Constants
@@ -23,4 +34,27 @@ class KeyPressChecker:
 			return pressed
 		except Exception as e:
 			logger.error(f"Error checking key press state: {e}", exc_info=True)
-			return False
\ No newline at end of file
+			return False
+
+def needToStop(tPID, completeFLAG, stopFLAG = None):
+	"""
+	Kill the scraper process once the game leaves the foreground, the key is
+	pressed or `stopFLAG` is set (e.g. by closing the app), until
+	`completeFLAG` is set.
+
+	Runs in its own process, which only imports the game modules, not the
+	scrapers and their OCR engines.
+	"""
+	keyPress = KeyPressChecker()
+	gameManager = WindowManager()
+
+	while not completeFLAG.is_set():
+		# Check if the game is no longer in the foreground or if the key is pressed
+		if (stopFLAG is not None and stopFLAG.is_set()) or not gameManager.isForeground() or keyPress.isPressed():
+			try:
+				os.kill(tPID, signal.SIGTERM)
+				logger.debug("Terminated scraper process due to key press or game not in foreground.")
+			except Exception as e:
+				logger.error(f"Error terminating process: {e}", exc_info=True)
+			sys.exit(0)
+		time.sleep(.1)
@@ -1,14 +1,22 @@
+import sys
 import logging
 import multiprocessing
 from pathlib import Path
 from logging.handlers import TimedRotatingFileHandler
-from app import start
+from properties.profiler import startupProfiler
 
 def main():
+	# Every import from here on is timed
+	if '--profile-startup' in sys.argv:
+		sys.argv.remove('--profile-startup')
+		startupProfiler.enable()
+
 	configure_logging()
 	logger = logging.getLogger('WuWaInventoryKamera')
 	logger.info("WuWa Inventory Kamera initialized")
 	try:
+		# Imported here, as the multiprocessing children import this module as well
+		from app import start
 		start()
 	except Exception:
 		logger.critical("Main application crashed", exc_info=True)
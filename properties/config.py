@@ -2,16 +2,14 @@ import sys
 import json
 import string
 from pathlib import Path
-from rapidocr_onnxruntime import RapidOCR
 from qfluentwidgets import (
 	qconfig, QConfig, ConfigValidator,
-	ConfigItem, OptionsConfigItem, BoolValidator,
+	ConfigItem, OptionsConfigItem, RangeConfigItem, BoolValidator,
 	FolderValidator, OptionsValidator, RangeValidator,
 	Signal
 )
 
 basePATH: Path = Path(sys.executable if getattr(sys, 'frozen', False) else str()).parent
-ocr = RapidOCR()
 
 # Default values
 PROCESS_NAME = 'Client-Win64-Shipping.exe'
@@ -116,6 +114,12 @@ class Config(QConfig):
 	echoMinLevel = ConfigItem("Scanner", "EchoMinLevel", 0, RangeValidator(0, 25))
 	weaponsMinRarity = ConfigItem("Scanner", "WeaponsMinRarity", 1, RangeValidator(1, 5))
 	weaponsMinLevel = ConfigItem("Scanner", "WeaponsMinLevel", 1, RangeValidator(1, 90))
+	deltaScan = ConfigItem("Scanner", "DeltaScan", False, BoolValidator())
+	ocrWorkers = RangeConfigItem("Scanner", "OCRWorkers", 0, RangeValidator(0, 32))
+	achievementsMode = OptionsConfigItem("Scanner", "AchievementsMode", "Search", OptionsValidator(["Search", "List"]))
+
+	# Debug settings
+	recordScans = ConfigItem("Debug", "RecordScans", False, BoolValidator())
 
 # Application metadata
 HELP_URL = "https://discord.gg/y6b2kMqs"
@@ -0,0 +1,129 @@
+import sys
+import time
+import builtins
+import logging
+import threading
+import importlib.util
+from pathlib import Path
+
+logger = logging.getLogger('StartupProfiler')
+
+class ImportNode:
+	"""A module import, with the imports it triggered."""
+	__slots__ = ('name', 'seconds', 'children')
+
+	def __init__(self, name: str):
+		self.name = name
+		self.seconds = 0.
+		self.children = []
+
+	def selfSeconds(self) -> float:
+		"""Time spent in the module itself, its nested imports aside."""
+		return self.seconds - sum(child.seconds for child in self.children)
+
+class StartupProfiler:
+	"""
+	Times every module imported while enabled (`--profile-startup`), as a
+	tree of the imports each module triggered, along with milestones of the
+	startup (e.g. the first window shown).
+
+	Only the first import of a module is timed, the later ones being lookups
+	in `sys.modules`. The imports of other threads get a tree of their own.
+	"""
+
+	def __init__(self):
+		self.start = time.perf_counter()
+		self.root = ImportNode('<startup>')
+		self.marks = []
+		self._threads = threading.local()
+		self._import = None
+		self._lock = threading.Lock()
+
+	@property
+	def enabled(self) -> bool:
+		return self._import is not None
+
+	def enable(self) -> None:
+		if self._import is None:
+			self.start = time.perf_counter()
+			self._import = builtins.__import__
+			builtins.__import__ = self._timedImport
+
+	def disable(self) -> None:
+		if self._import is not None:
+			builtins.__import__ = self._import
+			self._import = None
+
+	def _stack(self) -> list[ImportNode]:
+		stack = getattr(self._threads, 'stack', None)
+		if stack is None:
+			if threading.current_thread() is threading.main_thread():
+				stack = [self.root]
+			else:
+				node = ImportNode(f'<thread {threading.current_thread().name}>')
+				with self._lock:
+					self.root.children.append(node)
+				stack = [node]
+			self._threads.stack = stack
+		return stack
+
+	def _timedImport(self, name, globals=None, locals=None, fromlist=(), level=0):
+		absolute = name
+		if level:
+			try:
+				absolute = importlib.util.resolve_name('.' * level + name, (globals or {}).get('__package__'))
+			except (ImportError, ValueError):
+				pass
+		if absolute in sys.modules:
+			return self._import(name, globals, locals, fromlist, level)
+
+		stack = self._stack()
+		node = ImportNode(absolute)
+		stack[-1].children.append(node)
+		stack.append(node)
+		start = time.perf_counter()
+		try:
+			return self._import(name, globals, locals, fromlist, level)
+		finally:
+			node.seconds = time.perf_counter() - start
+			stack.pop()
+
+	def mark(self, label: str) -> None:
+		"""Record a milestone of the startup, e.g. the first window shown."""
+		if self.enabled:
+			self.marks.append((label, time.perf_counter() - self.start))
+
+	def report(self, minSeconds: float = .001) -> str:
+		"""
+		Import tree, heaviest first, each line giving the cumulative and the
+		self time of the module. Imports under `minSeconds` are left out.
+		"""
+		lines = [f'Startup profile ({time.perf_counter() - self.start:.3f}s)']
+		lines.extend(f'  {seconds * 1000:9.1f} ms  {label}' for label, seconds in self.marks)
+		lines.append(f"  {'cumulative':>12} {'self':>12}  module")
+
+		def walk(node: ImportNode, depth: int) -> None:
+			for child in sorted(node.children, key=lambda child: child.seconds, reverse=True):
+				if child.seconds < minSeconds:
+					continue
+				lines.append(f"  {child.seconds * 1000:9.1f} ms {child.selfSeconds() * 1000:9.1f} ms  {'  ' * depth}{child.name}")
+				walk(child, depth + 1)
+
+		walk(self.root, 0)
+		return '\n'.join(lines)
+
+	def finish(self, path: Path) -> None:
+		"""Stop the profiling and write the report to `path`."""
+		if not self.enabled:
+			return
+		self.disable()
+		try:
+			path = Path(path)
+			path.parent.mkdir(parents=True, exist_ok=True)
+			with open(path, 'w', encoding='utf-8') as file:
+				file.write(self.report() + '\n')
+			logger.info(f'Startup profile written to {path}')
+		except OSError as e:
+			logger.error(f'Failed to write the startup profile: {e}', exc_info=True)
+
+startupProfiler = StartupProfiler()
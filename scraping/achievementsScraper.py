@@ -1,49 +1,160 @@
 import numpy as np
 
 from scraping.utils import (
-    achievementsID, definedText, copyToClipboard
+    achievementsID, definedText, copyToClipboard,
+    ocrCache, achievementsIndex, nameResolver,
+    getChannel
 )
 from scraping.utils import (
-    screenshot, imageToString, convertToBlackWhite,
+    screenshot, imageToString, imageToBoxes, convertToBlackWhite,
     WindowsInputController
 )
+from properties.config import cfg
 from game.screenInfo import ScreenInfo
+from game.gameROI import Coordinates, OCR_MODES
 
-def processAchievement(image: np.ndarray, screenInfo: ScreenInfo, achievementName: str, _cache: dict) -> str | None:
-    statusImage = image[screenInfo.achievements.status.y:screenInfo.achievements.status.y + screenInfo.achievements.status.h, screenInfo.achievements.status.x:screenInfo.achievements.status.x + screenInfo.achievements.status.w]
+# Screens read per category at most, in case the end of a list is never detected
+MAX_SCREENS = 60
+
+def isAchieved(statusText: str) -> bool:
+    return statusText == definedText['PrefabTextItem_128820487_Text'] or '/' in statusText # MULTILANG
+
+def processAchievement(statusImage: np.ndarray, screenInfo: ScreenInfo, achievementName: str, _cache: dict) -> str | None:
     statusImage = convertToBlackWhite(statusImage)
-    statusHash = hash(statusImage.tobytes())
+    statusHash = _cache.key('achievements.status', statusImage)
     if statusHash in _cache: statusText = _cache[statusHash]
     else:
-        statusText = imageToString(statusImage).lower()
+        statusText = imageToString(statusImage, mode=OCR_MODES['achievements.status']).lower()
         _cache[statusHash] = statusText
 
-    if statusText == definedText['PrefabTextItem_128820487_Text'] or '/' in statusText: # MULTILANG
+    if isAchieved(statusText):
         return achievementsID[achievementName]
     
     return None
 
-def achievementScraper(controller: WindowsInputController, screenInfo: ScreenInfo) -> list[str]:
-    achievements = []
-    _cache = dict()
+def readRows(image: np.ndarray, screenInfo: ScreenInfo) -> list[tuple[str, str]]:
+    """
+    Pair the names and statuses of the rows of a list screen.
+
+    The list scrolls by any amount, so the rows are found from the text boxes
+    detected over the whole list: every status is paired with the name line
+    at the height the row layout puts it, and the rows cut by the edges of the
+    list are left for the next screen.
+
+    Returns:
+        list[tuple[str, str]]: The OCR'd name and status of every row, top to bottom.
+    """
+    listRegion = screenInfo.achievements.list
+    name, status = screenInfo.achievements.rowName, screenInfo.achievements.status
+    # Where the centre of the name line sits relative to the centre of the status
+    nameOffset = (name.y + name.h / 2) - (status.y + status.h / 2)
+    tolerance = screenInfo.achievements.offsets.row.y / 4
+
+    names, statuses = [], []
+    for box, text in imageToBoxes(image):
+        if not text or box.y <= 1 or box.y + box.h >= listRegion.h - 1:
+            continue
+        centerX, centerY = listRegion.x + box.x + box.w / 2, box.y + box.h / 2
+        if name.x <= centerX <= name.x + name.w:
+            names.append((centerY, box.x, text))
+        elif status.x <= centerX <= status.x + status.w:
+            statuses.append((centerY, text))
 
-    controller.pressKey('esc', 1)
-    controller.leftClick(screenInfo.achievements.achievementsButton.x, screenInfo.achievements.achievementsButton.y, 1.2)
-    controller.leftClick(screenInfo.achievements.achievementsTab.x, screenInfo.achievements.achievementsTab.y, 1)
+    rows = dict()
+    for centerY, text in sorted(statuses):
+        target = centerY + nameOffset
+        line = [(x, nameText) for nameY, x, nameText in names if abs(nameY - target) <= tolerance]
+        if not line:
+            continue
+        # A name split in several boxes is joined back from left to right
+        nameText = ' '.join(nameText for _, nameText in sorted(line))
+        # A row showing several status boxes is achieved if any of them says so
+        if not isAchieved(rows.get(nameText, '')):
+            rows[nameText] = text.lower().replace(' ', '')
+    return list(rows.items())
 
+def processRows(image: np.ndarray, screenInfo: ScreenInfo, _cache: dict) -> tuple[list[str], tuple[str]]:
+    """
+    Read the rows of a list screen, the whole list going through a single
+    detection pass.
+
+    Returns:
+        tuple[list[str], tuple[str]]: The IDs of the achieved achievements, and the names of the screen.
+    """
+    listHash = _cache.key('achievements.list', image)
+    if listHash in _cache:
+        rows = _cache[listHash]
+    else:
+        rows = [
+            [nameResolver.resolve(nameText, achievementsIndex) or nameText, statusText]
+            for nameText, statusText in readRows(image, screenInfo)
+        ]
+        _cache[listHash] = rows
+
+    achieved = [achievementsID[nameText] for nameText, statusText in rows if nameText in achievementsID and isAchieved(statusText)]
+    return achieved, tuple(nameText for nameText, _ in rows)
+
+def searchAchievements(controller: WindowsInputController, screenInfo: ScreenInfo, _cache: dict) -> list[str]:
+    """Search every achievement by name, one at a time."""
+    achievements = []
     for achievementName in achievementsID:
         copyToClipboard(achievementName)
         controller.leftClick(screenInfo.achievements.searchBar.x, screenInfo.achievements.searchBar.y, .3)
         controller.hotKey('ctrl', 'v', waitTime=.3)
-        controller.leftClick(screenInfo.achievements.searchButton.x, screenInfo.achievements.searchButton.y, .6)
+        controller.leftClick(screenInfo.achievements.searchButton.x, screenInfo.achievements.searchButton.y, .6, region=screenInfo.achievements.status)
 
-        image = screenshot(width=screenInfo.width, height=screenInfo.height, monitor=screenInfo.monitor)
+        image = screenshot(screenInfo.achievements.status.x, screenInfo.achievements.status.y, screenInfo.achievements.status.w, screenInfo.achievements.status.h, monitor=screenInfo.monitor)
         achievement = processAchievement(image, screenInfo, achievementName, _cache)
         if achievement:
             achievements.append(achievement)
-        
-        controller.leftClick(screenInfo.achievements.searchButton.x, screenInfo.achievements.searchButton.y)
-    
-    controller.pressKey('esc', .5)
-    del _cache
-    return achievements
\ No newline at end of file
+
+        controller.leftClick(screenInfo.achievements.searchButton.x, screenInfo.achievements.searchButton.y, region=screenInfo.achievements.status)
+    return achievements
+
+def listAchievements(controller: WindowsInputController, screenInfo: ScreenInfo, _cache: dict) -> list[str]:
+    """
+    Open every category and scroll through its list, reading all the visible
+    rows of each screen at once. The screens overlap, the rows read twice
+    being merged by ID, and a category ends when scrolling no longer changes
+    the rows shown.
+    """
+    achievements = dict()
+    listRegion = screenInfo.achievements.list
+    categories = screenInfo.achievements.categoryPositions
+
+    for index, category in enumerate(categories):
+        controller.leftClick(category.x, category.y, 1, region=listRegion)
+
+        previous = None
+        for _ in range(MAX_SCREENS):
+            image = screenshot(listRegion.x, listRegion.y, listRegion.w, listRegion.h, monitor=screenInfo.monitor).copy()
+            achieved, signature = processRows(image, screenInfo, _cache)
+            if signature == previous:
+                break
+            previous = signature
+            achievements.update(dict.fromkeys(achieved))
+
+            controller.moveMouse(listRegion.x + listRegion.w / 2, listRegion.y + listRegion.h / 2, .1)
+            controller.mouseScroll(screenInfo.scroll.achievements.y, .6, region=listRegion)
+
+        getChannel().progress('achievements', index + 1, len(categories))
+
+    return list(achievements)
+
+def achievementScraper(controller: WindowsInputController, screenInfo: ScreenInfo) -> list[str]:
+    _cache = ocrCache
+
+    window = Coordinates(0, 0, screenInfo.width, screenInfo.height)
+
+    controller.pressKey('esc', 1, region=window)
+    controller.leftClick(screenInfo.achievements.achievementsButton.x, screenInfo.achievements.achievementsButton.y, 1.2, region=window)
+    controller.leftClick(screenInfo.achievements.achievementsTab.x, screenInfo.achievements.achievementsTab.y, 1, region=window)
+
+    if cfg.get(cfg.achievementsMode) == 'List':
+        achievements = listAchievements(controller, screenInfo, _cache)
+    else:
+        achievements = searchAchievements(controller, screenInfo, _cache)
+
+    controller.pressKey('esc', .5, region=window)
+    _cache.flush()
+    return achievements
@@ -1,16 +1,19 @@
-import time
 import string
 import logging
 import numpy as np
-from difflib import get_close_matches as getMatches
 from collections import defaultdict
 
-from scraping.utils import charactersID, weaponsID, definedText
 from scraping.utils import (
-    screenshot, convertToBlackWhite, imageToString,
+    charactersID, weaponsID, definedText, ocrCache,
+    charactersIndex, weaponsIndex, nameResolver
+)
+from scraping.utils import (
+    screenshot, screenshotRegions, convertToBlackWhite, imageToString,
+    imagesToStrings, imageToDigits, digitRecognizer,
     WindowsInputController
 )
 from game.screenInfo import ScreenInfo
+from game.gameROI import OCR_MODES
 from properties.config import cfg
 
 logger = logging.getLogger('CharacterScraper')
@@ -24,36 +27,64 @@ SKILL_LEGENDS = {
     4: 'intro'
 }
 ASCENSION_LEVELS = [20, 40, 50, 60, 70, 80, 90]
+# ROIs read from the screenshot of each section, the others interact with the game
+SECTION_ROIS = {
+    0: ('resonatorName', 'resonatorLevel'),
+    1: ('weaponName', 'weaponLevel', 'weaponRank')
+}
 
-def scrapeResonator(image: np.ndarray, screenInfo: ScreenInfo, characters: dict, _cache: dict) -> tuple[str, bool]:
-    resonatorNameImage = image[screenInfo.characters.resonatorName.y:screenInfo.characters.resonatorName.y + screenInfo.characters.resonatorName.h, screenInfo.characters.resonatorName.x:screenInfo.characters.resonatorName.x + screenInfo.characters.resonatorName.w]
+def resonatorIDFromName(resonatorName: str) -> str:
+    # Resolved on every read, the rover's name being a setting the cache doesn't depend on
+    if resonatorName == cfg.get(cfg.roverName).replace(' ', '').lower():
+        return '1502'
+    return charactersID.get(resonatorName, resonatorName)
+
+def scrapeResonator(images: dict[str, np.ndarray], screenInfo: ScreenInfo, characters: dict, _cache: dict) -> tuple[str, bool]:
+    resonatorNameImage = images['resonatorName']
     resonatorNameImage = convertToBlackWhite(resonatorNameImage)
-    resonatorNameHash = hash(resonatorNameImage.tobytes())
+    resonatorNameHash = _cache.key('characters.resonatorName', resonatorNameImage)
+
+    # The cache outlives the scan, so a known name is only a duplicate once it has been scanned
+    if resonatorNameHash in _cache and resonatorIDFromName(_cache[resonatorNameHash]) in characters:
+        return resonatorIDFromName(_cache[resonatorNameHash]), True
+
+    levelImage = images['resonatorLevel']
+    levelImage = convertToBlackWhite(levelImage)
+    levelHash = _cache.key('characters.resonatorLevel', levelImage)
+
+    levelKey = (screenInfo.width, screenInfo.height, 'characters.resonatorLevel')
+    pending = dict()
+    if resonatorNameHash not in _cache: pending['name'] = resonatorNameImage
+    texts = dict()
+    if levelHash not in _cache:
+        text = digitRecognizer.read(levelImage, levelKey, string.digits + '/')
+        if text is None: pending['level'] = levelImage
+        else: texts['level'] = text
+
+    texts.update(imagesToStrings(pending, {
+        'name': {'divisor': '', 'bannedChars': ' ', 'mode': OCR_MODES['characters.resonatorName']},
+        'level': {'divisor': '', 'allowedChars': string.digits + '/'}
+    }))
+    if 'level' in pending:
+        digitRecognizer.learn(levelImage, levelKey, texts['level'])
 
     if resonatorNameHash in _cache:
-        return None, True
+        resonatorName = _cache[resonatorNameHash]
     else:
-        resonatorName = imageToString(resonatorNameImage, '', bannedChars=' ').lower()
-    
-        result = getMatches(resonatorName, charactersID, 1, 0.9)
-        if result:
-            resonatorName = result[0]
-        
-        resonatorID = '1502' if resonatorName == cfg.get(cfg.roverName).replace(' ', '').lower() else charactersID.get(resonatorName, resonatorName)
-        _cache[resonatorNameHash] = resonatorID
+        resonatorName = texts['name'].lower()
 
+        resonatorName = nameResolver.resolve(resonatorName, charactersIndex) or resonatorName
+        _cache[resonatorNameHash] = resonatorName
+
+    resonatorID = resonatorIDFromName(resonatorName)
     if resonatorID in characters:
         return resonatorID, True
 
-    levelImage = image[screenInfo.characters.resonatorLevel.y:screenInfo.characters.resonatorLevel.y + screenInfo.characters.resonatorLevel.h, screenInfo.characters.resonatorLevel.x:screenInfo.characters.resonatorLevel.x + screenInfo.characters.resonatorLevel.w]
-    levelImage = convertToBlackWhite(levelImage)
-    levelHash = hash(levelImage.tobytes())
-
     if levelHash in _cache:
-        level = _cache[levelHash]
+        level = _cache[levelHash].split('/')
     else:
-        level = imageToString(levelImage, '', allowedChars=string.digits + '/').split('/')
-        _cache[levelHash] = level
+        level = texts['level'].split('/')
+        _cache[levelHash] = texts['level']
 
     try: ascensionLvl = ASCENSION_LEVELS.index(int(level[1]))
     except: ascensionLvl = 0
@@ -66,41 +97,70 @@ def scrapeResonator(image: np.ndarray, screenInfo: ScreenInfo, characters: dict,
 
     return resonatorID, False
 
-def scrapeWeapon(image: np.ndarray, screenInfo: ScreenInfo, characters: dict, resonatorID: str, _cache: dict):
-    weaponNameImage = image[screenInfo.characters.weaponName.y:screenInfo.characters.weaponName.y + screenInfo.characters.weaponName.h, screenInfo.characters.weaponName.x:screenInfo.characters.weaponName.x + screenInfo.characters.weaponName.w]
+def scrapeWeapon(images: dict[str, np.ndarray], screenInfo: ScreenInfo, characters: dict, resonatorID: str, _cache: dict):
+    weaponNameImage = images['weaponName']
     weaponNameImage = convertToBlackWhite(weaponNameImage)
-    weaponNameHash = hash(weaponNameImage.tobytes())
+    weaponNameHash = _cache.key('characters.weaponName', weaponNameImage)
+
+    levelImage = images['weaponLevel']
+    levelImage = convertToBlackWhite(levelImage)
+    levelHash = _cache.key('characters.weaponLevel', levelImage)
+
+    rankImage = images['weaponRank']
+    rankImage = convertToBlackWhite(rankImage)
+    rankHash = _cache.key('characters.weaponRank', rankImage)
+
+    pending = {
+        key: roiImage for key, roiImage, roiHash in (
+            ('name', weaponNameImage, weaponNameHash),
+            ('level', levelImage, levelHash),
+            ('rank', rankImage, rankHash)
+        ) if roiHash not in _cache
+    }
+    options = {
+        'name': {'bannedChars': ' ', 'mode': OCR_MODES['characters.weaponName']},
+        'level': {'divisor': '', 'allowedChars': string.digits + '/', 'mode': OCR_MODES['characters.weaponLevel']},
+        'rank': {'divisor': '', 'allowedChars': string.digits, 'mode': OCR_MODES['characters.weaponRank']}
+    }
+    digitKeys = {
+        'level': (screenInfo.width, screenInfo.height, 'characters.weaponLevel'),
+        'rank': (screenInfo.width, screenInfo.height, 'characters.weaponRank')
+    }
+
+    texts = dict()
+    for key, digitKey in digitKeys.items():
+        if key in pending:
+            text = digitRecognizer.read(pending[key], digitKey, options[key]['allowedChars'])
+            if text is not None:
+                texts[key] = text
+                del pending[key]
+
+    ocrTexts = imagesToStrings(pending, options)
+    for key, digitKey in digitKeys.items():
+        if key in pending:
+            digitRecognizer.learn(pending[key], digitKey, ocrTexts[key])
+    texts.update(ocrTexts)
 
     if weaponNameHash in _cache:
-        weaponID = _cache[weaponNameHash]
+        weaponName = _cache[weaponNameHash]
     else:
-        weaponName = imageToString(weaponNameImage, bannedChars=' ').lower()
-    
-        result = getMatches(weaponName, weaponsID, 1, 0.9)
-        if result:
-            weaponName = result[0]
-        
-        weaponID = weaponsID.get(weaponName, {'id': weaponName})['id']
-        _cache[weaponNameHash] = weaponID
+        weaponName = texts['name'].lower()
     
-    levelImage = image[screenInfo.characters.weaponLevel.y:screenInfo.characters.weaponLevel.y + screenInfo.characters.weaponLevel.h, screenInfo.characters.weaponLevel.x:screenInfo.characters.weaponLevel.x + screenInfo.characters.weaponLevel.w]
-    levelImage = convertToBlackWhite(levelImage)
-    levelHash = hash(levelImage.tobytes())
+        weaponName = nameResolver.resolve(weaponName, weaponsIndex) or weaponName
+        _cache[weaponNameHash] = weaponName
+
+    weaponID = weaponsID.get(weaponName, {'id': weaponName})['id']
     
     if levelHash in _cache:
-        level = _cache[levelHash]
+        level = _cache[levelHash].split('/')
     else:
-        level = imageToString(levelImage, '', allowedChars=string.digits + '/').split('/')
-        _cache[levelHash] = level
-    
-    rankImage = image[screenInfo.characters.weaponRank.y:screenInfo.characters.weaponRank.y + screenInfo.characters.weaponRank.h, screenInfo.characters.weaponRank.x:screenInfo.characters.weaponRank.x + screenInfo.characters.weaponRank.w]
-    rankImage = convertToBlackWhite(rankImage)
-    rankHash = hash(rankImage.tobytes())
+        level = texts['level'].split('/')
+        _cache[levelHash] = texts['level']
 
     if rankHash in _cache:
         rank = _cache[rankHash]
     else:
-        rank = imageToString(rankImage, '', allowedChars=string.digits)
+        rank = texts['rank']
         _cache[rankHash] = rank
 
     try:
@@ -113,41 +173,38 @@ def scrapeWeapon(image: np.ndarray, screenInfo: ScreenInfo, characters: dict, re
 
 def scrapeSkills(controller: WindowsInputController, screenInfo: ScreenInfo, characters: dict, resonatorID: str, _cache: dict):
 
-    controller.leftClick(screenInfo.characters.skillClick.x, screenInfo.characters.skillClick.y, .5)
+    controller.leftClick(screenInfo.characters.skillClick.x, screenInfo.characters.skillClick.y, .5, region=screenInfo.characters.skillLevel)
 
     for index, skills in enumerate(screenInfo.characters.skillPositions):
-        controller.leftClick(skills.x, skills.y)
-
-        image = screenshot(width=screenInfo.width, height=screenInfo.height, monitor=screenInfo.monitor, bw=True)
+        controller.leftClick(skills.x, skills.y, region=screenInfo.characters.skillLevel)
 
-        levelImage = image[screenInfo.characters.skillLevel.y:screenInfo.characters.skillLevel.y + screenInfo.characters.skillLevel.h, screenInfo.characters.skillLevel.x:screenInfo.characters.skillLevel.x + screenInfo.characters.skillLevel.w]
-        levelHash = hash(levelImage.tobytes())
+        levelImage = screenshot(screenInfo.characters.skillLevel.x, screenInfo.characters.skillLevel.y, screenInfo.characters.skillLevel.w, screenInfo.characters.skillLevel.h, monitor=screenInfo.monitor, bw=True)
+        levelHash = _cache.key('characters.skillLevel', levelImage)
         
         if levelHash in _cache:
             level = _cache[levelHash]
         else:
-            level = imageToString(levelImage, '', allowedChars=string.digits)
+            level = imageToDigits(levelImage, (screenInfo.width, screenInfo.height, 'characters.skillLevel'), mode=OCR_MODES['characters.skillLevel'])
             _cache[levelHash] = level
 
         try: level = int(level)
         except:
             level = 1
-            _cache[levelHash] = level
             logger.debug('Failed scraping the skill level')
 
         characters[resonatorID]['skills'][SKILL_LEGENDS[index]] = level
 
         for y in range(1, 3):
-            controller.leftClick(skills.x, skills.y - (screenInfo.characters.offsets.skillPosition.y * y), .6)
+            controller.leftClick(skills.x, skills.y - (screenInfo.characters.offsets.skillPosition.y * y), .6, region=screenInfo.characters.skillButton)
 
             buttonImage = screenshot(screenInfo.characters.skillButton.x, screenInfo.characters.skillButton.y, screenInfo.characters.skillButton.w, screenInfo.characters.skillButton.h, monitor=screenInfo.monitor, bw=True)
-            buttonHash = hash(buttonImage.tobytes())
+            buttonHash = _cache.key('characters.skillButton', buttonImage)
 
             if buttonHash in _cache:
-                button = _cache[button]
+                button = _cache[buttonHash]
             else:
-                button = imageToString(buttonImage).lower()
-                _cache[button] = button
+                button = imageToString(buttonImage, mode=OCR_MODES['characters.skillButton']).lower()
+                _cache[buttonHash] = button
 
             if button.lower() == definedText['PrefabTextItem_3963945691_Text']: # MULTILANG
                 key = 'inherent' if index == 2 else f'stats{index}'
@@ -155,28 +212,28 @@ def scrapeSkills(controller: WindowsInputController, screenInfo: ScreenInfo, cha
             else:
                 break
 
-    controller.pressKey('esc')
+    controller.pressKey('esc', .5, region=screenInfo.characters.panel)
 
 def scrapeChain(controller: WindowsInputController, screenInfo: ScreenInfo, characters: dict, resonatorID: str, _cache: dict):
-    controller.leftClick(screenInfo.characters.chainClick.x, screenInfo.characters.chainClick.y, .7)
+    controller.leftClick(screenInfo.characters.chainClick.x, screenInfo.characters.chainClick.y, .7, region=screenInfo.characters.chainButton)
 
     for position in screenInfo.characters.chainPositions:
-        controller.leftClick(position.x, position.y, .2)
+        controller.leftClick(position.x, position.y, .2, region=screenInfo.characters.chainButton)
 
         statusImage = screenshot(screenInfo.characters.chainButton.x, screenInfo.characters.chainButton.y, screenInfo.characters.chainButton.w, screenInfo.characters.chainButton.h, monitor=screenInfo.monitor)
-        statusHash = hash(statusImage.tobytes())
+        statusHash = _cache.key('characters.chainButton', statusImage)
         
         if statusHash in _cache:
             status = _cache[statusHash]
         else:
-            status = imageToString(statusImage, '', bannedChars=f'{string.punctuation} ').lower()
+            status = imageToString(statusImage, '', bannedChars=f'{string.punctuation} ', mode=OCR_MODES['characters.chainButton']).lower()
             _cache[statusHash] = status
 
         if status.lower() != definedText['PrefabTextItem_3963945691_Text']: # MULTILANG
             break
 
         characters[resonatorID]['chain'] += 1
-    controller.pressKey('esc')
+    controller.pressKey('esc', .5, region=screenInfo.characters.panel)
 
 def resonatorScraper(controller: WindowsInputController, screenInfo: ScreenInfo):
     characters = defaultdict(
@@ -214,9 +271,13 @@ def resonatorScraper(controller: WindowsInputController, screenInfo: ScreenInfo)
             }
         )
     )
-    _cache = dict()
+    _cache = ocrCache
+    sectionROIs = {
+        section: {key: getattr(screenInfo.characters, key) for key in keys}
+        for section, keys in SECTION_ROIS.items()
+    }
 
-    controller.pressKey(cfg.get(cfg.resonatorKeybind), 2, False)
+    controller.pressKey(cfg.get(cfg.resonatorKeybind), 2, False, region=screenInfo.characters.panel)
 
     isDouble = False
     xLeftSide, yLeftSide = screenInfo.characters.leftSide.x, screenInfo.characters.leftSide.y
@@ -224,28 +285,28 @@ def resonatorScraper(controller: WindowsInputController, screenInfo: ScreenInfo)
 
     while not isDouble:
         for resonatorIndex in range(7):
-            controller.leftClick(xRightSide, yRightSide + (screenInfo.characters.offsets.rightSide.y * resonatorIndex), .7)
+            controller.leftClick(xRightSide, yRightSide + (screenInfo.characters.offsets.rightSide.y * resonatorIndex), .7, region=screenInfo.characters.panel)
             resonatorID = str()
 
             for section in range(5):
-                controller.leftClick(xLeftSide, yLeftSide + (screenInfo.characters.offsets.leftSide.y * section), .8)
+                controller.leftClick(xLeftSide, yLeftSide + (screenInfo.characters.offsets.leftSide.y * section), .8, region=screenInfo.characters.panel)
 
-                image = screenshot(width=screenInfo.width, height=screenInfo.height, monitor=screenInfo.monitor, bw=True)
+                images = screenshotRegions(sectionROIs.get(section, {}), screenInfo.monitor)
 
                 match(section):
                     case 0:
-                        resonatorID, isDouble = scrapeResonator(image, screenInfo, characters, _cache)
+                        resonatorID, isDouble = scrapeResonator(images, screenInfo, characters, _cache)
                         if isDouble:
                             break
                     case 1:
-                        scrapeWeapon(image, screenInfo, characters, resonatorID, _cache)
+                        scrapeWeapon(images, screenInfo, characters, resonatorID, _cache)
                     case 2:
                         pass  # Skip echoes for now
                     case 3:
                         scrapeSkills(controller, screenInfo, characters, resonatorID, _cache)
                     case 4:
                         scrapeChain(controller, screenInfo, characters, resonatorID, _cache)
-                time.sleep(.5)
+                controller.waitForSettle(screenInfo.characters.panel, timeout=.5)
 
             if isDouble:
                 break
@@ -254,25 +315,25 @@ def resonatorScraper(controller: WindowsInputController, screenInfo: ScreenInfo)
             break
 
         controller.moveMouse(xRightSide, yRightSide, .3)
-        controller.mouseScroll(screenInfo.scroll.characters.y, .5)
+        controller.mouseScroll(screenInfo.scroll.characters.y, .5, region=screenInfo.characters.panel)
     
     # Process last page
     for resonatorIndex in range(6, -1, -1):
-        controller.leftClick(xRightSide, yRightSide + (screenInfo.characters.offsets.rightSide.y * resonatorIndex), .7)
+        controller.leftClick(xRightSide, yRightSide + (screenInfo.characters.offsets.rightSide.y * resonatorIndex), .7, region=screenInfo.characters.panel)
         resonatorID = str()
         
         for section in range(5):
-            controller.leftClick(xLeftSide, yLeftSide + (screenInfo.characters.offsets.leftSide.y * section), .8)
+            controller.leftClick(xLeftSide, yLeftSide + (screenInfo.characters.offsets.leftSide.y * section), .8, region=screenInfo.characters.panel)
 
-            image = screenshot(width=screenInfo.width, height=screenInfo.height, monitor=screenInfo.monitor, bw=True)
+            images = screenshotRegions(sectionROIs.get(section, {}), screenInfo.monitor)
 
             match(section):
                 case 0:
-                    resonatorID, isDouble = scrapeResonator(image, screenInfo, characters, _cache)
-                    del _cache
+                    resonatorID, isDouble = scrapeResonator(images, screenInfo, characters, _cache)
+                    _cache.flush()
                     return dict(characters)
                 case 1:
-                    scrapeWeapon(image, screenInfo, characters, resonatorID, _cache)
+                    scrapeWeapon(images, screenInfo, characters, resonatorID, _cache)
                 case 2:
                     pass  # Skip echoes for now
                 case 3:
@@ -280,10 +341,10 @@ def resonatorScraper(controller: WindowsInputController, screenInfo: ScreenInfo)
                 case 4:
                     scrapeChain(controller, screenInfo, characters, resonatorID, _cache)
 
-            time.sleep(.5)
+            controller.waitForSettle(screenInfo.characters.panel, timeout=.5)
         
         if isDouble:
             break
     
-    del _cache
+    _cache.flush()
     return dict(characters)
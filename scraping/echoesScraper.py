@@ -1,18 +1,20 @@
 import os
-import cv2
 import string
 import numpy as np
-from difflib import get_close_matches as getMatches
 from collections import defaultdict
 
 from scraping.utils import (
-    echoesID, echoStats, sonataName
+    echoesID, echoStats, sonataName,
+    echoesIndex, nameResolver, ocrCache
 )
 from scraping.utils import (
-    screenshot, imageToString, convertToBlackWhite,
-    WindowsInputController
+    screenshot, screenshotRegions, imageToString, imagesToStrings,
+    convertToBlackWhite, rarityClassifier, GridPipeline,
+    capturePage, passesThresholds, PageStore, pageFingerprint,
+    getChannel, WindowsInputController
 )
 from game.screenInfo import ScreenInfo
+from game.gameROI import OCR_MODES
 from properties.config import cfg
 
 # Constants
@@ -34,38 +36,15 @@ def matchStats(text):
         i += 1
     return results
 
-def setupRarityDetection():
-    rarityColors = {
-        5: np.array([90, 230, 255]),
-        4: np.array([255, 109, 202]),
-        3: np.array([211, 180, 89]),
-        2: np.array([94, 195, 92]),
-        1: np.array([225, 236, 239])
-    }
-
-    tolerance = 10
-    bounds = {rarity: (color - tolerance, color + tolerance) for rarity, color in rarityColors.items()}
-
-    return bounds
-
-RARITY_BOUNDS = setupRarityDetection()
-
-def getRarity(image: np.ndarray):
-    for rarity, (lower, upper) in RARITY_BOUNDS.items():
-        if np.any(cv2.inRange(image, lower, upper)):
-            return rarity
-    return 1
-
 def getEchoPages(screenInfo: ScreenInfo) -> int:
-    image = screenshot(width=screenInfo.width, height=screenInfo.height, monitor=screenInfo.monitor)[screenInfo.echoes.page.y:screenInfo.echoes.page.y + screenInfo.echoes.page.h, screenInfo.echoes.page.x:screenInfo.echoes.page.x + screenInfo.echoes.page.w]
-    echoCount = imageToString(image, allowedChars=string.digits + '/').split('/')[0]
+    image = screenshot(screenInfo.echoes.page.x, screenInfo.echoes.page.y, screenInfo.echoes.page.w, screenInfo.echoes.page.h, monitor=screenInfo.monitor)
+    echoCount = imageToString(image, allowedChars=string.digits + '/', mode=OCR_MODES['echoes.page']).split('/')[0]
     
     try: return int(echoCount), int(np.ceil(int(echoCount) / 24))
     except ValueError: return 24, 1
 
 def processEcho(name: str, level: int, tuneLv: int, sonata: str, rarity: int, stats: dict) -> dict[str, dict[int, int, dict]]:
-    result = getMatches(name, echoesID, 1, 0.9)
-    if result: name = result[0]
+    name = nameResolver.resolve(name, echoesIndex) or name
     
     echoID = str(echoesID.get(name, name))
     return {
@@ -78,35 +57,37 @@ def processEcho(name: str, level: int, tuneLv: int, sonata: str, rarity: int, st
         }
     }
 
-def processStats(image: np.ndarray, screenInfo: ScreenInfo, _cache: dict) -> dict[str:int]:
+def processStats(images: dict[str, np.ndarray], screenInfo: ScreenInfo, _cache: dict) -> dict[str:int]:
     stats = defaultdict(dict)
     tuneLv = 0
 
-    nameImage = image[
-        screenInfo.echoes.fullStatsName.y:screenInfo.echoes.fullStatsName.y + screenInfo.echoes.fullStatsName.h,
-        screenInfo.echoes.fullStatsName.x:screenInfo.echoes.fullStatsName.x + screenInfo.echoes.fullStatsName.w
-    ]
+    nameImage = images['fullStatsName']
     nameImage = convertToBlackWhite(nameImage)
-    nameHash = hash(nameImage.tobytes())
+    nameHash = _cache.key('echoes.fullStatsName', nameImage)
 
-    valueImage = image[
-        screenInfo.echoes.fullStatsValue.y:screenInfo.echoes.fullStatsValue.y + screenInfo.echoes.fullStatsValue.h,
-        screenInfo.echoes.fullStatsValue.x:screenInfo.echoes.fullStatsValue.x + screenInfo.echoes.fullStatsValue.w
-    ]
+    valueImage = images['fullStatsValue']
     valueImage = convertToBlackWhite(valueImage)
-    valueHash = hash(valueImage.tobytes())
+    valueHash = _cache.key('echoes.fullStatsValue', valueImage)
+
+    pending = dict()
+    if nameHash not in _cache: pending['name'] = nameImage
+    if valueHash not in _cache: pending['value'] = valueImage
+    texts = imagesToStrings(pending, {
+        'name': {'allowedChars': string.ascii_letters},
+        'value': {'allowedChars': string.digits + '.%'}
+    })
 
     if nameHash in _cache:
         names = _cache[nameHash]
     else:
-        names = imageToString(nameImage, allowedChars=string.ascii_letters).lower().split('\n')
+        names = texts['name'].lower().split('\n')
         names = matchStats(names)
         _cache[nameHash] = names
 
     if valueHash in _cache:
         values = _cache[valueHash]
     else:
-        values = imageToString(valueImage, allowedChars=string.digits + '.%').split()
+        values = texts['value'].split()
         _cache[valueHash] = values
     tuneLv = max(0, len(values) - 2)
 
@@ -127,11 +108,17 @@ def processStats(image: np.ndarray, screenInfo: ScreenInfo, _cache: dict) -> dic
 
     return tuneLv, dict(stats)
 
-def getSonata(controller: WindowsInputController, screenInfo: ScreenInfo, _cache: dict):
+def captureSonata(controller: WindowsInputController, screenInfo: ScreenInfo) -> np.ndarray:
     controller.moveMouse(screenInfo.echoes.mouseMovement.x, screenInfo.echoes.mouseMovement.y, .2)
-    controller.mouseScroll(-screenInfo.scroll.sonata.y, .3)
-    image = screenshot(screenInfo.echoes.sonata.x, screenInfo.echoes.sonata.y, screenInfo.echoes.sonata.w, screenInfo.echoes.sonata.h, monitor=screenInfo.monitor)
-    sonataHash = hash(image.tobytes())
+    controller.mouseScroll(-screenInfo.scroll.sonata.y, .3, region=screenInfo.echoes.sonata)
+    image = screenshot(screenInfo.echoes.sonata.x, screenInfo.echoes.sonata.y, screenInfo.echoes.sonata.w, screenInfo.echoes.sonata.h, monitor=screenInfo.monitor).copy()
+    
+    controller.moveMouse(screenInfo.echoes.mouseMovement.x, screenInfo.echoes.mouseMovement.y, .2)
+    controller.mouseScroll(screenInfo.scroll.sonata.y, .3, region=screenInfo.echoes.sonata)
+    return image
+
+def readSonata(image: np.ndarray, _cache: dict) -> str:
+    sonataHash = _cache.key('echoes.sonata', image)
 
     if sonataHash in _cache:
         sonata = _cache[sonataHash]
@@ -142,74 +129,131 @@ def getSonata(controller: WindowsInputController, screenInfo: ScreenInfo, _cache
                 _cache[sonataHash] = name
                 sonata = name
                 break
-    
-    controller.moveMouse(screenInfo.echoes.mouseMovement.x, screenInfo.echoes.mouseMovement.y, .2)
-    controller.mouseScroll(screenInfo.scroll.sonata.y, .3)
     return sonata
 
-def processGridEcho(controller: WindowsInputController, screenInfo: ScreenInfo, echoes: list, image: np.ndarray, _cache: dict[str, list]) -> tuple[dict[str, int], list[dict[str, dict[str, int]]]]:
+def processGridEcho(controller: WindowsInputController, screenInfo: ScreenInfo, images: dict[str, np.ndarray], _cache: dict[str, list]) -> tuple[bool, tuple | None]:
+    """
+    Read the echo card and, for the echoes to keep, capture their sonata.
+
+    The sonata needs the game, so this part runs on the navigation thread.
 
-    echoCard = image[screenInfo.echoes.echoCard.y:screenInfo.echoes.echoCard.y + screenInfo.echoes.echoCard.h, screenInfo.echoes.echoCard.x:screenInfo.echoes.echoCard.x + screenInfo.echoes.echoCard.w]
-    echoHash = hash(echoCard.tobytes())
+    Returns:
+        tuple[bool, tuple | None]: Whether to continue, and the arguments of `recognizeEcho` if the echo is kept.
+    """
+    echoCard = images['echoCard']
+    # Only the text is cached, the rarity is classified from the colours of every card
+    echoHash = _cache.key('echoes.echoCard', echoCard)
     if echoHash in _cache:
         info = _cache[echoHash]
     else:
-        info = [imageToString(echoCard, '', bannedChars=' +').lower().split('\n')]
+        info = imageToString(echoCard, '', bannedChars=' +').lower().split('\n')
+        # Resolved once, confusions are only learned from fresh OCR
+        info[0] = nameResolver.resolve(info[0], echoesIndex) or info[0]
         _cache[echoHash] = info
-    name = info[0][0]
+    name = info[0]
     
     if name in echoesID:
-        try:
-            rarity = info[1][0]
-        except:
-            rarity = getRarity(echoCard)
-            _cache[echoHash].append(rarity)
+        rarity = rarityClassifier.classify(echoCard)
         
         if rarity >= cfg.get(cfg.echoMinRarity):
-            levelText = info[0][2]
+            levelText = info[2] if len(info) > 2 else ''
             
             try: level = int(levelText)
             except ValueError: level = 0
             level = min(25, level)
 
             if level >= cfg.get(cfg.echoMinLevel):
-                tuneLv, stats = processStats(image, screenInfo, _cache)
-                sonata = getSonata(controller, screenInfo, _cache)
-                echoes.append(processEcho(name, level, tuneLv, sonata, rarity, stats))
-                return True
-        return False
+                sonataImage = captureSonata(controller, screenInfo)
+                return True, (images, sonataImage, name, level, rarity)
+        return False, None
+
+    return True, None
 
-    return True
+def recognizeEcho(images: dict[str, np.ndarray], sonataImage: np.ndarray, name: str, level: int, rarity: int, screenInfo: ScreenInfo, _cache: dict) -> tuple[bool, dict[str, dict[int, int, dict]]]:
+    tuneLv, stats = processStats(images, screenInfo, _cache)
+    sonata = readSonata(sonataImage, _cache)
+    return True, processEcho(name, level, tuneLv, sonata, rarity, stats)
 
-def echoScraper(controller: WindowsInputController, x: float, y: float, screenInfo: ScreenInfo) -> tuple[dict[str, int], list[dict[str, dict[str, int]]]]:
-    echoes = list()
-    _cache = dict()
+def echoScraper(controller: WindowsInputController, x: float, y: float, screenInfo: ScreenInfo, pageStore: PageStore = None) -> list[str]:
+    _cache = ocrCache
+    pageStore = pageStore or PageStore()
+    # Only the detail panel is read for each cell
+    rois = {key: getattr(screenInfo.echoes, key) for key in ('echoCard', 'fullStatsName', 'fullStatsValue')}
 
-    controller.pressKey(cfg.get(cfg.inventoryKeybind), 2, False)
-    controller.leftClick(x, y)
+    controller.pressKey(cfg.get(cfg.inventoryKeybind), 2, False, region=screenInfo.echoes.start)
+    controller.leftClick(x, y, region=screenInfo.echoes.page)
 
     echoCount, pages = getEchoPages(screenInfo)
-    continueScraping = False
-
-    for page in range(pages):
-        for row in range(ROWS):
-            for col in range(COLS):
-                if page == pages - 1 and (page * (ROWS * COLS) + row * COLS + col) > (page * 24) + (echoCount % 24):
-                    del _cache
-                    return echoes
-                center_x = screenInfo.echoes.start.x + (col * (screenInfo.echoes.start.w + screenInfo.offsets.page.x)) + screenInfo.echoes.start.w // 2
-                center_y = screenInfo.echoes.start.y + (row * (screenInfo.echoes.start.h + screenInfo.offsets.page.y)) + screenInfo.echoes.start.h // 2
-                
-                controller.leftClick(center_x, center_y)
-                image = screenshot(width=screenInfo.width, height=screenInfo.height, monitor=screenInfo.monitor)
-                
-                continueScraping = processGridEcho(controller, screenInfo, echoes, image, _cache)
-                if not continueScraping:
-                    del _cache
-                    return echoes
-
-        if page < pages - 1 and continueScraping:
-            controller.mouseScroll(screenInfo.scroll.page.y, 1.2)
-
-    del _cache
-    return echoes
+    continueScraping = True
+    # Results of the pages still being recognized
+    pageResults = dict()
+    fingerprints = dict()
+    # Fingerprints of the pages sent, in order
+    sent = list()
+
+    def recognize(page: int, *args) -> tuple[bool, tuple]:
+        continueScraping, echo = recognizeEcho(*args)
+        return continueScraping, (page, echo)
+
+    def collect(result: tuple[int, dict[str, dict[int, int, dict]]]):
+        page, echo = result
+        pageResults[page]['echoes'].append(echo)
+
+    # The stats and sonata of the kept echoes are recognized by the workers while the next ones are clicked
+    with GridPipeline(recognize, collect) as pipeline:
+        for page in range(pages):
+            if not continueScraping:
+                break
+            # Cells failing the thresholds on their thumbnail are never clicked
+            thumbnails = capturePage(screenInfo, screenInfo.echoes.start, ROWS, COLS)
+
+            # A page identical to the previous scan is not clicked through again
+            fingerprint = pageFingerprint(thumbnails, screenInfo, cfg.get(cfg.echoMinRarity), cfg.get(cfg.echoMinLevel))
+            previous = pageStore.get('echoes', fingerprint)
+            if previous is not None:
+                pageResults[page] = previous
+                continueScraping = not previous['stop']
+            else:
+                pageResults[page] = {'echoes': [], 'stop': False}
+                fingerprints[page] = fingerprint
+
+                inspected = 0
+                for row in range(ROWS):
+                    for col in range(COLS):
+                        if not continueScraping or (page == pages - 1 and (page * (ROWS * COLS) + row * COLS + col) > (page * 24) + (echoCount % 24)):
+                            break
+                        if not passesThresholds(thumbnails[row, col], screenInfo, cfg.get(cfg.echoMinRarity), cfg.get(cfg.echoMinLevel)):
+                            continue
+                        inspected += 1
+                        center_x = screenInfo.echoes.start.x + (col * (screenInfo.echoes.start.w + screenInfo.offsets.page.x)) + screenInfo.echoes.start.w // 2
+                        center_y = screenInfo.echoes.start.y + (row * (screenInfo.echoes.start.h + screenInfo.offsets.page.y)) + screenInfo.echoes.start.h // 2
+                        
+                        controller.leftClick(center_x, center_y, region=screenInfo.echoes.echoCard)
+                        images = screenshotRegions(rois, screenInfo.monitor, copy=True)
+                        
+                        continueScraping, job = processGridEcho(controller, screenInfo, images, _cache)
+                        if job is not None:
+                            continueScraping = pipeline.submit(page, *job, screenInfo, _cache)
+                        if not continueScraping:
+                            pageResults[page]['stop'] = True
+
+                # The grid is sorted by rarity, so a page without a cell to inspect ends the scan
+                if not inspected:
+                    pageResults[page]['stop'] = True
+                    continueScraping = False
+
+            if page < pages - 1 and continueScraping:
+                controller.mouseScroll(screenInfo.scroll.page.y, 1.2, region=screenInfo.echoes.start)
+
+            # The page is complete once its last cells are recognized, which overlaps the scroll
+            continueScraping = pipeline.drain() and continueScraping
+            if page in fingerprints:
+                pageStore.put('echoes', fingerprints[page], pageResults[page])
+            getChannel().results('echoes', pageResults[page])
+            getChannel().progress('echoes', page + 1, pages)
+            # Sent and stored, the page isn't kept in this process
+            del pageResults[page]
+            sent.append(fingerprint)
+
+    _cache.flush()
+    return sent
@@ -1,37 +1,39 @@
 import re
 import cv2
 import time
+import string
 import numpy as np
 from pathlib import Path
-from difflib import get_close_matches as getMatches
 
-from scraping.utils import itemsID
+from scraping.utils import itemsID, itemsIndex, nameResolver, ocrCache, itemIcons
 from scraping.utils import (
-    screenshot, imageToString, convertToBlackWhite,
+    screenshotRegions, imageToString, imagesToStrings, convertToBlackWhite,
+    digitRecognizer, capturePage, cropThumbnail, getChannel,
     WindowsInputController
 )
 from game.screenInfo import ScreenInfo
+from game.gameROI import OCR_MODES
 from properties.config import cfg, basePATH
 
 # Constants
 ROWS, COLS = 4, 6
 
-def processItem(path: Path, image: np.ndarray, screenInfo: ScreenInfo, _cache: dict) -> tuple[dict[str, int], list[dict]]:
+def processItem(path: Path, images: dict[str, np.ndarray], screenInfo: ScreenInfo, _cache: dict) -> tuple[dict[str, int], list[dict]]:
     inventory = {}
     failed = []
 
-    infoImage = image[screenInfo.items.info.y:screenInfo.items.info.y + screenInfo.items.info.h, screenInfo.items.info.x:screenInfo.items.info.x + screenInfo.items.info.w]
+    infoImage = images['info']
     infoImage = convertToBlackWhite(infoImage)
-    infoHash = hash(infoImage.tobytes())
+    infoHash = _cache.key('items.info', infoImage)
 
     if infoHash in _cache:
         info = _cache[infoHash]
     else:
         info = imageToString(infoImage, bannedChars=' ').lower().split('\n')
+        # Resolved once, confusions are only learned from fresh OCR
+        info[0] = nameResolver.resolve(info[0], itemsIndex) or info[0]
         _cache[infoHash] = info
     name = info[0]
-    result = getMatches(name, itemsID, 1, 0.9)
-    if result: name = result[0]
     
     try: value = re.sub(r'[^0-9]', '', info[2])
     except: value = 1
@@ -44,46 +46,119 @@ def processItem(path: Path, image: np.ndarray, screenInfo: ScreenInfo, _cache: d
         inventory[itemID] = value
     else:
         path.mkdir(parents=True, exist_ok=True)
-        descImage = image[screenInfo.items.description.y:screenInfo.items.description.y + screenInfo.items.description.h, screenInfo.items.description.x:screenInfo.items.description.x + screenInfo.items.description.w]
+        descImage = images['description']
 
         imagePath = path / f'_{name}-{time.time()}.png'
         cv2.imwrite(imagePath, descImage)
 
         failed.append({
             'image': imagePath,
+            'name': info[0],
             'owned': value
         })
 
     return inventory, failed, name
 
-def itemsScraper(START_DATE: str, controller: WindowsInputController, x: int, y: int, screenInfo: ScreenInfo):
+def recognizePage(thumbnails: dict[tuple[int, int], np.ndarray], screenInfo: ScreenInfo) -> dict[tuple[int, int], tuple[str, int]]:
+    """
+    Identify the items of a grid page from its thumbnails, the icon giving the
+    item and the number under it the amount.
+
+    Returns:
+        dict[tuple[int, int], tuple[str, int]]: (row, col) -> (name, value) of the recognized cells,
+            the others have to be inspected.
+    """
+    cells = list(thumbnails)
+    names = itemIcons.match([cropThumbnail(thumbnails[cell], screenInfo.thumbnail.icon) for cell in cells])
+
+    key = (screenInfo.width, screenInfo.height, 'thumbnail.count')
+    counts, pending = dict(), dict()
+    for cell, name in zip(cells, names):
+        if name is None:
+            continue
+        image = cropThumbnail(thumbnails[cell], screenInfo.thumbnail.level)
+        text = digitRecognizer.read(image, key, string.digits)
+        if text is None:
+            pending[cell] = image
+        else:
+            counts[cell] = text
+
+    # The counts the digit atlas can't read yet are recognized in one OCR pass
+    options = {cell: {'divisor': '', 'allowedChars': string.digits, 'mode': OCR_MODES['thumbnail.level']} for cell in pending}
+    for cell, text in imagesToStrings(pending, options).items():
+        digitRecognizer.learn(pending[cell], key, text)
+        counts[cell] = text
+
+    recognized = dict()
+    for cell, name in zip(cells, names):
+        try:
+            recognized[cell] = (name, int(counts[cell]))
+        except (KeyError, ValueError):
+            pass
+    return recognized
+
+def itemsScraper(START_DATE: str, controller: WindowsInputController, x: int, y: int, screenInfo: ScreenInfo, scraper: str = 'items', journal = None) -> list[str]:
+    """
+    Read the items of a tab, sending the results of every page through the
+    channel as soon as it is read.
+
+    Args:
+        scraper (str, optional): Name of the scraper the results are sent as. Defaults to 'items'.
+        journal (ScanJournal, optional): Checkpoint journal every page is written to. Defaults to None.
+
+    Returns:
+        list[str]: Keys of the pages sent, in order.
+    """
     path: Path = basePATH / 'logs' / 'fail' / START_DATE
     
-    inventory = dict()
-    failed = list()
     encounters = dict()
-    _cache = dict()
+    sent = list()
+    _cache = ocrCache
+    # Only the detail panel is read for each cell
+    rois = {key: getattr(screenInfo.items, key) for key in ('info', 'description')}
 
-    controller.pressKey(cfg.get(cfg.inventoryKeybind), 2, False)
-    controller.leftClick(x, y)
+    controller.pressKey(cfg.get(cfg.inventoryKeybind), 2, False, region=screenInfo.items.start)
+    controller.leftClick(x, y, region=screenInfo.items.start)
+
+    def readCell(recognized: dict[tuple[int, int], tuple[str, int]], row: int, col: int) -> tuple[dict[str, int], list[dict], str]:
+        # Only the cells the thumbnails didn't identify are clicked, along with the
+        # items split in stacks of 999, whose total is only shown in the detail panel
+        name, value = recognized.get((row, col), (None, 0))
+        if name is not None and value < 999 and name not in encounters:
+            return {itemsID[name]['id']: value}, [], name
+
+        center_x = screenInfo.items.start.x + (col * (screenInfo.items.start.w + screenInfo.offsets.page.x)) + screenInfo.items.start.w // 2
+        center_y = screenInfo.items.start.y + (row * (screenInfo.items.start.h + screenInfo.offsets.page.y)) + screenInfo.items.start.h // 2
+
+        controller.leftClick(center_x, center_y, region=screenInfo.items.info)
+        images = screenshotRegions(rois, screenInfo.monitor)
+
+        return processItem(path, images, screenInfo, _cache)
+
+    def sendPage(key: str, inventory: dict[str, int], failed: list[dict]) -> None:
+        # The inventory as pairs, so that the item IDs go through the journal as is
+        result = {'inventory': list(inventory.items()), 'failed': failed}
+        getChannel().results(scraper, result)
+        if journal is not None:
+            journal.page(scraper, key, result)
+        sent.append(key)
 
     isDouble = False
     last = ""
+    page = 0
 
     while not isDouble:
+        page += 1
+        getChannel().progress(scraper, page)
+        inventory, failed = dict(), list()
+        recognized = recognizePage(capturePage(screenInfo, screenInfo.items.start, ROWS, COLS), screenInfo)
         for row in range(ROWS):
             for col in range(COLS):
-                center_x = screenInfo.items.start.x + (col * (screenInfo.items.start.w + screenInfo.offsets.page.x)) + screenInfo.items.start.w // 2
-                center_y = screenInfo.items.start.y + (row * (screenInfo.items.start.h + screenInfo.offsets.page.y)) + screenInfo.items.start.h // 2
-                
-                controller.leftClick(center_x, center_y)
-                image = screenshot(width=screenInfo.width, height=screenInfo.height, monitor=screenInfo.monitor)
-                
-                item_inventory, item_failed, name = processItem(path, image, screenInfo, _cache)
+                item_inventory, item_failed, name = readCell(recognized, row, col)
                 inventory.update(item_inventory)
                 failed.extend(item_failed)
 
-                value = inventory.get(itemsID.get(name, {'id': None})['id'], 1)
+                value = item_inventory.get(itemsID.get(name, {'id': None})['id'], 1)
                 maxEncounters = np.ceil(value / 999)
                 encounters[name] = encounters.get(name, 0) + 1
 
@@ -93,21 +168,18 @@ def itemsScraper(START_DATE: str, controller: WindowsInputController, x: int, y:
                     break
             if isDouble:
                 break
+        sendPage(f'page{page}', inventory, failed)
         
         if not isDouble:
-            controller.mouseScroll(screenInfo.scroll.page.y, 1.2)
+            controller.mouseScroll(screenInfo.scroll.page.y, 1.2, region=screenInfo.items.start)
 
     # Process last page
     isDouble = False
+    inventory, failed = dict(), list()
+    recognized = recognizePage(capturePage(screenInfo, screenInfo.items.start, ROWS, COLS), screenInfo)
     for row in range(ROWS - 1, -1, -1):
         for col in range(COLS - 1, -1, -1):
-            center_x = screenInfo.items.start.x + (col * (screenInfo.items.start.w + screenInfo.offsets.page.x)) + screenInfo.items.start.w // 2
-            center_y = screenInfo.items.start.y + (row * (screenInfo.items.start.h + screenInfo.offsets.page.y)) + screenInfo.items.start.h // 2
-            
-            controller.leftClick(center_x, center_y)
-            image = screenshot(width=screenInfo.width, height=screenInfo.height, monitor=screenInfo.monitor)
-            
-            item_inventory, item_failed, name = processItem(path, image, screenInfo, _cache)
+            item_inventory, item_failed, name = readCell(recognized, row, col)
             
             if name == last:
                 continue
@@ -115,7 +187,7 @@ def itemsScraper(START_DATE: str, controller: WindowsInputController, x: int, y:
             inventory.update(item_inventory)
             failed.extend(item_failed)
 
-            value = inventory.get(itemsID.get(name, {'id': None})['id'], 1)
+            value = item_inventory.get(itemsID.get(name, {'id': None})['id'], 1)
             maxEncounters = np.ceil(value / 999)
             encounters[name] = encounters.get(name, 0) + 1
 
@@ -124,6 +196,7 @@ def itemsScraper(START_DATE: str, controller: WindowsInputController, x: int, y:
                 break
         if isDouble:
             break
+    sendPage('last', inventory, failed)
     
-    del _cache
-    return inventory, failed
\ No newline at end of file
+    _cache.flush()
+    return sent
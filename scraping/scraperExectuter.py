@@ -1,8 +1,8 @@
 from properties.config import cfg
 from scraping.utils.common import isUserAdmin
-from scraping.scraperManager import managerStart
+from scraping.scraperManager import managerStart, applyResults
 
-def startScraper():
+def startScraper(onTelemetry = None, onResults = None, stopFLAG = None):
     if isUserAdmin():
         scanners = {
             'characters': cfg.get(cfg.scanCharacters),
@@ -16,7 +16,7 @@ def startScraper():
         enabled = ['achievements'] if 'achievements' in enabled else enabled
 
         if enabled:
-            return managerStart(enabled)
+            return managerStart(enabled, onTelemetry, onResults or applyResults, stopFLAG)
         else:
             return ('warning', 'Warning', 'Select at least one scanner.')
     else:
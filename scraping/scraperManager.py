@@ -1,15 +1,20 @@
-import os
-import sys
 import time
-import signal
 import logging
 import multiprocessing
+from pathlib import Path
+from typing import Callable
 from datetime import datetime
 
-from properties.config import FAILED, INVENTORY
+from properties.config import FAILED, INVENTORY, cfg, basePATH
 from scraping.utils import (
-	WindowsInputController, savingScraped
+	WindowsInputController, savingScraped, nameResolver,
+	PageStore, ScanJournal, loadPreviousPages, PAGES_FILE,
+	ResultChannel, ResultCollector, getChannel, setChannel,
+	ScanTelemetry, metricsLogger, getOCR
 )
+from scraping.utils.channel import ITEM, DONE, ERROR
+
+from scraping.utils.replay import startRecording
 
 from scraping.shellScraper import getShell
 from scraping.itemsScraper import itemsScraper
@@ -20,67 +25,78 @@ from scraping.achievementsScraper import achievementScraper
 
 from game.menu import MainMenuController
 from game.screenInfo import ScreenInfo
+from game.gameROI import Coordinates
 from game.foreground import WindowManager
-from game.stopKey import KeyPressChecker
+from game.stopKey import needToStop
 
 logger = logging.getLogger('ScraperManager')
 
-def managerStart(scraperEnabled: list):
-	global INVENTORY, FAILED
-	INVENTORY['date'] = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+def applyResults(START_DATE: str, inventory: dict, failed: list) -> None:
+	"""Add the results of a scan to the inventory of the session, and export it."""
+	INVENTORY['date'] = START_DATE
+	INVENTORY['items'].update(inventory)
+	FAILED.extend(failed)
+	savingScraped(START_DATE=START_DATE)
+
+def managerStart(scraperEnabled: list, onTelemetry: Callable[[dict], None] = None, onResults: Callable[[str, dict, list], None] = applyResults, stopFLAG = None):
+	"""
+	Run a scan in a scraper process, collecting its results as they are sent.
+
+	Args:
+		scraperEnabled (list): Scrapers to run, in order.
+		onTelemetry (Callable[[dict], None], optional): Called with the telemetry summary after every record.
+		onResults (Callable[[str, dict, list], None], optional): Called with the date, inventory and failed items of a scan that read anything. Defaults to `applyResults`.
+		stopFLAG (multiprocessing.Event, optional): Stops the scan once set, as the stop key does.
+	"""
+	START_DATE = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
 
 	gameManager = WindowManager()
-	result = MainMenuController().isInMainMenu()
+	# The main menu is checked by the scraper process, the only one loading the OCR
+	try:
+		result = gameManager.setForeground()
+	except Exception as e:
+		logger.error(f"Exception occurred: {e}", exc_info=True)
+		result = ('error', 'Exception', str(e))
 
 	if result[0] != 'error':
-		time.sleep(1.2)
+		time.sleep(.2)
 
 		completeFLAG = multiprocessing.Event()
 		queue = multiprocessing.Queue()
 		
-		scrapersProcess = multiprocessing.Process(target=scrapers, args=(scraperEnabled, gameManager.getScreenInfo(), completeFLAG, queue, INVENTORY['date']))
+		scrapersProcess = multiprocessing.Process(target=scrapers, args=(scraperEnabled, gameManager.getScreenInfo(), completeFLAG, queue, START_DATE))
 		scrapersProcess.start()
 
-		stopMonitor = multiprocessing.Process(target=needToStop, args=(scrapersProcess.pid, completeFLAG))
+		stopMonitor = multiprocessing.Process(target=needToStop, args=(scrapersProcess.pid, completeFLAG, stopFLAG))
 		stopMonitor.start()
 
-		scrapersProcess.join()
-		
-		stopMonitor.terminate()
-		stopMonitor.join()
-
+		# The results are applied as they are recognized, so a stopped scan keeps what it read
+		collector = ResultCollector()
+		telemetry = ScanTelemetry(metricsLogger(basePATH / 'logs' / 'metrics.jsonl'), onTelemetry)
 		try:
-			timeout = 60
-			startTime = time.time()
-			
-			while time.time() - startTime < timeout:
-				try:
-					scraperResult = queue.get_nowait()
-					INVENTORY['items'].update(scraperResult['inventory'])
-					FAILED.extend(scraperResult['failed'])
-				except multiprocessing.queues.Empty:
-					break
-				except Exception as e:
-					logger.error(f"Error processing queue item: {e}", exc_info=True)
-					continue
-			
-			while True:
-				try:
-					queue.get_nowait()
-				except:
-					break
-					
+			collector.consume(queue, scrapersProcess.is_alive, telemetry.apply)
 		except Exception as e:
-			logger.error(f"Fatal error processing queue: {e}", exc_info=True)
+			logger.error(f"Fatal error processing the results: {e}", exc_info=True)
 			return ('failed', 'Queue processing error', str(e))
 		finally:
+			scrapersProcess.join()
+
+			stopMonitor.terminate()
+			stopMonitor.join()
+
 			queue.close()
 			queue.join_thread()
 
-		savingScraped(START_DATE=INVENTORY['date'])
+		# A scan refused before reading anything (e.g. not in the main menu) has nothing to export
+		if collector.counts:
+			savingScraped(collector.scanned(), START_DATE)
+			# The inventory may be shared with a UI thread, which applies the results itself
+			onResults(START_DATE, collector.inventory, collector.failed)
 
-		if len(FAILED) > 0:
-			result = ('failed', 'Failed to recognize', f'Failed to recognize {len(FAILED)} items.')
+		if collector.error is not None:
+			result = ('error', 'Error', collector.error)
+		elif len(collector.failed) > 0:
+			result = ('failed', 'Failed to recognize', f'Failed to recognize {len(collector.failed)} items.')
 		else:
 			result = ('success', 'Complete', f'Scan completed without errors.')
 	
@@ -88,83 +104,99 @@ def managerStart(scraperEnabled: list):
 	return result
 
 
-def needToStop(tPID, completeFLAG):
-	keyPress = KeyPressChecker()
-	gameManager = WindowManager()
-
-	while not completeFLAG.is_set():
-		# Check if the game is no longer in the foreground or if the key is pressed
-		if not gameManager.isForeground() or keyPress.isPressed():
-			try:
-				os.kill(tPID, signal.SIGTERM)
-				logger.debug("Terminated scraper process due to key press or game not in foreground.")
-			except Exception as e:
-				logger.error(f"Error terminating process: {e}", exc_info=True)
-			sys.exit(0)
-		time.sleep(.1)
-
-def scrapers(scraperEnabled: list, screenInfo: ScreenInfo, FLAG, queue: multiprocessing.Queue, START_DATE: str):
-	try:
-		controller = WindowsInputController(screenInfo.monitor)
-		resonator = dict()
-		inventory = dict()
-		failed = list()
-		weapons = list()
-		echoes = list()
-		achievements = list()
+def runScrapers(scraperEnabled: list, controller: WindowsInputController, screenInfo: ScreenInfo, START_DATE: str, pageStore: PageStore = None, journal: ScanJournal = None) -> None:
+	"""Run the scrapers in order, every result being sent through the channel rather than kept here."""
+	pageStore = pageStore or PageStore()
+	shellRead = False
 
-		for scraper in scraperEnabled:
-			controller.pressKey('esc', .5)
+	for scraper in scraperEnabled:
+		# Scrapers completed before the scan was interrupted are not run again
+		resumed = journal is not None and scraper in journal.scrapers
+		if resumed:
+			logger.info(f'Resuming the {scraper} scraper from the journal')
+			result = journal.scrapers[scraper]
+		else:
+			controller.pressKey('esc', .5, region=Coordinates(0, 0, screenInfo.width, screenInfo.height))
 
+			# The paged scrapers send each page as it is read, and only return the keys of their pages
 			match(scraper):
 				case 'characters':
-					resonator = resonatorScraper(controller, screenInfo)
+					result = {'resonator': resonatorScraper(controller, screenInfo)}
 				case 'weapons':
-					i, w = weaponScraper(controller, screenInfo.scrapers.weapons.x, screenInfo.scrapers.weapons.y, screenInfo)
-					inventory.update(i)
-					weapons.extend(w)
+					result = {'pages': weaponScraper(controller, screenInfo.scrapers.weapons.x, screenInfo.scrapers.weapons.y, screenInfo, pageStore)}
 				case 'echoes':
-					echoes = echoScraper(controller, screenInfo.scrapers.echoes.x, screenInfo.scrapers.echoes.y, screenInfo)
+					result = {'pages': echoScraper(controller, screenInfo.scrapers.echoes.x, screenInfo.scrapers.echoes.y, screenInfo, pageStore)}
 				case 'devItems':
-					i, f = itemsScraper(START_DATE, controller, screenInfo.scrapers.devItems.x, screenInfo.scrapers.devItems.y, screenInfo)
-					inventory.update(i)
-					failed.extend(f)
+					result = {'pages': itemsScraper(START_DATE, controller, screenInfo.scrapers.devItems.x, screenInfo.scrapers.devItems.y, screenInfo, scraper, journal)}
 				case 'resources':
-					i, f = itemsScraper(START_DATE, controller, screenInfo.scrapers.resources.x, screenInfo.scrapers.resources.y, screenInfo)
-					inventory.update(i)
-					failed.extend(f)
+					result = {'pages': itemsScraper(START_DATE, controller, screenInfo.scrapers.resources.x, screenInfo.scrapers.resources.y, screenInfo, scraper, journal)}
 				case 'achievements':
-					achievements = achievementScraper(controller, screenInfo)
+					result = {'achievements': achievementScraper(controller, screenInfo)}
+				case _:
+					result = dict()
+
+			if journal is not None:
+				journal.scraper(scraper, result)
+
+		if 'pages' not in result:
+			getChannel().results(scraper, result)
+		elif resumed:
+			# The pages of a completed scraper are sent again from the journal
+			pages = journal.pages.get(scraper, dict())
+			for key in result['pages']:
+				getChannel().results(scraper, pages.get(key, dict()))
+
+		# An unread shell count (0) is read again after the next scraper
+		if not shellRead and scraper not in ['characters', 'achievements']:
+			shell = getShell(screenInfo)
+			shellRead = shell.get('2', 0) != 0
+			for item in shell.items():
+				getChannel().send(ITEM, scraper, list(item))
+
+	controller.pressKey('esc')
+	nameResolver.flush()
+
+def scrapers(scraperEnabled: list, screenInfo: ScreenInfo, FLAG, queue: multiprocessing.Queue, START_DATE: str):
+	channel = setChannel(ResultChannel(queue))
+	if not MainMenuController().isMenu():
+		FLAG.set()
+		channel.send(ERROR, data='Not in the main menu. Press ESC in-game and rerun the scanner.')
+		return
+	time.sleep(1.2)
 
-			if scraper not in ['characters', 'achievements']:
-				if '2' not in inventory or inventory.get('2') == 0:
-					shell = getShell(screenInfo)
-					inventory = {**shell, **inventory}
+	# The OCR engines load in the background while the menus are navigated
+	getOCR().warm()
+	try:
+		if cfg.get(cfg.recordScans):
+			startRecording(basePATH / 'recordings' / START_DATE, scraperEnabled, screenInfo)
+
+		# An interrupted scan of the same scrapers resumes from its last completed pages
+		journal = ScanJournal(
+			basePATH / 'cache' / 'scan.jsonl',
+			scrapers=scraperEnabled,
+			screen=[screenInfo.width, screenInfo.height],
+			thresholds=[cfg.get(cfg.echoMinRarity), cfg.get(cfg.echoMinLevel), cfg.get(cfg.weaponsMinRarity), cfg.get(cfg.weaponsMinLevel)]
+		)
+		if journal.load():
+			logger.info('Resuming the interrupted scan')
+		journal.start()
+
+		# Delta scans reuse the unchanged grid pages of the latest export
+		previous = loadPreviousPages(cfg.get(cfg.exportFolder), START_DATE) if cfg.get(cfg.deltaScan) else dict()
+		for scraper, pages in journal.pages.items():
+			previous.setdefault(scraper, dict()).update(pages)
+		pageStore = PageStore(previous, journal, Path(cfg.get(cfg.exportFolder)) / START_DATE / PAGES_FILE)
 
-		controller.pressKey('esc')
+		controller = WindowsInputController(screenInfo.monitor)
+		runScrapers(scraperEnabled, controller, screenInfo, START_DATE, pageStore, journal)
+		logger.info(f'Reused {pageStore.reused} pages')
 
-		chunkSize = 20
-		inventoryItems = list(inventory.items())
-		
-		for i in range(0, len(inventoryItems), chunkSize):
-			chunk = dict(inventoryItems[i:i + chunkSize])
-			queue.put({
-				'inventory': chunk,
-				'failed': failed[i:i + chunkSize] if failed else []
-			})
-			
 		FLAG.set()
-		savingScraped({
-			'characters_wuwainventorykamera.json': (resonator, dict),
-			'weapons_wuwainventorykamera.json': (weapons, list),
-			'echoes_wuwainventorykamera.json': (echoes, list),
-			'achievements_wuwainventorykamera.json': (achievements, list),
-		}, START_DATE)
+		# Every result went through the channel, and the pages were saved as they completed
+		journal.finish()
+		channel.send(DONE)
 
 	except Exception as e:
 		FLAG.set()
 		logger.error(f"Error in scrapers: {e}", exc_info=True)
-		queue.put({
-			'inventory': {},
-			'failed': []
-		})
+		channel.send(ERROR, data=str(e))
@@ -5,6 +5,7 @@ from scraping.utils import (
 	screenshot, imageToString
 )
 from game.screenInfo import ScreenInfo
+from game.gameROI import OCR_MODES
 
 logger = logging.getLogger('ShellScraper')
 
@@ -18,7 +19,7 @@ def getShell(screenInfo: ScreenInfo):
 
 	image = screenshot(xShell, yShell, wShell, hShell, screenInfo.monitor, True)
 
-	try: shell = int(imageToString(image, allowedChars=string.digits).strip())
+	try: shell = int(imageToString(image, allowedChars=string.digits, mode=OCR_MODES['shell']).strip())
 	except Exception as e:
 		logger.debug(f'Failed to get shells. Error: {e}', exc_info=True)
 		shell = 0
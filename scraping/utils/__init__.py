@@ -1,12 +1,42 @@
 from scraping.utils.common import (
     itemsID, charactersID, weaponsID,
     echoesID, achievementsID, echoStats,
-    definedText, sonataName
+    definedText, sonataName, ocrCache,
+    itemsIndex, charactersIndex, weaponsIndex,
+    echoesIndex, achievementsIndex, nameResolver, iconIndex,
+    itemIcons, weaponIcons
 )
 
 from scraping.utils.common import (
-    savingScraped, screenshot, convertToBlackWhite,
-    imageToString, copyToClipboard, isUserAdmin
+    savingScraped, screenshot, screenshotRegions, convertToBlackWhite,
+    imageToString, imageToStringAsync, imagesToStrings, imageToBoxes, copyToClipboard,
+    isUserAdmin, getOCR
 )
 
+from scraping.utils.capture import (
+    CaptureSession, CaptureBackend, MSSBackend, FileBackend,
+    getCaptureSession, setCaptureBackend
+)
+from scraping.utils.pipeline import GridPipeline
+from scraping.utils.ocrService import OCRService, physicalCores
+from scraping.utils.database import (
+    IDDatabase, BinaryTable, compileDatabase, openDatabase
+)
+from scraping.utils.digits import digitRecognizer, imageToDigits
+from scraping.utils.rarity import RarityClassifier, rarityClassifier
+from scraping.utils.grid import (
+    cellRegion, capturePage, cropThumbnail, thumbnailRarity,
+    thumbnailLevel, passesThresholds, thresholdVerdict
+)
+from scraping.utils.icons import IconIndex, IconMatcher, buildIconIndex
+from scraping.utils.delta import (
+    PageStore, pageFingerprint, loadPreviousPages, PAGES_FILE
+)
+from scraping.utils.checkpoint import ScanJournal
+from scraping.utils.channel import (
+    Record, ResultChannel, ResultCollector, getChannel, setChannel
+)
+from scraping.utils.telemetry import (
+    StageTimer, ScanTelemetry, stageTimer, metricsLogger
+)
 from scraping.utils.mouse_keyboard import WindowsInputController
\ No newline at end of file
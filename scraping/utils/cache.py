@@ -0,0 +1,201 @@
+import cv2
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+import numpy as np
+from pathlib import Path
+from collections import OrderedDict
+
+from scraping.utils.telemetry import stageTimer
+
+logger = logging.getLogger('OCRCache')
+
+# Version of the key format, entries of older formats are dropped with the cache
+KEY_FORMAT = 2
+
+def imageHash(image: np.ndarray, binarize: bool = True) -> str:
+    """
+    Exact digest of a ROI at full resolution.
+
+    The ROI is binarized first (unless `binarize` is False, e.g. when the
+    colour matters), so capture noise that doesn't flip a pixel across the
+    threshold keeps the key. A crop differing by any glyph pixel gets a key of
+    its own, at worst costing a cache miss, never a wrong text.
+    """
+    if binarize:
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if len(image.shape) == 3 else image
+        _, image = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        data = np.packbits(image > 0).tobytes()
+    else:
+        data = np.ascontiguousarray(image).tobytes()
+
+    height, width = image.shape[:2]
+    digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+    return f'{height}x{width}:{digest}'
+
+class OCRCache:
+    """
+    Persistent OCR result cache shared by all the scrapers.
+
+    Entries hold the OCR text of a crop (or the name resolved from it against
+    the cached ID tables), never values derived from settings or other ROIs.
+
+    Behaves like a dict keyed by `key(namespace, image)`, keeps the entries in
+    LRU order capped at `maxEntries` and stores them in a SQLite file. The cache
+    is cleared when any of the `dependencies` (the ID databases the cached
+    matches were resolved against) changes.
+    """
+
+    def __init__(self, path: Path, dependencies: list[Path] = [], maxEntries: int = 50000, flushEvery: int = 200):
+        """
+        Args:
+            path (Path): SQLite file of the cache, None to keep it in memory only.
+            dependencies (list[Path], optional): Files whose change invalidates the cache.
+            maxEntries (int, optional): Maximum number of entries kept. Defaults to 50000.
+            flushEvery (int, optional): Writes buffered before they are flushed to disk. Defaults to 200.
+        """
+        self.path = None if path is None else Path(path)
+        self.dependencies = [Path(dependency) for dependency in dependencies]
+        self.maxEntries = maxEntries
+        self.flushEvery = flushEvery
+
+        self._entries = None
+        self._dirty = set()
+        self._evicted = set()
+        self._lock = threading.RLock()
+
+    def _version(self) -> str:
+        stats = [f'format:{KEY_FORMAT}']
+        for dependency in self.dependencies:
+            try:
+                stat = dependency.stat()
+                stats.append(f'{dependency.name}:{stat.st_size}:{stat.st_mtime_ns}')
+            except FileNotFoundError:
+                stats.append(f'{dependency.name}:missing')
+        return hashlib.blake2b('|'.join(stats).encode(), digest_size=16).hexdigest()
+
+    def _connect(self) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(self.path)
+        connection.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+        connection.execute('CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, used REAL NOT NULL)')
+        return connection
+
+    def _load(self) -> OrderedDict:
+        if self._entries is not None:
+            return self._entries
+
+        self._entries = OrderedDict()
+        if self.path is None:
+            return self._entries
+        try:
+            with self._connect() as connection:
+                version = self._version()
+                row = connection.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+                if row is None or row[0] != version:
+                    logger.debug('OCR cache outdated, clearing it.')
+                    connection.execute('DELETE FROM cache')
+                    connection.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (version,))
+
+                for key, value in connection.execute('SELECT key, value FROM cache ORDER BY used'):
+                    self._entries[key] = json.loads(value)
+            connection.close()
+        except (sqlite3.Error, json.JSONDecodeError) as e:
+            logger.error(f'Failed to load the OCR cache: {e}', exc_info=True)
+
+        return self._entries
+
+    def key(self, namespace: str, image: np.ndarray, binarize: bool = True) -> str:
+        """Cache key of `image` as read for the ROI `namespace` (e.g. 'weapons.name')."""
+        return f'{namespace}/{imageHash(image, binarize)}'
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._load()
+
+    def __getitem__(self, key: str):
+        with self._lock:
+            entries = self._load()
+            value = entries[key]
+            entries.move_to_end(key)
+            self._dirty.add(key)
+            stageTimer.count('cacheHits')
+            return value
+
+    def get(self, key: str, default=None):
+        with self._lock:
+            return self[key] if key in self else default
+
+    def __setitem__(self, key: str, value) -> None:
+        with self._lock:
+            entries = self._load()
+            # Only the results of a missed lookup are stored
+            if key not in entries:
+                stageTimer.count('cacheMisses')
+            entries[key] = value
+            entries.move_to_end(key)
+            self._dirty.add(key)
+            self._evicted.discard(key)
+
+            while len(entries) > self.maxEntries:
+                evicted, _ = entries.popitem(last=False)
+                self._dirty.discard(evicted)
+                self._evicted.add(evicted)
+
+            if len(self._dirty) >= self.flushEvery:
+                self.flush()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._load())
+
+    def flush(self) -> None:
+        """Write the pending entries and evictions to disk."""
+        with self._lock:
+            if self._entries is None or not (self._dirty or self._evicted):
+                return
+            if self.path is None:
+                self._dirty.clear()
+                self._evicted.clear()
+                return
+
+            # Keep the LRU order of the touched entries through their timestamps
+            now = time.time()
+            order = {key: index for index, key in enumerate(reversed(self._entries)) if key in self._dirty}
+            try:
+                with self._connect() as connection:
+                    connection.executemany('DELETE FROM cache WHERE key = ?', [(key,) for key in self._evicted])
+                    connection.executemany(
+                        'INSERT OR REPLACE INTO cache VALUES (?, ?, ?)',
+                        [(key, json.dumps(self._entries[key]), now - order[key] * 1e-6) for key in self._dirty]
+                    )
+                connection.close()
+                self._dirty.clear()
+                self._evicted.clear()
+            except sqlite3.Error as e:
+                logger.error(f'Failed to save the OCR cache: {e}', exc_info=True)
+
+    def clear(self) -> None:
+        """Remove every entry, in memory and on disk."""
+        with self._lock:
+            self._entries = OrderedDict()
+            self._dirty.clear()
+            self._evicted.clear()
+            if self.path is None:
+                return
+            try:
+                with self._connect() as connection:
+                    connection.execute('DELETE FROM cache')
+                connection.close()
+            except sqlite3.Error as e:
+                logger.error(f'Failed to clear the OCR cache: {e}', exc_info=True)
+
+    def detach(self) -> None:
+        """Keep the cache in memory only from now on, starting from the entries it holds."""
+        with self._lock:
+            self.flush()
+            self._load()
+            self.path = None
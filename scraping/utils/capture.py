@@ -0,0 +1,188 @@
+import cv2
+import threading
+from abc import ABC, abstractmethod
+import numpy as np
+from mss import mss
+from pathlib import Path
+from collections import defaultdict
+
+from game.gameROI import Coordinates
+
+class CaptureBackend(ABC):
+    """Source of the raw BGRA frames grabbed by a CaptureSession."""
+
+    @abstractmethod
+    def monitors(self) -> list[dict]:
+        """Monitors in the mss layout: index 0 is the whole desktop, 1.. are the single monitors."""
+
+    @abstractmethod
+    def grab(self, left: int, top: int, width: int, height: int) -> np.ndarray:
+        """Return the region, in desktop coordinates, as a (height, width, 4) BGRA array."""
+
+    def close(self) -> None:
+        pass
+
+class MSSBackend(CaptureBackend):
+    """Live capture through mss, with one grabber per thread since mss handles are thread bound."""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def _sct(self):
+        sct = getattr(self._local, 'sct', None)
+        if sct is None:
+            sct = self._local.sct = mss()
+        return sct
+
+    def monitors(self) -> list[dict]:
+        return self._sct().monitors
+
+    def grab(self, left: int, top: int, width: int, height: int) -> np.ndarray:
+        shot = self._sct().grab({'left': left, 'top': top, 'width': width, 'height': height})
+        # View on the mss buffer, the conversion to BGR is the only copy
+        return np.frombuffer(shot.raw, dtype=np.uint8).reshape(shot.height, shot.width, 4)
+
+    def close(self) -> None:
+        sct = getattr(self._local, 'sct', None)
+        if sct is not None:
+            sct.close()
+            self._local.sct = None
+
+class FileBackend(CaptureBackend):
+    """
+    Serves grabs from still frames (image files or arrays) instead of the screen,
+    so the scrapers can run on recorded screenshots without the game.
+    """
+
+    def __init__(self, frames: list[Path | str | np.ndarray]):
+        """
+        Args:
+            frames (list[Path | str | np.ndarray]): Frames in BGR or BGRA, all of the same size.
+        """
+        self.frames = list(frames)
+        self.index = 0
+        self._loaded = dict()
+
+    def frame(self) -> np.ndarray:
+        if self.index not in self._loaded:
+            frame = self.frames[self.index]
+            if not isinstance(frame, np.ndarray):
+                frame = cv2.imread(str(frame), cv2.IMREAD_UNCHANGED)
+                if frame is None:
+                    raise FileNotFoundError(f'Unreadable frame: {self.frames[self.index]}')
+            if frame.shape[2] == 3:
+                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2BGRA)
+            self._loaded = {self.index: frame}
+        return self._loaded[self.index]
+
+    def seek(self, index: int) -> None:
+        self.index = max(0, min(index, len(self.frames) - 1))
+
+    def advance(self) -> bool:
+        """Move to the next frame, returns False when already on the last one."""
+        if self.index + 1 >= len(self.frames):
+            return False
+        self.index += 1
+        return True
+
+    def monitors(self) -> list[dict]:
+        height, width = self.frame().shape[:2]
+        monitor = {'left': 0, 'top': 0, 'width': width, 'height': height}
+        return [monitor, dict(monitor)]
+
+    def grab(self, left: int, top: int, width: int, height: int) -> np.ndarray:
+        return self.frame()[top:top + height, left:left + width]
+
+class CaptureSession:
+    """
+    Long-lived screen capture shared by the scrapers and the input controller.
+
+    Grabs are converted into pre-allocated BGR buffers, kept in a small ring per
+    size: an image returned by `grab` stays valid until `buffers` more grabs of
+    the same size have been made, copy it to keep it longer.
+    """
+
+    def __init__(self, backend: CaptureBackend = None, buffers: int = 4):
+        """
+        Args:
+            backend (CaptureBackend, optional): Frame source. Defaults to a live MSSBackend.
+            buffers (int, optional): Buffers kept for each grab size. Defaults to 4.
+        """
+        self.backend = backend or MSSBackend()
+        self.buffers = buffers
+        self._ring = defaultdict(list)
+        self._next = defaultdict(int)
+        self._lock = threading.Lock()
+        # FrameRecorder of the grabs, see scraping.utils.replay
+        self.recorder = None
+
+    def monitor(self, index: int = 1) -> dict:
+        return self.backend.monitors()[index]
+
+    def _buffer(self, shape: tuple) -> np.ndarray:
+        ring = self._ring[shape]
+        index = self._next[shape]
+        self._next[shape] = (index + 1) % self.buffers
+        if index == len(ring):
+            ring.append(np.empty(shape, dtype=np.uint8))
+        return ring[index]
+
+    def grabRaw(self, roi: Coordinates = None, monitor: int = 1) -> np.ndarray:
+        """
+        Grab a ROI as the backend returns it (BGRA), without any copy where the backend allows it.
+
+        Args:
+            roi (Coordinates, optional): Region relative to the monitor. Defaults to the whole monitor.
+            monitor (int, optional): Monitor index. Defaults to 1.
+        """
+        return self.backend.grab(*self._region(roi, monitor))
+
+    def _region(self, roi: Coordinates, monitor: int) -> tuple[int, int, int, int]:
+        mon = self.monitor(monitor)
+        if roi is None:
+            roi = Coordinates(0, 0, mon['width'], mon['height'])
+        return (
+            mon['left'] + int(roi.x), mon['top'] + int(roi.y),
+            max(1, int(roi.w)), max(1, int(roi.h))
+        )
+
+    def grab(self, roi: Coordinates = None, monitor: int = 1) -> np.ndarray:
+        """
+        Grab a ROI as a BGR image.
+
+        Args:
+            roi (Coordinates, optional): Region relative to the monitor. Defaults to the whole monitor.
+            monitor (int, optional): Monitor index. Defaults to 1.
+
+        Returns:
+            np.ndarray: One of the ring buffers of the ROI size.
+        """
+        with self._lock:
+            region = self._region(roi, monitor)
+            raw = self.backend.grab(*region)
+            image = cv2.cvtColor(raw, cv2.COLOR_BGRA2BGR, dst=self._buffer(raw.shape[:2] + (3,)))
+            if self.recorder is not None:
+                self.recorder.frame(region, image)
+            return image
+
+    def close(self) -> None:
+        self.backend.close()
+        self._ring.clear()
+        self._next.clear()
+
+_session = None
+
+def getCaptureSession() -> CaptureSession:
+    """Capture session of the current process, created on first use."""
+    global _session
+    if _session is None:
+        _session = CaptureSession()
+    return _session
+
+def setCaptureBackend(backend: CaptureBackend) -> CaptureSession:
+    """Replace the capture session of the current process, e.g. with a FileBackend."""
+    global _session
+    if _session is not None:
+        _session.close()
+    _session = CaptureSession(backend)
+    return _session
@@ -0,0 +1,157 @@
+import queue
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+from scraping.utils.telemetry import stageTimer
+
+logger = logging.getLogger('ResultChannel')
+
+# Kinds of records, the data of each being:
+ITEM = 'item'                   # [item ID, amount]
+WEAPON = 'weapon'               # {weapon ID: {level, ascension, rank}}
+ECHO = 'echo'                   # {echo ID: {level, tuneLv, sonata, rarity, stats}}
+FAILED = 'failed'               # {image, name, owned} of an unrecognized item
+CHARACTERS = 'characters'       # Every resonator, as exported
+ACHIEVEMENT = 'achievement'     # An achievement, as exported
+PROGRESS = 'progress'           # {page, pages, stages} of the running scraper, pages None when unknown
+DONE = 'done'                   # None, sent once every result is
+ERROR = 'error'                 # Message of the error that ended the scan
+
+@dataclass(frozen=True)
+class Record:
+    kind: str
+    scraper: str = None
+    data: Any = None
+
+class ResultChannel:
+    """
+    Streams the results of the scraper process to the parent as records, as
+    soon as they are recognized, along with the progress of the scan.
+
+    Without a queue every record is dropped. A `ResultCollector` can stand in
+    for the queue, to collect the results in the same process (e.g. a replay).
+    """
+
+    def __init__(self, resultQueue = None):
+        """
+        Args:
+            resultQueue (multiprocessing.Queue, optional): Queue read by a `ResultCollector`.
+        """
+        self.queue = resultQueue
+
+    def send(self, kind: str, scraper: str = None, data: Any = None) -> None:
+        if self.queue is not None:
+            self.queue.put(Record(kind, scraper, data))
+
+    def results(self, scraper: str, result: dict) -> None:
+        """Send the results of a page or a scraper, as lists of records by key (`inventory` holding pairs)."""
+        for item in result.get('inventory', []):
+            self.send(ITEM, scraper, list(item))
+        for weapon in result.get('weapons', []):
+            self.send(WEAPON, scraper, weapon)
+        for echo in result.get('echoes', []):
+            self.send(ECHO, scraper, echo)
+        for failed in result.get('failed', []):
+            self.send(FAILED, scraper, failed)
+        for achievement in result.get('achievements', []):
+            self.send(ACHIEVEMENT, scraper, achievement)
+        if result.get('resonator'):
+            self.send(CHARACTERS, scraper, result['resonator'])
+
+    def progress(self, scraper: str, page: int, pages: int = None) -> None:
+        """Send the progress of a scraper, along with the stage timings of the scan so far."""
+        self.send(PROGRESS, scraper, {'page': page, 'pages': pages, 'stages': stageTimer.snapshot()})
+
+_channel = ResultChannel()
+
+def getChannel() -> ResultChannel:
+    """Result channel of the current process."""
+    return _channel
+
+def setChannel(channel: ResultChannel) -> ResultChannel:
+    global _channel
+    _channel = channel
+    return _channel
+
+@dataclass
+class ResultCollector:
+    """
+    Builds the results of a scan from the records of a `ResultChannel`, in
+    the parent process, as they arrive.
+    """
+    inventory: dict = field(default_factory=dict)
+    failed: list = field(default_factory=list)
+    weapons: list = field(default_factory=list)
+    echoes: list = field(default_factory=list)
+    resonator: dict = field(default_factory=dict)
+    achievements: list = field(default_factory=list)
+    counts: dict = field(default_factory=dict)
+    progress: dict = field(default_factory=dict)
+    done: bool = False
+    error: str = None
+
+    def apply(self, record: Record) -> None:
+        match record.kind:
+            case 'item':
+                self.inventory[record.data[0]] = record.data[1]
+            case 'weapon':
+                self.weapons.append(record.data)
+            case 'echo':
+                self.echoes.append(record.data)
+            case 'failed':
+                self.failed.append(record.data)
+            case 'characters':
+                self.resonator.update(record.data)
+            case 'achievement':
+                self.achievements.append(record.data)
+            case 'progress':
+                self.progress[record.scraper] = record.data
+            case 'done':
+                self.done = True
+            case 'error':
+                self.error = record.data
+        if record.kind not in (PROGRESS, DONE, ERROR):
+            self.counts[record.kind] = self.counts.get(record.kind, 0) + 1
+
+    def put(self, record: Record) -> None:
+        """Apply a record sent in the same process, the collector standing in for the queue of a `ResultChannel`."""
+        self.apply(record)
+
+    def consume(self, resultQueue, isAlive: Callable[[], bool], onRecord: Callable[[Record], None] = None, timeout: float = .2) -> None:
+        """
+        Apply the records of the queue until the scan is done, or until the
+        scraper process is gone and the queue is empty.
+
+        Args:
+            resultQueue (multiprocessing.Queue): Queue of the `ResultChannel`.
+            isAlive (Callable[[], bool]): Whether the scraper process still runs.
+            onRecord (Callable[[Record], None], optional): Called after every record, e.g. to show the progress.
+            timeout (float, optional): Seconds waited for a record before checking the process again. Defaults to .2.
+        """
+        finished = False
+        while not self.done:
+            try:
+                record = resultQueue.get(timeout=timeout)
+            except queue.Empty:
+                # One more wait once the process is gone, for the records it flushed on exit
+                if finished:
+                    break
+                finished = not isAlive()
+                continue
+            except (EOFError, OSError) as e:
+                logger.error(f'Result channel closed: {e}', exc_info=True)
+                break
+
+            self.apply(record)
+            if onRecord is not None:
+                onRecord(record)
+
+    def scanned(self) -> dict[str, tuple]:
+        """Results by export file, as for `savingScraped`."""
+        return {
+            'characters_wuwainventorykamera.json': (self.resonator, dict),
+            'weapons_wuwainventorykamera.json': (self.weapons, list),
+            'echoes_wuwainventorykamera.json': (self.echoes, list),
+            'achievements_wuwainventorykamera.json': (self.achievements, list),
+        }
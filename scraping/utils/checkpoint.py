@@ -0,0 +1,111 @@
+import json
+import time
+import logging
+import threading
+from pathlib import Path
+
+logger = logging.getLogger('ScanJournal')
+
+# Seconds after which an interrupted scan is considered abandoned and scanned again
+MAX_AGE = 30 * 60
+
+class ScanJournal:
+    """
+    Checkpoints of a running scan, appended to a JSON lines file as each grid
+    page and each scraper completes, so that a scan killed midway (stop key,
+    game out of focus) resumes where it stopped.
+
+    The journal only resumes a recent scan of the same scrapers on the same
+    screen, and is removed once the scan has been saved.
+    """
+
+    def __init__(self, path: Path, maxAge: float = MAX_AGE, **info):
+        """
+        Args:
+            path (Path): Journal file.
+            maxAge (float, optional): Seconds since the interrupted scan last started, past which it isn't resumed. Defaults to MAX_AGE.
+            **info: What identifies the scan (scrapers, screen size, thresholds, ...).
+        """
+        self.path = Path(path)
+        self.maxAge = maxAge
+        self.info = json.loads(json.dumps(info, default=str))
+        self.pages = dict()
+        self.scrapers = dict()
+        self._lock = threading.Lock()
+        self._file = None
+
+    def load(self) -> bool:
+        """
+        Read the checkpoints of the interrupted scan, if it matches this one.
+
+        Returns:
+            bool: Whether there is anything to resume.
+        """
+        entries = []
+        try:
+            with open(self.path, 'r', encoding='utf-8') as file:
+                for line in file:
+                    try:
+                        entries.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        # A line cut by the kill only loses the last checkpoint
+                        break
+        except FileNotFoundError:
+            return False
+        except OSError as e:
+            logger.warning(f'Failed to read the scan journal: {e}')
+            return False
+
+        if not entries or entries[0].get('event') != 'start' or entries[0].get('info') != self.info:
+            return False
+        # The inventory may have changed since, e.g. after an abort days ago
+        age = time.time() - entries[0].get('time', 0)
+        if not 0 <= age <= self.maxAge:
+            logger.info(f'Discarding a scan journal from {age / 60:.0f} minutes ago')
+            return False
+
+        for entry in entries[1:]:
+            if entry['event'] == 'page':
+                self.pages.setdefault(entry['scraper'], dict())[entry['fingerprint']] = entry['result']
+            elif entry['event'] == 'scraper':
+                self.scrapers[entry['scraper']] = entry['result']
+        return bool(self.pages or self.scrapers)
+
+    def start(self) -> None:
+        """Start the journal over with the checkpoints loaded, dropping anything else."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, 'w', encoding='utf-8')
+        self._write({'event': 'start', 'info': self.info, 'time': time.time()})
+        for scraper, pages in self.pages.items():
+            for fingerprint, result in pages.items():
+                self._write({'event': 'page', 'scraper': scraper, 'fingerprint': fingerprint, 'result': result})
+        for scraper, result in self.scrapers.items():
+            self._write({'event': 'scraper', 'scraper': scraper, 'result': result})
+
+    def _write(self, entry: dict) -> None:
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(json.dumps(entry, default=str) + '\n')
+            # Flushed at once, as the process can be killed at any time
+            self._file.flush()
+
+    def page(self, scraper: str, fingerprint: str, result: dict) -> None:
+        self._write({'event': 'page', 'scraper': scraper, 'fingerprint': fingerprint, 'result': result})
+
+    def scraper(self, scraper: str, result) -> None:
+        # Only written, the results of this scan being already sent
+        self._write({'event': 'scraper', 'scraper': scraper, 'result': result})
+
+    def finish(self) -> None:
+        """Remove the journal of the completed scan."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f'Failed to remove the scan journal: {e}', exc_info=True)
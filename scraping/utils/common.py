@@ -1,15 +1,34 @@
 import re
-import mss
+import bisect
 import cv2
 import json
 import ctypes
+import string
+import threading
 import numpy as np
-import win32clipboard
 from pathlib import Path
+from functools import lru_cache
+from concurrent.futures import Future
+from collections import defaultdict
+
+try:
+    import win32clipboard
+except ImportError:
+    # Only replays (scraping.utils.replay) run without the Windows API
+    win32clipboard = None
 
 from properties.config import (
-    cfg, INVENTORY, ocr
+    cfg, INVENTORY, basePATH
 )
+from game.gameROI import Coordinates
+from scraping.utils.cache import OCRCache
+from scraping.utils.capture import getCaptureSession
+from scraping.utils.fuzzy import FuzzyIndex
+from scraping.utils.database import openDatabase
+from scraping.utils.confusion import NameResolver
+from scraping.utils.icons import IconIndex, IconMatcher
+from scraping.utils.telemetry import stageTimer
+from scraping.utils.ocrService import OCRService
 
 def loadFile(filePATH: str, default = {}) -> dict:
     try:
@@ -21,17 +40,56 @@ def loadFile(filePATH: str, default = {}) -> dict:
     except (FileNotFoundError, json.JSONDecodeError):
         return default
 
-itemsID: dict = loadFile('./data/items.json')
-charactersID: dict = loadFile('./data/characters.json')
-weaponsID: dict = loadFile('./data/weapons.json')
-echoesID: dict = loadFile('./data/echoes.json')
-achievementsID: dict = loadFile('./data/achievements.json')
-echoStats: dict = loadFile('./data/echoStats.json')
-definedText: dict = loadFile('./data/definedText.json')
-sonataName: list = loadFile('./data/sonataName.json', [])
-
-def savingScraped(scannedData: dict = {'inventory_wuwainventorykamera.json': (INVENTORY['items'], dict)}, START_DATE: str = ''):
-    savePATH: Path = Path(cfg.get(cfg.exportFolder)) / START_DATE
+# Tables memory-mapped from the database compiled by the updater, the JSON files being read if it is missing
+database = openDatabase(Path('./data'))
+
+def loadTable(file: str, default = {}) -> dict:
+    table = database.table(file) if database is not None else None
+    if table is None:
+        return loadFile(f'./data/{file}', default)
+    return list(table) if isinstance(default, list) else table
+
+def loadIndex(file: str, table: dict) -> FuzzyIndex:
+    index = database.fuzzyIndex(file) if database is not None else None
+    return index if index is not None else FuzzyIndex(table)
+
+itemsID: dict = loadTable('items.json')
+charactersID: dict = loadTable('characters.json')
+weaponsID: dict = loadTable('weapons.json')
+echoesID: dict = loadTable('echoes.json')
+achievementsID: dict = loadTable('achievements.json')
+echoStats: dict = loadTable('echoStats.json')
+definedText: dict = loadTable('definedText.json')
+sonataName: list = loadTable('sonataName.json', [])
+
+# Fuzzy name lookups of the OCR'd names, built on the first query
+itemsIndex = loadIndex('items.json', itemsID)
+charactersIndex = loadIndex('characters.json', charactersID)
+weaponsIndex = loadIndex('weapons.json', weaponsID)
+echoesIndex = loadIndex('echoes.json', echoesID)
+achievementsIndex = loadIndex('achievements.json', achievementsID)
+# OCR confusions learned from the matched and manually corrected names
+nameResolver = NameResolver(basePATH / 'cache' / 'confusion.json')
+# Icons of the grid thumbnails, memory-mapped from the index of the assets on the first match
+iconIndex = IconIndex(basePATH / 'assets')
+itemIcons = IconMatcher(iconIndex, itemsID)
+weaponIcons = IconMatcher(iconIndex, weaponsID, itemsID)
+
+# OCR engines, one per worker, loaded on the first use of the service (see getOCR)
+_ocrService = None
+_ocrLock = threading.Lock()
+
+# Cached OCR matches depend on the databases above, so they invalidate the cache
+ocrCache = OCRCache(
+    basePATH / 'cache' / 'ocr.sqlite',
+    [Path('./data') / file for file in (
+        'items.json', 'characters.json', 'weapons.json', 'echoes.json',
+        'achievements.json', 'echoStats.json', 'definedText.json', 'sonataName.json'
+    )]
+)
+
+def savingScraped(scannedData: dict = {'inventory_wuwainventorykamera.json': (INVENTORY['items'], dict)}, START_DATE: str = '', exportFolder: Path = None):
+    savePATH: Path = Path(exportFolder or cfg.get(cfg.exportFolder)) / START_DATE
     
     if any(data != emptyType() for data, emptyType in scannedData.values()):
         savePATH.mkdir(parents=True, exist_ok=True)
@@ -42,28 +100,54 @@ def savingScraped(scannedData: dict = {'inventory_wuwainventorykamera.json': (IN
                 with open(filePATH, 'w', encoding='utf-8') as f:
                     json.dump(data, f)
 
+@stageTimer.timed('capture')
 def screenshot(left: int = 0, top: int = 0, width: int = 0, height: int = 0, monitor: int = 1, bw: bool = False):
-
-    with mss.mss() as sct:
-        mon = sct.monitors[monitor]
-        if all(coord == 0 for coord in [top, left, width, height]):
-            left, top, width, height = tuple(coord for coord in mon.values())
-
-        region = {
-            'left': mon['left'] + left,
-            'top': mon['top'] + top,
-            'width': width,
-            'height': height,
-            'mon': monitor
-        }
-        image = np.array(sct.grab(region))
-        image = cv2.cvtColor(image, cv2.COLOR_RGBA2RGB)
+    roi = None
+    if any(coord != 0 for coord in [top, left, width, height]):
+        roi = Coordinates(left, top, width, height)
+    image = getCaptureSession().grab(roi, monitor)
     
     if bw:
         image = convertToBlackWhite(image)
 
     return image
 
+def screenshotRegions(rois: dict[str, Coordinates], monitor: int = 1, copy: bool = False) -> dict[str, np.ndarray]:
+    """
+    Capture several ROIs with a single grab of their union bounding box.
+
+    Args:
+        rois (dict[str, Coordinates]): ROIs relative to the monitor, by key.
+        monitor (int, optional): Monitor index. Defaults to 1.
+        copy (bool, optional): Copy the grab out of the capture buffers, to keep the images past the next grabs. Defaults to False.
+
+    Returns:
+        dict[str, np.ndarray]: The image of each ROI, by key.
+    """
+    if not rois:
+        return dict()
+
+    left = min(int(roi.x) for roi in rois.values())
+    top = min(int(roi.y) for roi in rois.values())
+    right = max(int(roi.x + roi.w) for roi in rois.values())
+    bottom = max(int(roi.y + roi.h) for roi in rois.values())
+
+    image = screenshot(left, top, right - left, bottom - top, monitor)
+    if copy:
+        image = image.copy()
+    return {
+        key: image[int(roi.y) - top:int(roi.y + roi.h) - top, int(roi.x) - left:int(roi.x + roi.w) - left]
+        for key, roi in rois.items()
+    }
+
+def getOCR() -> OCRService:
+    """OCR service of the process, created on its first use."""
+    global _ocrService
+    with _ocrLock:
+        if _ocrService is None:
+            _ocrService = OCRService(cfg.get(cfg.ocrWorkers))
+        return _ocrService
+
 def convertToBlackWhite(image: np.ndarray):
     if len(image.shape) == 3 and image.shape[2] == 3:
         gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
@@ -89,60 +173,288 @@ def convertToBlackWhite(image: np.ndarray):
 
     return sharpened
 
+def _toColor(image: np.ndarray) -> np.ndarray:
+    if len(image.shape) == 2:
+        return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+    return image
+
+def _textFilter(allowedChars: str = None, bannedChars: str = None):
+    bannedPattern = re.compile(f"[{re.escape(bannedChars)}]") if bannedChars else None
+    allowedPattern = re.compile(f"[^{re.escape(allowedChars)}]") if allowedChars else None
+
+    def _filter(text: str) -> str:
+        if bannedPattern:
+            text = bannedPattern.sub('', text)
+        if allowedPattern:
+            text = allowedPattern.sub('', text)
+        return text
+
+    return _filter
+
+def _groupLines(lines: list[tuple[list, str]], divisor: str = ' ') -> str:
+    groupedLines = []
+    currentRow = []
+    lastY = None
+
+    for bbox, text in lines:
+        yMin = min(point[1] for point in bbox)
+        yMax = max(point[1] for point in bbox)
+
+        if lastY is None or (yMin < lastY + 10):
+            currentRow.append(text)
+        else:
+            groupedLines.append(currentRow)
+            currentRow = [text]
+            
+        lastY = yMax
+
+    if currentRow:
+        groupedLines.append(currentRow)
+
+    finalOutput = []
+    for row in groupedLines:
+        finalOutput.append(divisor.join(row))
+    
+    return '\n'.join(finalOutput).strip()
+
+# OCR modes, selected per ROI through game.gameROI.OCR_MODES:
+# - 'full': detection + angle classification + recognition, lines re-grouped by Y.
+# - 'line': the crop is one line of text and goes straight to the recognizer.
+# - 'digits': like 'line', but decoded only over the allowed charset (digits by default).
+OCR_FULL, OCR_LINE, OCR_DIGITS = 'full', 'line', 'digits'
+# A constrained frame is kept only if its best allowed char scores at least this
+# fraction of the unconstrained best, so clear letters (e.g. 'Lv.') are dropped, not coerced.
+DIGITS_MIN_RELATIVE_SCORE = 0.1
+
+@lru_cache(maxsize=16)
+def _charsetIndices(charset: str, character: tuple[str]) -> np.ndarray:
+    return np.array([0] + [index for index, char in enumerate(character) if char in charset], dtype=np.int64)
+
+def _recognize(engine, images: list[np.ndarray], charset: str = None) -> list[str]:
+    """
+    Run only the recognition model on single-line crops, optionally decoding over `charset` only.
+    Texts scoring under the text score of the engine are returned empty.
+
+    Uses the internals of the RapidOCR recognizer, hence the version pinned in requirements.txt.
+    """
+    images = [_toColor(image) for image in images]
+    textRec = engine.text_rec
+
+    if charset is None:
+        results = textRec(images)[0]
+        return [result[0] if result[1] >= engine.text_score else '' for result in results]
+
+    _, imgH, imgW = textRec.rec_image_shape[:3]
+    results = []
+    for start in range(0, len(images), textRec.rec_batch_num):
+        batch = images[start:start + textRec.rec_batch_num]
+        maxRatio = max([imgW / imgH] + [image.shape[1] / image.shape[0] for image in batch])
+        normBatch = np.stack([textRec.resize_norm_img(image, maxRatio) for image in batch]).astype(np.float32)
+        preds = textRec.session(normBatch)[0]
+
+        indices = _charsetIndices(charset, tuple(textRec.postprocess_op.character))
+        allowed = preds[:, :, indices]
+        predsIdx = indices[allowed.argmax(axis=2)]
+        predsProb = allowed.max(axis=2)
+        predsIdx[predsProb < preds.max(axis=2) * DIGITS_MIN_RELATIVE_SCORE] = 0
+
+        decoded = textRec.postprocess_op.decode(predsIdx, predsProb, is_remove_duplicate=True)
+        results.extend(result[0] if result[1] >= engine.text_score else '' for result in decoded)
+
+    return results
+
+def _detect(engine, image: np.ndarray) -> list:
+    """Full detection + recognition pass of the engine."""
+    return engine(image)[0] or []
+
+def _lineTexts(images: list[np.ndarray], options: list[dict]) -> list[str]:
+    """
+    Recognition-only OCR of several single-line ROIs, grouped by charset into
+    batched recognizer calls, each group split between the OCR workers.
+    """
+    texts = [''] * len(images)
+    groups = defaultdict(list)
+    for index, keyOptions in enumerate(options):
+        charset = None
+        if keyOptions.get('mode') == OCR_DIGITS:
+            charset = keyOptions.get('allowedChars') or string.digits
+        groups[charset].append(index)
+
+    batches = []
+    for charset, indices in groups.items():
+        size = -(-len(indices) // getOCR().workers)
+        for start in range(0, len(indices), size):
+            batch = indices[start:start + size]
+            batches.append((batch, getOCR().submit(_recognize, [images[index] for index in batch], charset)))
+
+    for indices, future in batches:
+        for index, text in zip(indices, future.result()):
+            keyOptions = options[index]
+            texts[index] = _textFilter(keyOptions.get('allowedChars'), keyOptions.get('bannedChars'))(text).strip()
+
+    return texts
+
+def _imageToString(engine, image: np.ndarray, divisor: str, allowedChars: str, bannedChars: str, mode: str) -> str:
+    try:
+        if mode != OCR_FULL:
+            return _lineTexts([image], [{'allowedChars': allowedChars, 'bannedChars': bannedChars, 'mode': mode}])[0]
+
+        ocrResults = _detect(engine, image)
+        textFilter = _textFilter(allowedChars, bannedChars)
+
+        lines = [(bbox, textFilter(text)) for bbox, text, _ in ocrResults]
+        return _groupLines(lines, divisor)
+
+    except:
+        return ''
+
+def imageToStringAsync(
+    image: np.ndarray,
+    divisor: str = ' ',
+    allowedChars: str = None,
+    bannedChars: str = None,
+    mode: str = OCR_FULL
+) -> Future:
+    """Same as `imageToString`, returning a future of the text, so that several crops can be recognized at once."""
+    return getOCR().submit(_imageToString, image, divisor, allowedChars, bannedChars, mode)
+
+@stageTimer.timed('ocr')
 def imageToString(
     image: np.ndarray, 
     divisor: str = ' ', 
     allowedChars: str = None, 
-    bannedChars: str = None
+    bannedChars: str = None,
+    mode: str = OCR_FULL
 ) -> str:
+    return imageToStringAsync(image, divisor, allowedChars, bannedChars, mode).result()
+
+@stageTimer.timed('ocr')
+def imageToBoxes(image: np.ndarray, bannedChars: str = None) -> list[tuple[Coordinates, str]]:
+    """
+    Detect and read every text box of an image, e.g. a list whose rows move.
+
+    Returns:
+        list[tuple[Coordinates, str]]: The axis-aligned box, relative to the image, and the text of every detection.
+    """
+    textFilter = _textFilter(None, bannedChars)
+    boxes = []
+    for bbox, text, _ in getOCR().run(_detect, _toColor(image)):
+        xs, ys = [point[0] for point in bbox], [point[1] for point in bbox]
+        boxes.append((Coordinates(min(xs), min(ys), max(xs) - min(xs), max(ys) - min(ys)), textFilter(text).strip()))
+    return boxes
+
+# Vertical gap between ROIs in the batch mosaic, large enough that the
+# detector never merges text boxes of two neighbouring ROIs.
+OCR_BATCH_GAP = 32
+# Keep mosaics under RapidOCR's max_side_len, otherwise they get downscaled.
+OCR_BATCH_MAX_HEIGHT = 1800
+
+def _buildMosaics(images: list[np.ndarray]) -> list[tuple[np.ndarray, list[tuple[int, int]]]]:
+    """Stack the images vertically into as few mosaics as possible, returning each mosaic with the (top, height) of its images."""
+    groups = [[]]
+    height = 0
+    for image in images:
+        if groups[-1] and height + OCR_BATCH_GAP + image.shape[0] > OCR_BATCH_MAX_HEIGHT:
+            groups.append([])
+            height = 0
+        height += image.shape[0] + (OCR_BATCH_GAP if groups[-1] else 0)
+        groups[-1].append(image)
+
+    mosaics = []
+    for group in groups:
+        width = max(image.shape[1] for image in group)
+        height = sum(image.shape[0] for image in group) + OCR_BATCH_GAP * (len(group) - 1)
+        mosaic = np.zeros((height, width, 3), dtype=np.uint8)
+
+        spans = []
+        top = 0
+        for image in group:
+            h, w = image.shape[:2]
+            mosaic[top:top + h, :w] = _toColor(image)
+            spans.append((top, h))
+            top += h + OCR_BATCH_GAP
+        mosaics.append((mosaic, spans))
+
+    return mosaics
+
+@stageTimer.timed('ocr')
+def imagesToStrings(images: dict[str, np.ndarray], options: dict[str, dict] = None) -> dict[str, str]:
+    """
+    OCR several ROIs of the same frame with a single detection and recognition pass.
+
+    Args:
+        images (dict[str, np.ndarray]): ROI key -> cropped image.
+        options (dict[str, dict], optional): ROI key -> `imageToString` keyword arguments
+            (divisor, allowedChars, bannedChars, mode) for that ROI.
+
+    Returns:
+        dict[str, str]: ROI key -> recognized text, grouped by line like `imageToString`.
+    """
+    options = options or {}
+    keys = list(images)
+    results = {key: '' for key in keys}
+    if not keys:
+        return results
+
+    lineKeys = [key for key in keys if options.get(key, {}).get('mode', OCR_FULL) != OCR_FULL]
+    keys = [key for key in keys if key not in lineKeys]
+
+    # The mosaics are detected by the workers while the line ROIs are recognized
+    mosaics = []
     try:
-        ocrResults = ocr(image)[0]
-        
-        banned_pattern = re.compile(f"[{re.escape(bannedChars)}]") if bannedChars else None
-        allowed_pattern = re.compile(f"[^{re.escape(allowedChars)}]") if allowedChars else None
-        
-        lines = []
-        for bbox, text, _ in ocrResults:
-            if banned_pattern:
-                text = banned_pattern.sub('', text)
-            
-            if allowed_pattern:
-                text = allowed_pattern.sub('', text)
-                
-            lines.append((bbox, text))
-
-        groupedLines = []
-        currentRow = []
-        lastY = None
-
-        for bbox, text in lines:
-            yMin = min(point[1] for point in bbox)
-            yMax = max(point[1] for point in bbox)
-
-            if lastY is None or (yMin < lastY + 10):
-                currentRow.append(text)
-            else:
-                groupedLines.append(currentRow)
-                currentRow = [text]
-                
-            lastY = yMax
-
-        if currentRow:
-            groupedLines.append(currentRow)
+        mosaics = [(getOCR().submit(_detect, mosaic), spans) for mosaic, spans in _buildMosaics([images[key] for key in keys])] if keys else []
+    except:
+        pass
+
+    if lineKeys:
+        try:
+            texts = _lineTexts([images[key] for key in lineKeys], [options[key] for key in lineKeys])
+            results.update(zip(lineKeys, texts))
+        except:
+            pass
+        if not keys:
+            return results
+
+    try:
+        lines = {key: [] for key in keys}
+        index = 0
+        for future, spans in mosaics:
+            ocrResults = future.result()
+            tops = [top for top, _ in spans]
+
+            for bbox, text, _ in ocrResults:
+                yCenter = sum(point[1] for point in bbox) / len(bbox)
+                position = max(0, bisect.bisect_right(tops, yCenter) - 1)
+                top, height = spans[position]
+                if yCenter > top + height + OCR_BATCH_GAP / 2 and position + 1 < len(spans):
+                    position += 1
+                    top = spans[position][0]
 
-        finalOutput = []
-        for row in groupedLines:
-            finalOutput.append(divisor.join(row))
-        
-        return '\n'.join(finalOutput).strip()
+                key = keys[index + position]
+                bbox = [(point[0], point[1] - top) for point in bbox]
+                lines[key].append((bbox, text))
+            index += len(spans)
+
+        for key in keys:
+            keyOptions = options.get(key, {})
+            textFilter = _textFilter(keyOptions.get('allowedChars'), keyOptions.get('bannedChars'))
+            results[key] = _groupLines(
+                [(bbox, textFilter(text)) for bbox, text in lines[key]],
+                keyOptions.get('divisor', ' ')
+            )
 
     except:
-        return ''
+        pass
+
+    return results
 
 def isUserAdmin():
     return ctypes.windll.shell32.IsUserAnAdmin()
 
 def copyToClipboard(text):
+    if win32clipboard is None:
+        return
+
     try:
         win32clipboard.OpenClipboard()
         win32clipboard.EmptyClipboard()
@@ -0,0 +1,163 @@
+import json
+import logging
+import threading
+from pathlib import Path
+from difflib import SequenceMatcher
+from collections import Counter
+
+from scraping.utils.fuzzy import FuzzyIndex
+from scraping.utils.telemetry import stageTimer
+
+logger = logging.getLogger('NameResolver')
+
+# Typical OCR confusions of the game font, as (read, actual) with their prior count.
+# '' on one side is a dropped or an extra character.
+SEED_CONFUSIONS = {
+    ('1', 'l'): 1, ('l', '1'): 1, ('0', 'o'): 1, ('o', '0'): 1,
+    ('l', 'i'): 1, ('i', 'l'): 1, ('5', 's'): 1, ('rn', 'm'): 1,
+    ('vv', 'w'): 1, ('', "'"): 1, ("'", ''): 1, ('', '-'): 1
+}
+# Cost of an edit never seen, and the floor of the learned ones
+EDIT_COST, MIN_EDIT_COST = 1.0, 0.2
+# Longest substring learned as a single confusion (e.g. 'rn' for 'm')
+MAX_CONFUSION_LENGTH = 2
+
+def _alignments(read: str, actual: str) -> list[tuple[str, str]]:
+    """Substitutions turning `read` into `actual`, per character where the lengths allow it."""
+    pairs = []
+    for tag, i1, i2, j1, j2 in SequenceMatcher(None, read, actual, autojunk=False).get_opcodes():
+        if tag == 'equal':
+            continue
+        source, target = read[i1:i2], actual[j1:j2]
+        if len(source) == len(target):
+            pairs.extend(zip(source, target))
+        elif max(len(source), len(target)) <= MAX_CONFUSION_LENGTH:
+            pairs.append((source, target))
+        else:
+            # Too long to be a confusion, likely a different name
+            return []
+    return pairs
+
+class NameResolver:
+    """
+    Resolves OCR'd names to the ID tables, weighting the edits by how often the
+    OCR was seen making them.
+
+    The confusions are learned from the names matched with the plain fuzzy
+    lookup and from the manual corrections, and stored in a JSON file.
+    """
+
+    def __init__(self, path: Path):
+        """
+        Args:
+            path (Path): JSON file of the learned confusions, None to keep them in memory only.
+        """
+        self.path = None if path is None else Path(path)
+        self._counts = None
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def _load(self) -> Counter:
+        if self._counts is None:
+            self._counts = Counter(SEED_CONFUSIONS)
+            if self.path is None:
+                return self._counts
+            try:
+                with open(self.path, 'r', encoding='utf-8') as file:
+                    for read, actual, count in json.load(file):
+                        self._counts[(read, actual)] = count
+            except FileNotFoundError:
+                pass
+            except (json.JSONDecodeError, ValueError, TypeError) as e:
+                logger.error(f'Failed to load the confusion table: {e}', exc_info=True)
+        return self._counts
+
+    def learn(self, read: str, actual: str) -> None:
+        """Record the confusions between an OCR'd name and the name it actually was."""
+        if not read or read == actual:
+            return
+        pairs = _alignments(read, actual)
+        with self._lock:
+            counts = self._load()
+            for pair in pairs:
+                counts[pair] += 1
+            self._dirty = self._dirty or bool(pairs)
+
+    def cost(self, read: str, actual: str) -> float:
+        """Cost of reading `actual` as `read`."""
+        count = self._load().get((read, actual), 0)
+        return EDIT_COST if not count else max(MIN_EDIT_COST, EDIT_COST / (1 + count))
+
+    def distance(self, read: str, actual: str) -> float:
+        """Weighted edit distance from the OCR'd `read` to the name `actual`."""
+        with self._lock:
+            multi = [(source, target) for source, target in self._load() if max(len(source), len(target)) > 1]
+
+        rows, cols = len(read) + 1, len(actual) + 1
+        table = [[0.0] * cols for _ in range(rows)]
+        for i in range(1, rows):
+            table[i][0] = table[i - 1][0] + self.cost(read[i - 1], '')
+        for j in range(1, cols):
+            table[0][j] = table[0][j - 1] + self.cost('', actual[j - 1])
+
+        for i in range(1, rows):
+            for j in range(1, cols):
+                substitution = 0.0 if read[i - 1] == actual[j - 1] else self.cost(read[i - 1], actual[j - 1])
+                best = min(
+                    table[i - 1][j] + self.cost(read[i - 1], ''),
+                    table[i][j - 1] + self.cost('', actual[j - 1]),
+                    table[i - 1][j - 1] + substitution
+                )
+                for source, target in multi:
+                    if i >= len(source) and j >= len(target) and read.endswith(source, 0, i) and actual.endswith(target, 0, j):
+                        best = min(best, table[i - len(source)][j - len(target)] + self.cost(source, target))
+                table[i][j] = best
+
+        return table[-1][-1]
+
+    @stageTimer.timed('match')
+    def resolve(self, word: str, index: FuzzyIndex, cutoff: float = 0.9, candidates: int = 10) -> str | None:
+        """
+        Match an OCR'd name against an index.
+
+        The plain fuzzy match is tried first (and learned from). Otherwise the
+        closest names are ranked by the weighted edit distance, and the best is
+        accepted when its distance per character stays within `1 - cutoff`.
+
+        Returns:
+            str | None: The matched name, or None.
+        """
+        result = index.getMatches(word, 1, cutoff)
+        if result:
+            self.learn(word, result[0])
+            return result[0]
+
+        best, bestDistance = None, None
+        for name in index.getMatches(word, candidates, 0.6):
+            distance = self.distance(word, name)
+            if bestDistance is None or distance < bestDistance:
+                best, bestDistance = name, distance
+
+        if best is not None and bestDistance / max(len(word), len(best)) <= 1 - cutoff:
+            return best
+        return None
+
+    def flush(self) -> None:
+        """Save the learned confusions."""
+        with self._lock:
+            if not self._dirty or self.path is None:
+                return
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.path, 'w', encoding='utf-8') as file:
+                    json.dump([[read, actual, count] for (read, actual), count in self._counts.items()], file)
+                self._dirty = False
+            except OSError as e:
+                logger.error(f'Failed to save the confusion table: {e}', exc_info=True)
+
+    def detach(self) -> None:
+        """Keep the confusions in memory only from now on, starting from the ones learned so far."""
+        self.flush()
+        with self._lock:
+            self._load()
+            self.path = None
@@ -0,0 +1,303 @@
+import os
+import json
+import mmap
+import struct
+import hashlib
+import logging
+import numpy as np
+from pathlib import Path
+from collections.abc import MutableMapping, Sequence
+
+from scraping.utils.fuzzy import FuzzyIndex
+
+logger = logging.getLogger('IDDatabase')
+
+MAGIC, VERSION = b'WWDB', 1
+# Magic, version and header size, followed by the JSON header and the arrays
+PREFIX = struct.Struct('<4sII')
+ALIGNMENT = 8
+# JSON tables of the data folder compiled into the database
+TABLES = (
+    'items.json', 'characters.json', 'weapons.json', 'echoes.json',
+    'achievements.json', 'echoStats.json', 'definedText.json', 'sonataName.json'
+)
+# Tables whose keys are fuzzy matched, the histograms of their FuzzyIndex being stored as well
+FUZZY_TABLES = ('items.json', 'characters.json', 'weapons.json', 'echoes.json', 'achievements.json')
+
+def sourcesDigest(folder: Path, files: tuple[str] = TABLES) -> str:
+    stats = []
+    for file in files:
+        try:
+            stat = (Path(folder) / file).stat()
+            stats.append(f'{file}:{stat.st_size}:{stat.st_mtime_ns}')
+        except FileNotFoundError:
+            stats.append(f'{file}:missing')
+    return hashlib.blake2b('|'.join(stats).encode(), digest_size=8).hexdigest()
+
+def databasePath(folder: Path) -> Path:
+    """
+    Database of the current JSON tables of `folder`.
+
+    The name carries the size and modification time of the tables, so an
+    out of date database is never opened, and a new one never replaces a
+    file another process may still have mapped.
+    """
+    return Path(folder) / f'database-{sourcesDigest(folder)}.bin'
+
+def _align(size: int) -> int:
+    return -(-size // ALIGNMENT) * ALIGNMENT
+
+class _StringTable:
+    """Interned UTF-8 strings, referenced by index."""
+
+    def __init__(self):
+        self.indices = dict()
+        self.chunks = []
+        self.offsets = [0]
+
+    def add(self, text: str) -> int:
+        index = self.indices.get(text)
+        if index is None:
+            encoded = text.encode('utf-8')
+            index = self.indices[text] = len(self.chunks)
+            self.chunks.append(encoded)
+            self.offsets.append(self.offsets[-1] + len(encoded))
+        return index
+
+def compileDatabase(folder: Path) -> Path | None:
+    """
+    Compile the JSON tables of `folder` into one binary file, unless it is
+    already up to date, and remove the databases of older tables.
+
+    The file holds an interned string table (keys, and values as JSON), and
+    for every table its keys sorted for binary search, their values, their
+    original order and, for the fuzzy matched tables, the character
+    histograms of their `FuzzyIndex`.
+
+    Returns:
+        Path | None: The database, None if it couldn't be written.
+    """
+    folder = Path(folder)
+    path = databasePath(folder)
+
+    if not path.is_file():
+        strings = _StringTable()
+        arrays, tables = [], dict()
+
+        def addArray(array: np.ndarray) -> list[int]:
+            offset = sum(_align(previous.nbytes) for previous in arrays)
+            arrays.append(np.ascontiguousarray(array))
+            return [offset, *array.shape]
+
+        for file in TABLES:
+            try:
+                with open(folder / file, 'r', encoding='utf-8') as source:
+                    data = json.load(source)
+            except (FileNotFoundError, json.JSONDecodeError):
+                continue
+            if isinstance(data, list):
+                data = dict.fromkeys(data)
+
+            keys = list(data)
+            ranks = sorted(range(len(keys)), key=keys.__getitem__)
+            table = {
+                'keys': addArray(np.array([strings.add(keys[index]) for index in ranks], dtype=np.uint32)),
+                'values': addArray(np.array([strings.add(json.dumps(data[keys[index]], ensure_ascii=False, separators=(',', ':'))) for index in ranks], dtype=np.uint32)),
+                'order': addArray(np.argsort(np.array(ranks, dtype=np.uint32)).astype(np.uint32)),
+            }
+
+            if file in FUZZY_TABLES:
+                chars = sorted({char for key in keys for char in key})
+                alphabet = {char: index for index, char in enumerate(chars)}
+                words = sorted(keys, key=len)
+                histograms = np.zeros((len(words), len(chars)), dtype=np.uint8)
+                for row, word in enumerate(words):
+                    for char in word:
+                        histograms[row, alphabet[char]] = min(255, histograms[row, alphabet[char]] + 1)
+                table['fuzzy'] = {
+                    'alphabet': strings.add(''.join(chars)),
+                    'words': addArray(np.array([strings.add(word) for word in words], dtype=np.uint32)),
+                    'lengths': addArray(np.array([len(word) for word in words], dtype=np.uint32)),
+                    'histograms': addArray(histograms),
+                }
+            tables[file] = table
+
+        header = json.dumps({
+            'strings': {
+                'offsets': addArray(np.array(strings.offsets, dtype=np.uint64)),
+                'data': addArray(np.frombuffer(b''.join(strings.chunks), dtype=np.uint8)),
+            },
+            'tables': tables,
+        }).encode('utf-8')
+
+        temporary = path.with_suffix('.tmp')
+        try:
+            with open(temporary, 'wb') as output:
+                output.write(PREFIX.pack(MAGIC, VERSION, len(header)) + header)
+                output.write(b'\0' * (_align(PREFIX.size + len(header)) - PREFIX.size - len(header)))
+                for array in arrays:
+                    output.write(array.tobytes())
+                    output.write(b'\0' * (_align(array.nbytes) - array.nbytes))
+            os.replace(temporary, path)
+            logger.info(f'Compiled {len(tables)} tables into {path.name}')
+        except OSError as e:
+            logger.error(f'Failed to write the ID database: {e}', exc_info=True)
+            return None
+
+    # Databases still mapped by a running process are removed on a later run
+    for previous in folder.glob('database-*.bin'):
+        if previous != path:
+            try:
+                previous.unlink()
+            except OSError:
+                pass
+    return path
+
+class StringList(Sequence):
+    """Strings of the database, decoded on access."""
+
+    def __init__(self, database: 'IDDatabase', indices: np.ndarray):
+        self.database = database
+        self.indices = indices
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self.database.string(index) for index in self.indices[position]]
+        return self.database.string(self.indices[position])
+
+class BinaryTable(MutableMapping):
+    """
+    ID table read from the database, behaving like the dictionary loaded from
+    its JSON file: keys are found by binary search in the mapped file and
+    iterated in their original order, values are decoded on first access.
+
+    Changes (e.g. the updater adding new entries) stay in memory, in an
+    overlay over the mapped table.
+    """
+
+    def __init__(self, database: 'IDDatabase', keys: np.ndarray, values: np.ndarray, order: np.ndarray):
+        self.database = database
+        self._keys = keys
+        self._values = values
+        self._order = order
+        self._decoded = dict()
+        self._overlay = dict()
+        self._deleted = set()
+
+    def _find(self, key) -> int | None:
+        if not isinstance(key, str):
+            return None
+        low, high = 0, len(self._keys)
+        while low < high:
+            middle = (low + high) // 2
+            if self.database.string(self._keys[middle]) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(self._keys) and self.database.string(self._keys[low]) == key:
+            return low
+        return None
+
+    def __getitem__(self, key):
+        if key in self._overlay:
+            return self._overlay[key]
+        position = None if key in self._deleted else self._find(key)
+        if position is None:
+            raise KeyError(key)
+        if position not in self._decoded:
+            self._decoded[position] = json.loads(self.database.string(self._values[position]))
+        return self._decoded[position]
+
+    def __contains__(self, key) -> bool:
+        return key in self._overlay or (key not in self._deleted and self._find(key) is not None)
+
+    def __setitem__(self, key, value) -> None:
+        self._overlay[key] = value
+        self._deleted.discard(key)
+
+    def __delitem__(self, key) -> None:
+        if key in self._overlay:
+            del self._overlay[key]
+            if self._find(key) is not None:
+                self._deleted.add(key)
+        elif key not in self._deleted and self._find(key) is not None:
+            self._deleted.add(key)
+        else:
+            raise KeyError(key)
+
+    def __iter__(self):
+        for position in self._order:
+            key = self.database.string(self._keys[position])
+            if key not in self._deleted and key not in self._overlay:
+                yield key
+        yield from self._overlay
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return f'BinaryTable({len(self)} entries)'
+
+class IDDatabase:
+    """ID tables memory-mapped from a database written by `compileDatabase`."""
+
+    def __init__(self, path: Path):
+        """
+        Args:
+            path (Path): Database file.
+
+        Raises:
+            ValueError: The file is not a database of this version.
+        """
+        self.path = Path(path)
+        with open(self.path, 'rb') as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, size = PREFIX.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'Not a database of version {VERSION}: {self.path.name}')
+        self._header = json.loads(self._map[PREFIX.size:PREFIX.size + size])
+        self._base = _align(PREFIX.size + size)
+
+        self._offsets = self._array(self._header['strings']['offsets'], np.uint64)
+        self._strings = self._base + self._header['strings']['data'][0]
+
+    def _array(self, spec: list[int], dtype) -> np.ndarray:
+        offset, *shape = spec
+        count = int(np.prod(shape)) if shape else 0
+        return np.frombuffer(self._map, dtype=dtype, count=count, offset=self._base + offset).reshape(shape)
+
+    def string(self, index: int) -> str:
+        start, end = int(self._offsets[index]), int(self._offsets[index + 1])
+        return self._map[self._strings + start:self._strings + end].decode('utf-8')
+
+    def table(self, file: str) -> BinaryTable | None:
+        """Table compiled from the JSON file `file`, None if it wasn't."""
+        spec = self._header['tables'].get(file)
+        if spec is None:
+            return None
+        return BinaryTable(self, *(self._array(spec[name], np.uint32) for name in ('keys', 'values', 'order')))
+
+    def fuzzyIndex(self, file: str) -> FuzzyIndex | None:
+        """FuzzyIndex over the keys of a table, from its precomputed histograms."""
+        spec = self._header['tables'].get(file, {}).get('fuzzy')
+        if spec is None:
+            return None
+        return FuzzyIndex(
+            StringList(self, self._array(spec['words'], np.uint32)),
+            (self.string(spec['alphabet']), self._array(spec['lengths'], np.uint32), self._array(spec['histograms'], np.uint8))
+        )
+
+def openDatabase(folder: Path) -> IDDatabase | None:
+    """Database of the JSON tables of `folder`, None when it is missing or out of date."""
+    path = databasePath(folder)
+    if not path.is_file():
+        return None
+    try:
+        return IDDatabase(path)
+    except (OSError, ValueError, KeyError, struct.error) as e:
+        logger.error(f'Failed to open the ID database: {e}', exc_info=True)
+        return None
@@ -0,0 +1,110 @@
+import json
+import hashlib
+import logging
+import numpy as np
+from pathlib import Path
+
+from scraping.utils.cache import imageHash
+from scraping.utils.grid import cropThumbnail
+
+logger = logging.getLogger('DeltaScan')
+
+# Results of the grid pages, appended as JSON lines next to the export of every scan
+PAGES_FILE = 'pages.jsonl'
+
+def pageFingerprint(thumbnails: dict[tuple[int, int], np.ndarray], screenInfo, *context) -> str:
+    """
+    Fingerprint of a grid page from the thumbnails of its cells.
+
+    The icon and the level (or count) of every cell are binarized and
+    digested at full resolution, so that a single changed digit changes the
+    page. `context` (e.g. the scan thresholds) is part of the key, since the
+    results of a page depend on it as well.
+
+    What the thumbnails don't show, e.g. the rank of a weapon or the tuning
+    and substats of an echo, can't change the fingerprint, and is reused from
+    the previous scan as is.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for value in context:
+        digest.update(repr(value).encode())
+    for cell in sorted(thumbnails):
+        for roi in (screenInfo.thumbnail.icon, screenInfo.thumbnail.level):
+            digest.update(imageHash(cropThumbnail(thumbnails[cell], roi)).encode())
+    return digest.hexdigest()
+
+def loadPreviousPages(folder: Path, current: str = None) -> dict[str, dict[str, dict]]:
+    """
+    Page results of the latest scan exported to `folder`.
+
+    Args:
+        folder (Path): Export folder, holding a subfolder per scan.
+        current (str, optional): Subfolder of the running scan, skipped. Defaults to None.
+
+    Returns:
+        dict[str, dict[str, dict]]: Scraper -> page fingerprint -> page results, empty without a previous scan.
+    """
+    folder = Path(folder)
+    if not folder.is_dir():
+        return dict()
+
+    files = [path / PAGES_FILE for path in folder.iterdir() if path.name != current and (path / PAGES_FILE).is_file()]
+    for file in sorted(files, key=lambda file: file.stat().st_mtime, reverse=True):
+        pages = dict()
+        try:
+            with open(file, 'r', encoding='utf-8') as lines:
+                for line in lines:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A scan killed midway only loses its last page
+                        break
+                    pages.setdefault(entry['scraper'], dict())[entry['fingerprint']] = entry['result']
+            return pages
+        except (OSError, KeyError, TypeError) as e:
+            logger.error(f'Failed to load the pages of {file.parent.name}: {e}', exc_info=True)
+    return dict()
+
+class PageStore:
+    """
+    Results of the grid pages of a scan by fingerprint, starting from the
+    pages of the previous scan, so that unchanged pages are not clicked again.
+
+    The pages of the scan are appended to a file as they complete rather than
+    kept in memory, the next scan loading them with `loadPreviousPages`.
+
+    The results have to be JSON-serializable and keep their types through it,
+    e.g. dictionaries with integer keys are stored as lists of pairs.
+    """
+
+    def __init__(self, previous: dict[str, dict[str, dict]] = None, journal = None, path: Path = None):
+        """
+        Args:
+            previous (dict[str, dict[str, dict]], optional): Pages of the previous scan, from `loadPreviousPages`.
+            journal (ScanJournal, optional): Checkpoint journal every completed page is written to.
+            path (Path, optional): Pages file of the scan, e.g. `PAGES_FILE` in its export folder. Defaults to None, nothing being saved.
+        """
+        self.previous = previous or dict()
+        self.journal = journal
+        self.path = None if path is None else Path(path)
+        self.reused = 0
+
+    def get(self, scraper: str, fingerprint: str) -> dict | None:
+        """Results of an unchanged page, which are kept for the next scan as well."""
+        result = self.previous.get(scraper, {}).get(fingerprint)
+        if result is not None:
+            self.put(scraper, fingerprint, result)
+            self.reused += 1
+        return result
+
+    def put(self, scraper: str, fingerprint: str, result: dict) -> None:
+        """Store the results of a completed page."""
+        if self.path is not None:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.path, 'a', encoding='utf-8') as file:
+                    file.write(json.dumps({'scraper': scraper, 'fingerprint': fingerprint, 'result': result}, default=str) + '\n')
+            except OSError as e:
+                logger.error(f'Failed to save a page of {scraper}: {e}', exc_info=True)
+        if self.journal is not None:
+            self.journal.page(scraper, fingerprint, result)
@@ -0,0 +1,190 @@
+import re
+import cv2
+import string
+import threading
+import numpy as np
+from collections import Counter, defaultdict
+
+from scraping.utils.common import imageToString, OCR_DIGITS
+from scraping.utils.telemetry import stageTimer
+
+# Every glyph is scaled to the line height and centered in a fixed cell.
+GLYPH_HEIGHT, GLYPH_WIDTH = 20, 16
+# Label of glyphs the OCR charset filter drops (e.g. the 'Lv.' before a level).
+JUNK = ''
+
+def _binarize(image: np.ndarray) -> np.ndarray:
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if len(image.shape) == 3 else image
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    if np.mean(binary) > 127: binary = cv2.bitwise_not(binary)
+    return binary
+
+def segmentGlyphs(image: np.ndarray) -> np.ndarray:
+    """
+    Split a single-line crop into glyphs.
+
+    Returns:
+        np.ndarray: One zero-mean, unit-norm vector per glyph (left to right),
+            so the dot product of two glyphs is their normalized correlation.
+    """
+    binary = _binarize(image)
+    count, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+    minArea = max(3, binary.size // 2000)
+
+    boxes = sorted(
+        stats[index, :4].tolist() for index in range(1, count)
+        if stats[index, cv2.CC_STAT_AREA] >= minArea
+    )
+    if not boxes:
+        return np.empty((0, GLYPH_HEIGHT * GLYPH_WIDTH), dtype=np.float32)
+
+    # Components overlapping horizontally belong to the same glyph ('%', broken strokes, ...)
+    merged = []
+    for x, y, w, h in boxes:
+        if merged and x < merged[-1][2]:
+            merged[-1] = [merged[-1][0], min(merged[-1][1], y), max(merged[-1][2], x + w), max(merged[-1][3], y + h)]
+        else:
+            merged.append([x, y, x + w, y + h])
+
+    top = min(box[1] for box in merged)
+    bottom = max(box[3] for box in merged)
+    scale = GLYPH_HEIGHT / (bottom - top)
+
+    glyphs = np.zeros((len(merged), GLYPH_HEIGHT, GLYPH_WIDTH), dtype=np.float32)
+    for index, (x0, _, x1, _) in enumerate(merged):
+        width = min(GLYPH_WIDTH, max(1, round((x1 - x0) * scale)))
+        offset = (GLYPH_WIDTH - width) // 2
+        glyphs[index, :, offset:offset + width] = cv2.resize(binary[top:bottom, x0:x1], (width, GLYPH_HEIGHT), interpolation=cv2.INTER_AREA)
+
+    vectors = glyphs.reshape(len(merged), -1)
+    vectors -= vectors.mean(axis=1, keepdims=True)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+class DigitRecognizer:
+    """
+    Reads fixed-font counters and levels by matching glyphs against an atlas
+    learned from the crops already recognized by the OCR.
+
+    Atlases are kept per key, which should identify both the resolution and the
+    ROI, e.g. (1920, 1080, 'weapons.level'), since the glyph size depends on both.
+    """
+
+    def __init__(self, minScore: float = 0.9, maxSamples: int = 6):
+        """
+        Args:
+            minScore (float, optional): Minimum correlation every glyph needs to be trusted. Defaults to 0.9.
+            maxSamples (int, optional): Samples kept per character and key. Defaults to 6.
+        """
+        self.minScore = minScore
+        self.maxSamples = maxSamples
+        self._samples = defaultdict(lambda: defaultdict(list))
+        self._prefixes = defaultdict(Counter)
+        self._atlas = dict()
+        self._lock = threading.Lock()
+
+    @stageTimer.timed('match')
+    def read(self, image: np.ndarray, key, allowedChars: str = None, bannedChars: str = None) -> str | None:
+        """Return the text of the crop, or None when any glyph is unknown or not confidently matched."""
+        atlas = self._atlas.get(key)
+        if atlas is None:
+            return None
+
+        glyphs = segmentGlyphs(image)
+        if not len(glyphs):
+            return None
+
+        matrix, labels = atlas
+        scores = glyphs @ matrix.T
+        best = scores.argmax(axis=1)
+        if scores[np.arange(len(glyphs)), best].min() < self.minScore:
+            return None
+
+        text = ''.join(labels[index] for index in best)
+        if bannedChars:
+            text = re.sub(f"[{re.escape(bannedChars)}]", '', text)
+        if allowedChars:
+            text = re.sub(f"[^{re.escape(allowedChars)}]", '', text)
+        return text or None
+
+    def _confirmed(self, vectors: list[np.ndarray]) -> bool:
+        """Whether at least two samples of a character agree with each other."""
+        if len(vectors) < 2:
+            return False
+        matrix = np.stack(vectors)
+        scores = matrix @ matrix.T
+        np.fill_diagonal(scores, -1)
+        return scores.max() >= self.minScore
+
+    def learn(self, image: np.ndarray, key, text: str) -> None:
+        """
+        Add the glyphs of an OCR'd crop to the atlas of `key`.
+
+        `text` is the filtered OCR output, and the glyphs left of it (e.g. the
+        'Lv.' before a level) are learned as junk. Their number has to be the
+        one two crops of `key` already agreed on, so that a crop the OCR read
+        with a glyph missing (e.g. '8/90' for '80/90') is never labelled off by
+        one. Crops contradicting the samples are ignored, and a character only
+        enters the atlas once two of its samples agree.
+        """
+        if not text:
+            return
+
+        glyphs = segmentGlyphs(image)
+        extra = len(glyphs) - len(text)
+        if extra < 0:
+            return
+
+        with self._lock:
+            prefixes = self._prefixes[key]
+            prefixes[extra] += 1
+            prefix, votes = prefixes.most_common(1)[0]
+            if votes < 2 or extra != prefix:
+                return
+            labels = [JUNK] * extra + list(text)
+
+            samples = self._samples[key]
+            known = [(label, vector) for label, vectors in samples.items() for vector in vectors]
+            if known:
+                matrix = np.stack([vector for _, vector in known])
+                scores = glyphs @ matrix.T
+                best = scores.argmax(axis=1)
+                for index, label in enumerate(labels):
+                    if scores[index, best[index]] >= self.minScore and known[best[index]][0] != label:
+                        return
+
+            for glyph, label in zip(glyphs, labels):
+                if len(samples[label]) < self.maxSamples:
+                    samples[label].append(glyph)
+
+            # Junk glyphs differ from each other ('L', 'v', ...), a single sample of them is enough
+            confirmed = {label: vectors for label, vectors in samples.items() if label == JUNK or self._confirmed(vectors)}
+            if confirmed:
+                atlasLabels = [label for label, vectors in confirmed.items() for _ in vectors]
+                matrix = np.stack([vector for vectors in confirmed.values() for vector in vectors])
+                self._atlas[key] = (matrix, atlasLabels)
+
+    def reset(self) -> None:
+        """Forget every atlas, e.g. to time the recognition from a cold start."""
+        with self._lock:
+            self._samples.clear()
+            self._prefixes.clear()
+            self._atlas.clear()
+
+digitRecognizer = DigitRecognizer()
+
+def imageToDigits(
+    image: np.ndarray,
+    key,
+    divisor: str = '',
+    allowedChars: str = string.digits,
+    bannedChars: str = None,
+    mode: str = OCR_DIGITS
+) -> str:
+    """Read the crop with the digit atlas, falling back to `imageToString` (and learning from it) when unsure."""
+    text = digitRecognizer.read(image, key, allowedChars, bannedChars)
+    if text is None:
+        text = imageToString(image, divisor, allowedChars, bannedChars, mode)
+        digitRecognizer.learn(image, key, text)
+    return text
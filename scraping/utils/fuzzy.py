@@ -0,0 +1,110 @@
+import heapq
+import threading
+import numpy as np
+from difflib import SequenceMatcher
+from collections import defaultdict
+
+class FuzzyIndex:
+    """
+    Drop-in replacement of `difflib.get_close_matches` over a fixed set of words.
+
+    The words are bucketed by length and each bucket keeps the character
+    histogram of its words, so the length bound (difflib's real_quick_ratio)
+    skips whole buckets and the character bound (quick_ratio) is computed for
+    the whole bucket at once. Only the words passing both go through
+    SequenceMatcher, which gives the same results as `get_close_matches`.
+    """
+
+    def __init__(self, words, histograms: tuple[str, np.ndarray, np.ndarray] = None):
+        """
+        Args:
+            words (Iterable[str]): Words to match against, e.g. the keys of an ID table.
+            histograms (tuple[str, np.ndarray, np.ndarray], optional): Alphabet, lengths and character
+                histograms of `words` sorted by length, as precomputed by `scraping.utils.database`.
+        """
+        # The precomputed words are only read when the index is first queried
+        self.words = words if histograms is not None else list(words)
+        self.histograms = histograms
+        self._buckets = None
+        self._lock = threading.Lock()
+
+    def _buildFromHistograms(self) -> None:
+        chars, lengths, histograms = self.histograms
+        words = list(self.words)
+        bounds = [0, *(np.flatnonzero(np.diff(lengths)) + 1).tolist(), len(words)]
+
+        self._alphabet = {char: index for index, char in enumerate(chars)}
+        self._known = set(words)
+        self._buckets = {
+            int(lengths[start]): (words[start:end], histograms[start:end])
+            for start, end in zip(bounds, bounds[1:]) if end > start
+        }
+
+    def _build(self) -> None:
+        if self.histograms is not None:
+            return self._buildFromHistograms()
+
+        alphabet = {char: index for index, char in enumerate(sorted({char for word in self.words for char in word}))}
+
+        grouped = defaultdict(list)
+        for word in self.words:
+            grouped[len(word)].append(word)
+
+        buckets = dict()
+        for length, words in grouped.items():
+            histograms = np.zeros((len(words), len(alphabet)), dtype=np.int32)
+            for row, word in enumerate(words):
+                for char in word:
+                    histograms[row, alphabet[char]] += 1
+            buckets[length] = (words, histograms)
+
+        self._alphabet = alphabet
+        self._known = set(self.words)
+        self._buckets = buckets
+
+    def getMatches(self, word: str, n: int = 3, cutoff: float = 0.6) -> list[str]:
+        """
+        Same as `get_close_matches(word, words, n, cutoff)`.
+
+        Returns:
+            list[str]: The best `n` words scoring at least `cutoff`, best first.
+        """
+        if not n > 0:
+            raise ValueError(f"n must be > 0: {n!r}")
+        if not 0.0 <= cutoff <= 1.0:
+            raise ValueError(f"cutoff must be in [0.0, 1.0]: {cutoff!r}")
+
+        with self._lock:
+            if self._buckets is None:
+                self._build()
+
+        # Only an identical word scores 1.0
+        if n == 1 and word in self._known:
+            return [word]
+
+        query = np.zeros(len(self._alphabet), dtype=np.int32)
+        for char in word:
+            if char in self._alphabet:
+                query[self._alphabet[char]] += 1
+
+        matcher = SequenceMatcher()
+        matcher.set_seq2(word)
+        result = []
+        for length, (words, histograms) in self._buckets.items():
+            total = len(word) + length
+            if total and 2.0 * min(len(word), length) / total < cutoff:
+                continue
+
+            if total:
+                common = np.minimum(histograms, query).sum(axis=1)
+                candidates = np.flatnonzero(2.0 * common / total >= cutoff)
+            else:
+                candidates = range(len(words))
+
+            for index in candidates:
+                matcher.set_seq1(words[index])
+                score = matcher.ratio()
+                if score >= cutoff:
+                    result.append((score, words[index]))
+
+        return [match for _, match in heapq.nlargest(n, result)]
@@ -0,0 +1,94 @@
+import string
+import numpy as np
+
+from game.gameROI import Coordinates, OCR_MODES
+from scraping.utils.common import screenshotRegions
+from scraping.utils.digits import imageToDigits
+from scraping.utils.rarity import rarityClassifier
+
+def cellRegion(start: Coordinates, offset: Coordinates, row: int, col: int) -> Coordinates:
+    """Region of a grid cell, `start` being the first cell and `offset` the gap between cells."""
+    return Coordinates(
+        start.x + col * (start.w + offset.x),
+        start.y + row * (start.h + offset.y),
+        start.w, start.h
+    )
+
+def capturePage(screenInfo, start: Coordinates, rows: int, cols: int) -> dict[tuple[int, int], np.ndarray]:
+    """
+    Capture every cell of a grid page with a single grab.
+
+    Returns:
+        dict[tuple[int, int], np.ndarray]: (row, col) -> thumbnail of the cell.
+    """
+    regions = {
+        (row, col): cellRegion(start, screenInfo.offsets.page, row, col)
+        for row in range(rows) for col in range(cols)
+    }
+    return screenshotRegions(regions, screenInfo.monitor, copy=True)
+
+def cropThumbnail(thumbnail: np.ndarray, roi: Coordinates) -> np.ndarray:
+    return thumbnail[int(roi.y):int(roi.y + roi.h), int(roi.x):int(roi.x + roi.w)]
+
+def thumbnailRarity(thumbnail: np.ndarray, screenInfo) -> int | None:
+    """Rarity shown by the colour strip of a thumbnail, None when no rarity colour is found."""
+    return rarityClassifier.classify(cropThumbnail(thumbnail, screenInfo.thumbnail.rarity), default=None)
+
+def thumbnailLevel(thumbnail: np.ndarray, screenInfo) -> int | None:
+    """Level printed on a thumbnail, None when it can't be read."""
+    image = cropThumbnail(thumbnail, screenInfo.thumbnail.level)
+    text = imageToDigits(
+        image, (screenInfo.width, screenInfo.height, 'thumbnail.level'),
+        allowedChars=string.digits, mode=OCR_MODES['thumbnail.level']
+    )
+    try:
+        return int(text)
+    except ValueError:
+        return None
+
+def thresholdVerdict(thumbnail: np.ndarray, screenInfo, minRarity: int, minLevel: int = None) -> bool | None:
+    """
+    Judge a cell against the rarity and level thresholds from its thumbnail.
+
+    Args:
+        thumbnail (np.ndarray): Image of the cell.
+        screenInfo (ScreenInfo): Screen of the scan.
+        minRarity (int): Minimum rarity.
+        minLevel (int, optional): Minimum level, not checked when None. Defaults to None.
+
+    Returns:
+        bool | None: False when a value read is below its threshold, True when every
+            threshold is read as passed, None when the thumbnail doesn't tell.
+    """
+    verdict = True
+    if minRarity > 1:
+        rarity = thumbnailRarity(thumbnail, screenInfo)
+        if rarity is None:
+            verdict = None
+        elif rarity < minRarity:
+            return False
+    if minLevel:
+        level = thumbnailLevel(thumbnail, screenInfo)
+        if level is None:
+            verdict = None
+        elif level < minLevel:
+            return False
+    return verdict
+
+def passesThresholds(thumbnail: np.ndarray, screenInfo, minRarity: int, minLevel: int = None) -> bool:
+    """
+    Whether a cell may pass the rarity and level thresholds, judged from its thumbnail.
+
+    Only a rarity or a level actually read below the threshold fails the cell,
+    so anything the thumbnail doesn't tell is left to the detail panel.
+
+    Args:
+        thumbnail (np.ndarray): Image of the cell.
+        screenInfo (ScreenInfo): Screen of the scan.
+        minRarity (int): Minimum rarity.
+        minLevel (int, optional): Minimum level, not checked when None. Defaults to None.
+
+    Returns:
+        bool: False when the cell surely fails a threshold.
+    """
+    return thresholdVerdict(thumbnail, screenInfo, minRarity, minLevel) is not False
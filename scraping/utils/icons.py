@@ -0,0 +1,215 @@
+import cv2
+import json
+import logging
+import threading
+import numpy as np
+from pathlib import Path
+
+from scraping.utils.telemetry import stageTimer
+
+logger = logging.getLogger('IconMatcher')
+
+# Side of the square every icon is compared at
+ICON_SIZE = 24
+# Alpha (0-255) from which an icon pixel is part of the icon
+ALPHA_THRESHOLD = 128
+# Descriptors of every icon of the assets folder, and the icon file of each row
+INDEX_FILE, INDEX_PATHS = 'icons.npy', 'icons.json'
+
+def iconVector(image: np.ndarray) -> np.ndarray:
+    """Icon or thumbnail scaled to ICON_SIZE, as a flat float32 BGR vector."""
+    small = cv2.resize(image[..., :3], (ICON_SIZE, ICON_SIZE), interpolation=cv2.INTER_AREA)
+    return small.astype(np.float32).ravel()
+
+def iconDescriptor(icon: np.ndarray) -> np.ndarray | None:
+    """
+    Descriptor of an icon: its BGR vector, zero mean and unit norm over the
+    opaque pixels, and NaN on the transparent ones.
+
+    Returns:
+        np.ndarray | None: The descriptor, or None for a blank icon.
+    """
+    vector = iconVector(icon)
+    if icon.shape[2] == 4:
+        alpha = cv2.resize(icon[..., 3], (ICON_SIZE, ICON_SIZE), interpolation=cv2.INTER_AREA)
+        mask = np.repeat((alpha >= ALPHA_THRESHOLD).ravel(), 3)
+    else:
+        mask = np.ones(vector.shape, dtype=bool)
+    if not mask.any():
+        return None
+
+    vector = vector - vector[mask].mean()
+    norm = np.linalg.norm(vector[mask])
+    if not norm:
+        return None
+    vector /= norm
+    vector[~mask] = np.nan
+    return vector
+
+def iconFiles(folder: Path) -> list[str]:
+    """Icon files of the assets folder, relative to it."""
+    folder = Path(folder)
+    return sorted(file.relative_to(folder).as_posix() for file in folder.glob('Icon*/*.png'))
+
+def buildIconIndex(folder: Path) -> int:
+    """
+    Compute the descriptor of every icon of the assets folder and save them as
+    one float16 array (memory-mappable, a row per icon) next to the list of
+    the icon files.
+
+    Returns:
+        int: Number of icons indexed.
+    """
+    folder = Path(folder)
+    paths, descriptors = [], []
+    for path in iconFiles(folder):
+        icon = cv2.imread(str(folder / path), cv2.IMREAD_UNCHANGED)
+        if icon is None or len(icon.shape) != 3:
+            continue
+        descriptor = iconDescriptor(icon)
+        if descriptor is not None:
+            paths.append(path)
+            descriptors.append(descriptor)
+
+    matrix = np.stack(descriptors).astype(np.float16) if descriptors else np.empty((0, ICON_SIZE * ICON_SIZE * 3), np.float16)
+    np.save(folder / INDEX_FILE, matrix)
+    with open(folder / INDEX_PATHS, 'w', encoding='utf-8') as file:
+        json.dump({'size': ICON_SIZE, 'files': len(iconFiles(folder)), 'paths': paths}, file)
+    logger.info(f'Indexed {len(paths)} icons')
+    return len(paths)
+
+class IconIndex:
+    """
+    Icon descriptors of the assets folder, memory-mapped from the file written
+    by `buildIconIndex`, which is rebuilt here when missing or out of date.
+    """
+
+    def __init__(self, folder: Path):
+        """
+        Args:
+            folder (Path): Assets folder.
+        """
+        self.folder = Path(folder)
+        self._rows = None
+        self._matrix = None
+        self._lock = threading.Lock()
+
+    def isStale(self) -> bool:
+        try:
+            with open(self.folder / INDEX_PATHS, 'r', encoding='utf-8') as file:
+                info = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return True
+        return info.get('size') != ICON_SIZE or info.get('files') != len(iconFiles(self.folder)) or not (self.folder / INDEX_FILE).is_file()
+
+    def _load(self) -> None:
+        if self.isStale():
+            try:
+                buildIconIndex(self.folder)
+            except OSError as e:
+                logger.error(f'Failed to build the icon index: {e}', exc_info=True)
+                self._rows, self._matrix = dict(), None
+                return
+
+        with open(self.folder / INDEX_PATHS, 'r', encoding='utf-8') as file:
+            paths = json.load(file)['paths']
+        self._rows = {path: row for row, path in enumerate(paths)}
+        self._matrix = np.load(self.folder / INDEX_FILE, mmap_mode='r')
+
+    def descriptors(self, paths: list[str]) -> tuple[list[str], np.ndarray]:
+        """
+        Descriptors of the given icon files.
+
+        Returns:
+            tuple[list[str], np.ndarray]: The icons found in the index, and their descriptors (float32, a row each).
+        """
+        with self._lock:
+            if self._rows is None:
+                self._load()
+        found = [path for path in paths if path in self._rows]
+        if not found:
+            return found, np.empty((0, ICON_SIZE * ICON_SIZE * 3), np.float32)
+        return found, self._matrix[[self._rows[path] for path in found]].astype(np.float32)
+
+class IconMatcher:
+    """
+    Identifies grid thumbnails by their icon.
+
+    The icons of the tables (e.g. itemsID, whose entries name their icon in
+    `image`, relative to the assets folder) are compared to the thumbnail
+    with a correlation restricted to the opaque pixels of each icon, so the
+    rarity background of the thumbnail doesn't matter. The icons come
+    normalized from the index, which leaves a few matrix products per page.
+    """
+
+    def __init__(self, index: IconIndex, *tables: dict, minScore: float = 0.85, minMargin: float = 0.05):
+        """
+        Args:
+            index (IconIndex): Icon descriptors of the assets folder.
+            *tables (dict): Name -> entry holding the icon file in 'image'.
+            minScore (float, optional): Correlation needed to trust a match. Defaults to 0.85.
+            minMargin (float, optional): Lead needed over the next best icon. Defaults to 0.05.
+        """
+        self.index = index
+        self.tables = tables
+        self.minScore = minScore
+        self.minMargin = minMargin
+        self._icons = None
+        self._lock = threading.Lock()
+
+    def _build(self) -> tuple[list[str | None], np.ndarray, np.ndarray]:
+        names = dict()
+        for table in self.tables:
+            for name, entry in table.items():
+                if isinstance(entry, dict) and entry.get('image'):
+                    # An icon shared by several names can't tell them apart, it matches as None
+                    if names.setdefault(entry['image'], name) != name:
+                        names[entry['image']] = None
+
+        paths, descriptors = self.index.descriptors(list(names))
+        if not paths:
+            logger.warning(f'No icon found in {self.index.folder}')
+        masks = (~np.isnan(descriptors)).astype(np.float32)
+        return [names[path] for path in paths], np.nan_to_num(descriptors), masks
+
+    def _getIcons(self) -> tuple[list[str | None], np.ndarray, np.ndarray]:
+        with self._lock:
+            if self._icons is None:
+                self._icons = self._build()
+            return self._icons
+
+    def scores(self, images: list[np.ndarray]) -> tuple[list[str | None], np.ndarray]:
+        """
+        Correlation of every image with every icon.
+
+        Returns:
+            tuple[list[str | None], np.ndarray]: The icon names (None for a shared icon), and one row of scores per image.
+        """
+        names, templates, masks = self._getIcons()
+        if not images or not names:
+            return names, np.zeros((len(images), len(names)), np.float32)
+
+        queries = np.stack([iconVector(image) for image in images])
+        counts = masks.sum(axis=1)
+        # The templates are zero mean over their mask, so only the query variance needs the mask
+        sums = queries @ masks.T
+        squares = (queries * queries) @ masks.T
+        variances = np.maximum(squares - sums * sums / counts, 1e-6)
+        return names, (queries @ templates.T) / np.sqrt(variances)
+
+    @stageTimer.timed('match')
+    def match(self, images: list[np.ndarray]) -> list[str | None]:
+        """Name of the icon of every image, None when no icon clearly matches or the icon is shared by several names."""
+        names, scores = self.scores(images)
+        if not names:
+            return [None] * len(images)
+
+        results = []
+        for row in scores:
+            if len(row) > 1:
+                second, best = np.argpartition(row, -2)[-2:]
+                margin = row[best] - row[second]
+            else:
+                best, margin = 0, 1.0
+            results.append(names[best] if row[best] >= self.minScore and margin >= self.minMargin else None)
+        return results
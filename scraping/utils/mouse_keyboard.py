@@ -1,8 +1,17 @@
+import cv2
 import time
-import win32api
-import win32con
+try:
+    import win32api
+    import win32con
+except ImportError:
+    # Only replays (scraping.utils.replay) run without the Windows API
+    win32api = win32con = None
+import numpy as np
 from typing import Union
-from mss import mss
+
+from game.gameROI import Coordinates
+from scraping.utils.capture import getCaptureSession
+from scraping.utils.telemetry import stageTimer
 
 class WindowsInputController:
     """
@@ -16,8 +25,9 @@ class WindowsInputController:
         Args:
             monitor (int): Monitor index to use for mouse operations
         """
-        self.sct = mss()
-        self.monitor = self.sct.monitors[monitor]
+        self.capture = getCaptureSession()
+        self.monitorIndex = monitor
+        self.monitor = self.capture.monitor(monitor)
     
     # Class-level constants
     KEYEVENTF_KEYDOWN = 0x0000
@@ -103,18 +113,99 @@ class WindowsInputController:
         " ": 0x39,
     }
     
-    def mouseScroll(self, amount: Union[int, float], waitTime: float = 0.1) -> None:
+    # Frame-change detection
+    SAMPLE_SCALE = 4
+    SAMPLE_INTERVAL = 0.02
+    PIXEL_CHANGE = 24
+    # A region has settled once this many consecutive samples (~80 ms) differ by at most SETTLE_CHANGE,
+    # tighter than PIXEL_CHANGE so that a slow fade or slide doesn't pass for settled
+    SETTLE_SAMPLES = 4
+    SETTLE_CHANGE = 6
+    # Fraction of the wait always spent, screen transitions starting later than the input
+    MIN_WAIT_FRACTION = 0.25
+    
+    def sampleRegion(self, region: Coordinates) -> np.ndarray:
+        """
+        Capture a small downscaled grayscale sample of a region of the monitor.
+        
+        Args:
+            region (Coordinates): Region relative to the monitor.
+        
+        Returns:
+            np.ndarray: Grayscale sample, SAMPLE_SCALE times smaller than the region.
+        """
+        shot = self.capture.grabRaw(region, self.monitorIndex)
+        gray = cv2.cvtColor(shot, cv2.COLOR_BGRA2GRAY)
+        height, width = gray.shape
+        size = (max(1, width // self.SAMPLE_SCALE), max(1, height // self.SAMPLE_SCALE))
+        return cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+    
+    def _record(self, action: str, *args) -> None:
+        if self.capture.recorder is not None:
+            self.capture.recorder.action(action, *args)
+    
+    def _changed(self, current: np.ndarray, previous: np.ndarray, threshold: int = None) -> bool:
+        threshold = self.PIXEL_CHANGE if threshold is None else threshold
+        return bool(np.any(cv2.absdiff(current, previous) > threshold))
+    
+    def waitForSettle(self, region: Coordinates, reference: np.ndarray = None, timeout: float = 1.0, minWait: float = 0) -> bool:
+        """
+        Wait until a region changes from `reference` and then stays the same for SETTLE_SAMPLES consecutive samples.
+        
+        Args:
+            region (Coordinates): Region relative to the monitor to watch.
+            reference (np.ndarray, optional): Sample taken before the action. If None, only wait for the region to be stable.
+            timeout (float, optional): Maximum time to wait. Defaults to 1.0.
+            minWait (float, optional): Time waited in any case, even if the region settles earlier. Defaults to 0.
+        
+        Returns:
+            bool: True if the region settled, False if the timeout expired.
+        """
+        start = time.perf_counter()
+        deadline = start + timeout
+        changed = reference is None
+        previous = reference
+        stable = 0
+        
+        while time.perf_counter() < deadline:
+            time.sleep(self.SAMPLE_INTERVAL)
+            current = self.sampleRegion(region)
+            
+            if not changed:
+                changed = self._changed(current, reference)
+            elif previous is not None and not self._changed(current, previous, self.SETTLE_CHANGE):
+                stable += 1
+                if stable >= self.SETTLE_SAMPLES and time.perf_counter() - start >= minWait:
+                    return True
+            else:
+                stable = 0
+            previous = current
+        
+        return False
+    
+    @stageTimer.timed('wait')
+    def _wait(self, waitTime: float, region: Coordinates = None, reference: np.ndarray = None) -> None:
+        if region is None:
+            time.sleep(waitTime)
+        else:
+            self.waitForSettle(region, reference, waitTime, waitTime * self.MIN_WAIT_FRACTION)
+    
+    def mouseScroll(self, amount: Union[int, float], waitTime: float = 0.1, region: Coordinates = None) -> None:
         """
         Simulate mouse wheel scrolling.
         
         Args:
             amount (Union[int, float]): Scroll amount, positive for down, negative for up.
             waitTime (float, optional): Time to wait after scrolling. Defaults to 0.1.
+            region (Coordinates, optional): If set, wait only until this region has changed and settled, up to `waitTime`.
         """
+        reference = self.sampleRegion(region) if region is not None else None
+        self._record('mouseScroll', amount)
         scaledAmount = int(amount * 120)
         win32api.mouse_event(win32con.MOUSEEVENTF_WHEEL, 0, 0, scaledAmount, 0)
-        time.sleep(waitTime)
+        self._wait(waitTime, region, reference)
     
+    @stageTimer.timed('wait')
     def moveMouse(self, x: Union[int, float], y: Union[int, float], waitTime: float = 0.1) -> None:
         """
         Move the mouse cursor to specified coordinates relative to the monitor.
@@ -124,12 +215,13 @@ class WindowsInputController:
             y (Union[int, float]): Y-coordinate relative to monitor
             waitTime (float, optional): Time to wait after moving. Defaults to 0.1.
         """
+        self._record('moveMouse', x, y)
         x = int(x) + self.monitor["left"]
         y = int(y) + self.monitor["top"]
         win32api.SetCursorPos((x, y))
         time.sleep(waitTime)
     
-    def leftClick(self, x: Union[int, float], y: Union[int, float], waitTime: float = 0.1) -> None:
+    def leftClick(self, x: Union[int, float], y: Union[int, float], waitTime: float = 0.1, region: Coordinates = None) -> None:
         """
         Move mouse and perform a left mouse click at specified coordinates relative to the monitor.
         
@@ -137,16 +229,18 @@ class WindowsInputController:
             x (Union[int, float]): X-coordinate relative to monitor
             y (Union[int, float]): Y-coordinate relative to monitor
             waitTime (float, optional): Time to wait after clicking. Defaults to 0.1.
+            region (Coordinates, optional): If set, wait only until this region has changed and settled, up to `waitTime`.
         """
         self.moveMouse(x, y)
+        reference = self.sampleRegion(region) if region is not None else None
+        self._record('leftClick', x, y)
         x, y = win32api.GetCursorPos()
         
         win32api.mouse_event(win32con.MOUSEEVENTF_LEFTDOWN, x, y, 0, 0)
         win32api.mouse_event(win32con.MOUSEEVENTF_LEFTUP, x, y, 0, 0)
-        time.sleep(waitTime)
+        self._wait(waitTime, region, reference)
     
-    @classmethod
-    def pressKey(cls, keyName: str, waitTime: float = 0.1, useShift: bool = True) -> None:
+    def pressKey(self, keyName: str, waitTime: float = 0.1, useShift: bool = True, region: Coordinates = None) -> None:
         """
         Simulate pressing a specific key with improved text input support.
         
@@ -154,20 +248,23 @@ class WindowsInputController:
             keyName (str): Name of the key to press.
             waitTime (float, optional): Time to wait after key press. Defaults to 0.1.
             useShift (bool, optional): Whether to use shift for uppercase. Defaults to True.
+            region (Coordinates, optional): If set, wait only until this region has changed and settled, up to `waitTime`.
         """
         original_keyName = keyName
         keyName = keyName.lower()
-        keyCode = cls.KEY_MAPPING.get(keyName)
+        keyCode = self.KEY_MAPPING.get(keyName)
         
         if keyCode is not None:
-            isExtended = keyCode & cls._OFFSET_EXTENDEDKEY
-            isShift = (keyCode & cls._OFFSET_SHIFTKEY or original_keyName.isupper()) and useShift
+            reference = self.sampleRegion(region) if region is not None else None
+            self._record('pressKey', keyName)
+            isExtended = keyCode & self._OFFSET_EXTENDEDKEY
+            isShift = (keyCode & self._OFFSET_SHIFTKEY or original_keyName.isupper()) and useShift
             scanCode = keyCode & 0xFF
             
-            vk = win32api.MapVirtualKey(scanCode, cls.MAPVK_VSC_TO_VK)
+            vk = win32api.MapVirtualKey(scanCode, self.MAPVK_VSC_TO_VK)
             
             if isShift:
-                win32api.keybd_event(win32con.VK_SHIFT, cls._SHIFT_SCANCODE, 0, 0)
+                win32api.keybd_event(win32con.VK_SHIFT, self._SHIFT_SCANCODE, 0, 0)
             
             flags = win32con.KEYEVENTF_SCANCODE
             if isExtended:
@@ -177,12 +274,12 @@ class WindowsInputController:
             win32api.keybd_event(vk, scanCode, flags | win32con.KEYEVENTF_KEYUP, 0)
             
             if isShift:
-                win32api.keybd_event(win32con.VK_SHIFT, cls._SHIFT_SCANCODE, win32con.KEYEVENTF_KEYUP, 0)
+                win32api.keybd_event(win32con.VK_SHIFT, self._SHIFT_SCANCODE, win32con.KEYEVENTF_KEYUP, 0)
             
-            time.sleep(waitTime)
+            self._wait(waitTime, region, reference)
     
-    @classmethod
-    def hotKey(cls, *args: str, delay: float = 0.05, waitTime: float = 0.1) -> None:
+    @stageTimer.timed('wait')
+    def hotKey(self, *args: str, delay: float = 0.05, waitTime: float = 0.1) -> None:
         """
         Perform a hotkey combination.
         
@@ -192,19 +289,21 @@ class WindowsInputController:
             waitTime (float, optional): Time to wait after completing hotkey. Defaults to 0.1.
             
         Example:
-            WindowsInputController.hotKey('ctrl', 'v')  # Performs Ctrl+V
+            controller.hotKey('ctrl', 'v')  # Performs Ctrl+V
         """
+        self._record('hotKey', *args)
+        
         # Press all keys in sequence
         for key in args:
-            if key.lower() in cls.MODIFIER_KEYS:
-                scancode = cls.MODIFIER_KEYS[key.lower()]
+            if key.lower() in self.MODIFIER_KEYS:
+                scancode = self.MODIFIER_KEYS[key.lower()]
             else:
-                scancode = cls.KEY_MAPPING.get(key.lower())
+                scancode = self.KEY_MAPPING.get(key.lower())
             
             if scancode is not None:
-                vk = win32api.MapVirtualKey(scancode & 0xFF, cls.MAPVK_VSC_TO_VK)
+                vk = win32api.MapVirtualKey(scancode & 0xFF, self.MAPVK_VSC_TO_VK)
                 flags = win32con.KEYEVENTF_SCANCODE
-                if scancode & cls._OFFSET_EXTENDEDKEY:
+                if scancode & self._OFFSET_EXTENDEDKEY:
                     flags |= win32con.KEYEVENTF_EXTENDEDKEY
                 
                 win32api.keybd_event(vk, scancode & 0xFF, flags, 0)
@@ -212,15 +311,15 @@ class WindowsInputController:
         
         # Release all keys in reverse sequence
         for key in reversed(args):
-            if key.lower() in cls.MODIFIER_KEYS:
-                scancode = cls.MODIFIER_KEYS[key.lower()]
+            if key.lower() in self.MODIFIER_KEYS:
+                scancode = self.MODIFIER_KEYS[key.lower()]
             else:
-                scancode = cls.KEY_MAPPING.get(key.lower())
+                scancode = self.KEY_MAPPING.get(key.lower())
             
             if scancode is not None:
-                vk = win32api.MapVirtualKey(scancode & 0xFF, cls.MAPVK_VSC_TO_VK)
+                vk = win32api.MapVirtualKey(scancode & 0xFF, self.MAPVK_VSC_TO_VK)
                 flags = win32con.KEYEVENTF_SCANCODE | win32con.KEYEVENTF_KEYUP
-                if scancode & cls._OFFSET_EXTENDEDKEY:
+                if scancode & self._OFFSET_EXTENDEDKEY:
                     flags |= win32con.KEYEVENTF_EXTENDEDKEY
                 
                 win32api.keybd_event(vk, scancode & 0xFF, flags, 0)
@@ -0,0 +1,121 @@
+import os
+import logging
+import threading
+import numpy as np
+from typing import Any, Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+try:
+    import psutil
+except ImportError:
+    # Without psutil, every physical core is assumed to run two logical ones
+    psutil = None
+
+logger = logging.getLogger('OCRService')
+
+def physicalCores() -> int:
+    """Number of physical cores of the machine."""
+    if psutil is not None:
+        cores = psutil.cpu_count(logical=False)
+        if cores:
+            return cores
+    return max(1, (os.cpu_count() or 2) // 2)
+
+class OCRService:
+    """
+    Pool of OCR workers, each holding its own RapidOCR engine, so that the
+    recognition of several crops runs on several cores at once.
+
+    onnxruntime releases the GIL, so the workers are threads. The engine of a
+    worker is built and warmed when the worker starts, with the cores split
+    between the workers as intra-op threads. Tasks get the engine of their
+    worker as first argument, and a task submitted from a worker runs inline,
+    instead of waiting on the pool it is holding.
+    """
+
+    def __init__(self, workers: int = 0):
+        """
+        Args:
+            workers (int, optional): Worker threads, 0 for one per physical core. Defaults to 0.
+        """
+        cores = physicalCores()
+        self.workers = workers or cores
+        self.intraThreads = max(1, cores // self.workers)
+
+        self._local = threading.local()
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def createEngine(self):
+        # Imported here, so that the processes never recognizing any text don't load onnxruntime
+        from rapidocr_onnxruntime import RapidOCR
+
+        engine = RapidOCR(intra_op_num_threads=self.intraThreads, inter_op_num_threads=1)
+        # The first run of each session allocates its buffers
+        blank = np.zeros((48, 320, 3), dtype=np.uint8)
+        engine(blank)
+        engine.text_rec([blank])
+        return engine
+
+    def engine(self):
+        """Engine of the current thread, built on its first use."""
+        engine = getattr(self._local, 'engine', None)
+        if engine is None:
+            logger.debug(f'Loading an OCR engine ({self.intraThreads} intra-op threads)')
+            engine = self._local.engine = self.createEngine()
+        return engine
+
+    def _startWorker(self) -> None:
+        self._local.worker = True
+        self.engine()
+
+    def _getExecutor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='OCRService', initializer=self._startWorker)
+            return self._executor
+
+    def _run(self, task: Callable[..., Any], *args, **kwargs) -> Any:
+        return task(self.engine(), *args, **kwargs)
+
+    def submit(self, task: Callable[..., Any], *args, **kwargs) -> Future:
+        """
+        Run `task(engine, *args, **kwargs)` on a worker.
+
+        Returns:
+            Future: Result of the task.
+        """
+        if not getattr(self._local, 'worker', False):
+            return self._getExecutor().submit(self._run, task, *args, **kwargs)
+
+        future = Future()
+        try:
+            future.set_result(self._run(task, *args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        return future
+
+    def warm(self) -> None:
+        """Start every worker in the background, so that their engines are loaded before the first crop."""
+        barrier = threading.Barrier(self.workers)
+
+        def wait(engine) -> None:
+            # Holding each worker until all are started, or the pool would reuse the first idle one
+            try:
+                barrier.wait(timeout=60)
+            except threading.BrokenBarrierError:
+                pass
+
+        executor = self._getExecutor()
+        for _ in range(self.workers):
+            executor.submit(self._run, wait)
+
+    def run(self, task: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run a task on a worker and wait for its result."""
+        return self.submit(task, *args, **kwargs).result()
+
+    def shutdown(self) -> None:
+        """Stop the workers, a later task starting new ones."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
@@ -0,0 +1,90 @@
+import os
+from collections import deque
+from typing import Any, Callable
+from concurrent.futures import ThreadPoolExecutor
+
+# Recognition runs in onnxruntime and OpenCV, which both release the GIL
+WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+
+class GridPipeline:
+    """
+    Overlaps the navigation of a grid with the recognition of its cells.
+
+    The navigation thread submits each captured cell and keeps clicking while
+    `process` runs on a pool of workers. Results are handed to `collect` on the
+    navigation thread in submission (grid) order, and the first cell whose
+    `process` returns False for continuing stops the pipeline: later results are
+    dropped, as the serial loop would never have read them. Their clicks still
+    reach the game, so the navigation drains the pipeline after submitting a
+    cell that may stop it.
+    """
+
+    def __init__(self, process: Callable[..., tuple[bool, Any]], collect: Callable[[Any], None], workers: int = WORKERS, maxPending: int = 8):
+        """
+        Args:
+            process (Callable[..., tuple[bool, Any]]): Recognizes a cell, returns whether to continue and its result.
+            collect (Callable[[Any], None]): Receives the results in grid order.
+            workers (int, optional): Recognition threads. Defaults to WORKERS.
+            maxPending (int, optional): Cells captured ahead of the recognition before `submit` blocks. Defaults to 8.
+        """
+        self.process = process
+        self.collect = collect
+        self.maxPending = maxPending
+        self.stopped = False
+
+        self._pending = deque()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='GridPipeline')
+
+    def _collectNext(self) -> None:
+        keepGoing, result = self._pending.popleft().result()
+        self.collect(result)
+        if not keepGoing:
+            self.stopped = True
+
+    def submit(self, *args) -> bool:
+        """
+        Queue a captured cell, waiting for the oldest one if `maxPending` are already queued.
+
+        Returns:
+            bool: False once a collected cell stopped the pipeline.
+        """
+        if self.stopped:
+            return False
+
+        self._pending.append(self._executor.submit(self.process, *args))
+        while self._pending and not self.stopped and (self._pending[0].done() or len(self._pending) >= self.maxPending):
+            self._collectNext()
+        return not self.stopped
+
+    def drain(self) -> bool:
+        """
+        Collect every queued cell, keeping the workers for the next ones.
+
+        Returns:
+            bool: False if a cell stopped the pipeline.
+        """
+        while self._pending and not self.stopped:
+            self._collectNext()
+        return not self.stopped
+
+    def join(self) -> bool:
+        """
+        Collect every queued cell and shut the workers down.
+
+        Returns:
+            bool: False if a cell stopped the pipeline.
+        """
+        self.drain()
+        for future in self._pending:
+            future.cancel()
+        self._pending.clear()
+        self._executor.shutdown(wait=True)
+        return not self.stopped
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if exc[0] is not None:
+            self.stopped = True
+        self.join()
@@ -0,0 +1,66 @@
+import cv2
+import numpy as np
+
+# Rarity colours of the game UI (BGR), shared by echoes, weapons and items
+RARITY_COLORS = {
+    5: (90, 230, 255),
+    4: (255, 109, 202),
+    3: (211, 180, 89),
+    2: (94, 195, 92),
+    1: (225, 236, 239)
+}
+
+class RarityClassifier:
+    """
+    Finds the rarity colours present in an image in a single pass.
+
+    Every channel value maps, through a lookup table, to the bitmask of the
+    rarities whose colour range contains it, so a pixel matches a rarity when
+    its bit is set for all three channels. This is the same test as one
+    `cv2.inRange` per rarity, for all of them at once, and a histogram of the
+    masks gives every rarity present.
+    """
+
+    def __init__(self, colors: dict[int, tuple[int, int, int]] = RARITY_COLORS, tolerance: int = 10):
+        """
+        Args:
+            colors (dict[int, tuple[int, int, int]], optional): BGR colour of each rarity (1-7). Defaults to RARITY_COLORS.
+            tolerance (int, optional): Maximum difference per channel. Defaults to 10.
+        """
+        tables = np.zeros((256, 1, 3), dtype=np.uint8)
+        for rarity, color in colors.items():
+            for channel, value in enumerate(color):
+                tables[max(0, value - tolerance):min(255, value + tolerance) + 1, 0, channel] |= 1 << rarity
+        self.tables = tables
+
+    def presence(self, image: np.ndarray, step: int = 1) -> int:
+        """
+        Bitmask of the rarities with at least one pixel in the image.
+
+        Args:
+            image (np.ndarray): BGR image.
+            step (int, optional): Sample every `step` pixels in both directions, for wide colour areas. Defaults to 1.
+
+        Returns:
+            int: Bit `rarity` is set for every rarity present.
+        """
+        if step > 1:
+            image = np.ascontiguousarray(image[::step, ::step])
+        if not image.size:
+            return 0
+
+        blue, green, red = cv2.split(cv2.LUT(image, self.tables))
+        masks = cv2.bitwise_and(cv2.bitwise_and(blue, green), red)
+        histogram = cv2.calcHist([masks], [0], None, [256], [0, 256]).ravel()
+
+        presence = 0
+        for mask in np.flatnonzero(histogram):
+            presence |= int(mask)
+        return presence
+
+    def classify(self, image: np.ndarray, default: int | None = 1, step: int = 1) -> int | None:
+        """Highest rarity whose colour appears in the image, `default` if none does."""
+        presence = self.presence(image, step)
+        return presence.bit_length() - 1 if presence else default
+
+rarityClassifier = RarityClassifier()
@@ -0,0 +1,201 @@
+import cv2
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+import numpy as np
+from pathlib import Path
+from typing import Union
+
+from game.gameROI import Coordinates
+from scraping.utils.capture import CaptureBackend, getCaptureSession, setCaptureBackend
+
+logger = logging.getLogger('Replay')
+
+JOURNAL = 'journal.jsonl'
+
+class FrameRecorder:
+    """
+    Records a scan as a journal of the input actions and of the frames grabbed
+    after them, which `ReplayBackend` and `ReplayController` serve back.
+    """
+
+    def __init__(self, folder: Path, monitors: list[dict], **info):
+        """
+        Args:
+            folder (Path): Folder of the recording, created if missing.
+            monitors (list[dict]): Monitors of the capture backend.
+            **info: Anything needed to re-run the scan (screen size, scrapers, ...).
+        """
+        self.folder = Path(folder)
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self.frames = 0
+        self._lock = threading.Lock()
+        self._journal = open(self.folder / JOURNAL, 'w', encoding='utf-8')
+        self._write({'event': 'start', 'monitors': monitors, **info})
+
+    def _write(self, entry: dict) -> None:
+        with self._lock:
+            self._journal.write(json.dumps(entry, default=float) + '\n')
+            self._journal.flush()
+
+    def action(self, name: str, *args) -> None:
+        self._write({'event': 'action', 'name': name, 'args': list(args)})
+
+    def frame(self, region: tuple[int, int, int, int], image: np.ndarray) -> None:
+        """Save a grabbed frame, `region` being its (left, top, width, height) on the desktop."""
+        with self._lock:
+            self.frames += 1
+            file = f'{self.frames:06d}.png'
+        cv2.imwrite(str(self.folder / file), image)
+        self._write({'event': 'frame', 'region': list(region), 'file': file})
+
+    def close(self) -> None:
+        with self._lock:
+            self._journal.close()
+
+def startRecording(folder: Path, scraperEnabled: list, screenInfo) -> FrameRecorder:
+    """Record the grabs and input actions of the current process into `folder`."""
+    session = getCaptureSession()
+    session.recorder = FrameRecorder(
+        folder, session.backend.monitors(),
+        screen=[screenInfo.width, screenInfo.height],
+        monitor=screenInfo.monitor,
+        scrapers=list(scraperEnabled)
+    )
+    return session.recorder
+
+def loadJournal(folder: Path) -> list[dict]:
+    with open(Path(folder) / JOURNAL, 'r', encoding='utf-8') as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+class ReplayBackend(CaptureBackend):
+    """
+    Serves the frames of a recording in order.
+
+    Each grab returns the next recorded frame of the same region, so the
+    replay stays in step even if the scrapers grab a little more or less than
+    when recorded. Regions never recorded are served black.
+    """
+
+    def __init__(self, folder: Path):
+        self.folder = Path(folder)
+        journal = loadJournal(self.folder)
+        self.info = journal[0]
+        self.frames = [entry for entry in journal if entry['event'] == 'frame']
+        self.cursor = 0
+        self.served = 0
+        self.missed = 0
+
+    def monitors(self) -> list[dict]:
+        return self.info['monitors']
+
+    def grab(self, left: int, top: int, width: int, height: int) -> np.ndarray:
+        region = [left, top, width, height]
+        for index in range(self.cursor, len(self.frames)):
+            if self.frames[index]['region'] == region:
+                self.cursor = index + 1
+                self.served += 1
+                image = cv2.imread(str(self.folder / self.frames[index]['file']), cv2.IMREAD_COLOR)
+                return cv2.cvtColor(image, cv2.COLOR_BGR2BGRA)
+
+        self.missed += 1
+        logger.debug(f'No recorded frame left for the region {region}')
+        return np.zeros((height, width, 4), dtype=np.uint8)
+
+class ReplayController:
+    """
+    Stands in for WindowsInputController during a replay: the input actions
+    do nothing and never wait, since every frame is already on disk.
+    """
+
+    def __init__(self, monitor: int = 1):
+        self.monitorIndex = monitor
+        self.actions = 0
+
+    def sampleRegion(self, region: Coordinates) -> None:
+        return None
+
+    def waitForSettle(self, region: Coordinates, reference: np.ndarray = None, timeout: float = 1.0) -> bool:
+        return True
+
+    def mouseScroll(self, amount: Union[int, float], waitTime: float = 0.1, region: Coordinates = None) -> None:
+        self.actions += 1
+
+    def moveMouse(self, x: Union[int, float], y: Union[int, float], waitTime: float = 0.1) -> None:
+        self.actions += 1
+
+    def leftClick(self, x: Union[int, float], y: Union[int, float], waitTime: float = 0.1, region: Coordinates = None) -> None:
+        self.actions += 1
+
+    def pressKey(self, keyName: str, waitTime: float = 0.1, useShift: bool = True, region: Coordinates = None) -> None:
+        self.actions += 1
+
+    def hotKey(self, *args: str, delay: float = 0.05, waitTime: float = 0.1) -> None:
+        self.actions += 1
+
+def replay(folder: Path, START_DATE: str = None, cold: bool = False) -> dict:
+    """
+    Re-run the scan of a recording.
+
+    The results are saved inside the recording, and the OCR cache and the
+    confusion table are only kept in memory, so a replay changes nothing
+    the app uses.
+
+    Args:
+        folder (Path): Folder of the recording.
+        START_DATE (str, optional): Subfolder of the recording the results are saved to. Defaults to 'replay_<time>'.
+        cold (bool, optional): Start from an empty OCR cache rather than from a copy of the current one. Defaults to False.
+
+    Returns:
+        dict: Timings and frame counts of the replay.
+    """
+    from game.screenInfo import ScreenInfo
+    from scraping.utils.common import savingScraped, ocrCache, nameResolver
+    from scraping.utils.channel import ResultChannel, ResultCollector, getChannel, setChannel
+    from scraping.scraperManager import runScrapers
+
+    ocrCache.detach()
+    nameResolver.detach()
+    if cold:
+        ocrCache.clear()
+
+    backend = ReplayBackend(folder)
+    setCaptureBackend(backend)
+    controller = ReplayController(backend.info['monitor'])
+    screenInfo = ScreenInfo(*backend.info['screen'], backend.info['monitor'])
+
+    START_DATE = START_DATE or time.strftime('replay_%Y-%m-%d_%H-%M-%S')
+    # The results are collected in this process, as the parent would
+    collector = ResultCollector()
+    channel = getChannel()
+    setChannel(ResultChannel(collector))
+    try:
+        start = time.perf_counter()
+        runScrapers(backend.info['scrapers'], controller, screenInfo, START_DATE)
+        elapsed = time.perf_counter() - start
+    finally:
+        setChannel(channel)
+
+    savingScraped({**collector.scanned(), 'inventory_wuwainventorykamera.json': (collector.inventory, dict)}, START_DATE, folder)
+
+    return {
+        'elapsed': elapsed,
+        'frames': backend.served,
+        'missed': backend.missed,
+        'framesPerSecond': backend.served / elapsed if elapsed else 0.0
+    }
+
+def main(argv: list[str] = None) -> None:
+    parser = argparse.ArgumentParser(description='Re-run a recorded scan without the game.')
+    parser.add_argument('folder', type=Path, help='Folder of the recording')
+    parser.add_argument('--cold', action='store_true', help='Start from an empty OCR cache')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    print(json.dumps(replay(args.folder, cold=args.cold), indent=4))
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,178 @@
+import json
+import time
+import logging
+import threading
+from pathlib import Path
+from functools import wraps
+from collections import defaultdict
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+
+logger = logging.getLogger('ScanTelemetry')
+
+# Stages of the scan timed in the scraper process
+STAGES = ('capture', 'wait', 'ocr', 'match')
+# Records holding a recognized result, counted for the throughput
+RESULT_KINDS = ('item', 'weapon', 'echo', 'failed', 'achievement')
+
+class StageTimer:
+    """
+    Time spent in each stage of the scan, and counters (e.g. OCR cache hits),
+    in the current process.
+
+    The stages are summed over the threads, so with the recognition running
+    in the workers of a `GridPipeline` they can add up to more than the scan
+    time. A stage entered again from within itself (e.g. `imagesToStrings`
+    calling the recognizer) is only timed once.
+    """
+
+    def __init__(self):
+        self._seconds = defaultdict(float)
+        self._calls = defaultdict(int)
+        self._counters = defaultdict(int)
+        self._active = threading.local()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str):
+        active = getattr(self._active, 'stages', None)
+        if active is None:
+            active = self._active.stages = set()
+        if name in active:
+            yield
+            return
+
+        active.add(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            active.discard(name)
+            with self._lock:
+                self._seconds[name] += elapsed
+                self._calls[name] += 1
+
+    def timed(self, name: str):
+        """Decorator timing every call of a function as the stage `name`."""
+        def decorator(function):
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.stage(name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += amount
+
+    def snapshot(self) -> dict[str, dict]:
+        """Seconds and calls of every stage, and the counters, as sent with the progress of the scan."""
+        with self._lock:
+            return {
+                'seconds': {name: round(self._seconds[name], 3) for name in STAGES if name in self._seconds},
+                'calls': {name: self._calls[name] for name in STAGES if name in self._calls},
+                'counters': dict(self._counters),
+            }
+
+stageTimer = StageTimer()
+
+def metricsLogger(path: Path, maxBytes: int = 1 << 20, backupCount: int = 4) -> logging.Logger:
+    """
+    Logger writing the scan metrics, one JSON object per line, to a rolling
+    file kept apart from the application logs.
+    """
+    metrics = logging.getLogger('ScanMetrics')
+    if not metrics.handlers:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        handler = RotatingFileHandler(path, maxBytes=maxBytes, backupCount=backupCount, encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        metrics.addHandler(handler)
+        metrics.setLevel(logging.INFO)
+        metrics.propagate = False
+    return metrics
+
+class ScanTelemetry:
+    """
+    Live metrics of a scan, built in the parent process from the records of
+    the result channel: throughput, page and ETA of the running scraper, OCR
+    cache hit rate and the time spent in each stage.
+
+    Every summary is handed to `onUpdate` (e.g. a Qt signal) and written to
+    the metrics file.
+    """
+
+    def __init__(self, metrics: logging.Logger = None, onUpdate = None, minInterval: float = .5):
+        """
+        Args:
+            metrics (logging.Logger, optional): Logger of the metrics file, from `metricsLogger`.
+            onUpdate (Callable[[dict], None], optional): Receives every summary.
+            minInterval (float, optional): Seconds between two summaries, progress records aside. Defaults to .5.
+        """
+        self.metrics = metrics
+        self.onUpdate = onUpdate
+        self.minInterval = minInterval
+
+        self.start = time.perf_counter()
+        self.results = 0
+        self.scraper = None
+        self.scraperStart = self.start
+        self.page = None
+        self.pages = None
+        self.stages = dict()
+        self._lastProgress = self.start
+        self._lastUpdate = 0
+
+    def apply(self, record) -> None:
+        """Update the metrics with a record of the result channel."""
+        now = time.perf_counter()
+        if record.kind in RESULT_KINDS:
+            self.results += 1
+        elif record.kind == 'progress':
+            # A scraper starts with the end of the previous one, not with its first page
+            if record.scraper != self.scraper:
+                self.scraper, self.scraperStart = record.scraper, self._lastProgress
+            self._lastProgress = now
+            self.page = record.data.get('page')
+            self.pages = record.data.get('pages')
+            self.stages = record.data.get('stages', self.stages)
+
+        final = record.kind in ('done', 'error')
+        if final or record.kind == 'progress' or now - self._lastUpdate >= self.minInterval:
+            self._lastUpdate = now
+            self.update(final)
+
+    def eta(self) -> float | None:
+        """Seconds left for the running scraper, when its number of pages is known."""
+        if not self.page or not self.pages:
+            return None
+        elapsed = time.perf_counter() - self.scraperStart
+        return max(0., elapsed / self.page * (self.pages - self.page))
+
+    def summary(self) -> dict:
+        elapsed = time.perf_counter() - self.start
+        counters = self.stages.get('counters', {})
+        hits, misses = counters.get('cacheHits', 0), counters.get('cacheMisses', 0)
+        return {
+            'elapsed': round(elapsed, 2),
+            'results': self.results,
+            'resultsPerSecond': round(self.results / elapsed, 2) if elapsed > 0 else 0.,
+            'scraper': self.scraper,
+            'page': self.page,
+            'pages': self.pages,
+            'eta': None if (eta := self.eta()) is None else round(eta, 1),
+            'cacheHitRate': round(hits / (hits + misses), 3) if hits + misses else None,
+            'stages': self.stages.get('seconds', {}),
+        }
+
+    def update(self, final: bool = False) -> None:
+        summary = self.summary()
+        if self.metrics is not None:
+            try:
+                self.metrics.info(json.dumps({'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'final': final, **summary}))
+            except Exception as e:
+                logger.error(f'Failed to write the scan metrics: {e}', exc_info=True)
+        if self.onUpdate is not None:
+            self.onUpdate(summary)
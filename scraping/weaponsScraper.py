@@ -1,13 +1,18 @@
 import string
 import numpy as np
-from difflib import get_close_matches as getMatches
 
-from scraping.utils import weaponsID, itemsID
 from scraping.utils import (
-    screenshot, convertToBlackWhite, imageToString,
-    WindowsInputController
+    weaponsID, itemsID, weaponsIndex, itemsIndex,
+    nameResolver, ocrCache, weaponIcons
+)
+from scraping.utils import (
+    screenshot, screenshotRegions, convertToBlackWhite, imageToString,
+    imagesToStrings, digitRecognizer, rarityClassifier,
+    GridPipeline, capturePage, cropThumbnail, passesThresholds, thresholdVerdict,
+    PageStore, pageFingerprint, getChannel, WindowsInputController
 )
 from game.screenInfo import ScreenInfo
+from game.gameROI import OCR_MODES
 from properties.config import cfg
 
 # Constants
@@ -15,8 +20,8 @@ ROWS, COLS = 4, 6
 WEAPON_ASCENSION_LEVELS = [20, 40, 50, 60, 70, 80, 90]
 
 def getWeaponPages(screenInfo: ScreenInfo) -> int:
-    image = convertToBlackWhite(screenshot(width=screenInfo.width, height=screenInfo.height, monitor=screenInfo.monitor)[screenInfo.weapons.page.y:screenInfo.weapons.page.y + screenInfo.weapons.page.h, screenInfo.weapons.page.x:screenInfo.weapons.page.x + screenInfo.weapons.page.w])
-    weaponCount = imageToString(image, '', allowedChars=string.digits + '/').split('/')[0]
+    image = screenshot(screenInfo.weapons.page.x, screenInfo.weapons.page.y, screenInfo.weapons.page.w, screenInfo.weapons.page.h, screenInfo.monitor, True)
+    weaponCount = imageToString(image, '', allowedChars=string.digits + '/', mode=OCR_MODES['weapons.page']).split('/')[0]
     try:
         return int(weaponCount), int(np.ceil(int(weaponCount) / 24))
     except ValueError:
@@ -41,34 +46,78 @@ def processWeapon(name: str, levelText: str, rankText: str) -> dict[str, dict[st
         }
     }
 
-def processGridItem(inventory: dict, weapons: list, image: np.ndarray, screenInfo: ScreenInfo, _cache: dict) -> tuple[dict[str, int], list[dict[str, dict[str, int]]]]:
+def processGridItem(inventory: dict, weapons: list, images: dict[str, np.ndarray], screenInfo: ScreenInfo, _cache: dict, name: str = None) -> tuple[dict[str, int], list[dict[str, dict[str, int]]]]:
+    """`name` is the name already identified from the thumbnail icon, if any, which spares the name OCR."""
 
-    nameImage = image[screenInfo.weapons.name.y:screenInfo.weapons.name.y + screenInfo.weapons.name.h, screenInfo.weapons.name.x:screenInfo.weapons.name.x + screenInfo.weapons.name.w]
+    nameImage = images['name']
     nameImage = convertToBlackWhite(nameImage)
-    nameHash = hash(nameImage.tobytes())
-
-    if nameHash in _cache:
-        name = _cache[nameHash]
-    else:
-        name = imageToString(nameImage, '', bannedChars=' ').lower()
-        result = getMatches(name, weaponsID, 1, 0.9)
-        if not result:
-            result = getMatches(name, itemsID, 1, 0.9)
-            if not result:
-                result = [name]
-        
-        _cache[nameHash] = result[0]
-        name = result[0]
+    nameHash = _cache.key('weapons.name', nameImage)
+
+    valueImage = images['value']
+    valueImage = convertToBlackWhite(valueImage)
+    valueHash = _cache.key('weapons.value', valueImage)
+
+    levelImage = images['level']
+    # levelImage = convertToBlackWhite(levelImage)
+    levelHash = _cache.key('weapons.level', levelImage)
+
+    rankImage = images['rank']
+    rankImage = convertToBlackWhite(rankImage)
+    rankHash = _cache.key('weapons.rank', rankImage)
+
+    # Whether the cell is an item or a weapon is only known after the name is read,
+    # so every uncached field is recognized in the same OCR pass.
+    # A weapon below the minimum rarity is never kept, so the colour of the panel
+    # header spares its level and rank, read later only if the colour was wrong.
+    rarity = rarityClassifier.classify(images['name'], default=None)
+    lowRarity = rarity is not None and rarity < cfg.get(cfg.weaponsMinRarity)
+    pending = {
+        key: roiImage for key, roiImage, roiHash in (
+            ('name', nameImage, nameHash),
+            ('value', valueImage, valueHash),
+            ('level', levelImage, levelHash),
+            ('rank', rankImage, rankHash)
+        ) if roiHash not in _cache and not (lowRarity and key in ('level', 'rank')) and not (name and key == 'name')
+    }
+    options = {
+        'name': {'divisor': '', 'bannedChars': ' ', 'mode': OCR_MODES['weapons.name']},
+        'value': {'divisor': '', 'allowedChars': string.digits, 'mode': OCR_MODES['weapons.value']},
+        'level': {'divisor': '', 'allowedChars': string.digits + '/', 'mode': OCR_MODES['weapons.level']},
+        'rank': {'divisor': '', 'allowedChars': string.digits, 'mode': OCR_MODES['weapons.rank']}
+    }
+
+    texts = dict()
+    for key in ('value', 'level', 'rank'):
+        if key in pending:
+            text = digitRecognizer.read(pending[key], (screenInfo.width, screenInfo.height, f'weapons.{key}'), options[key]['allowedChars'])
+            if text is not None:
+                texts[key] = text
+                del pending[key]
+
+    ocrTexts = imagesToStrings(pending, options)
+    for key in ('value', 'level', 'rank'):
+        if key in pending:
+            digitRecognizer.learn(pending[key], (screenInfo.width, screenInfo.height, f'weapons.{key}'), ocrTexts[key])
+    texts.update(ocrTexts)
+
+    def readText(key: str, roiImage: np.ndarray) -> str:
+        if key not in texts:
+            texts[key] = imagesToStrings({key: roiImage}, options)[key]
+        return texts[key]
+
+    if not name:
+        if nameHash in _cache:
+            name = _cache[nameHash]
+        else:
+            name = texts['name'].lower()
+            name = nameResolver.resolve(name, weaponsIndex) or nameResolver.resolve(name, itemsIndex) or name
+            _cache[nameHash] = name
     
     if name in itemsID:
-        valueImage = image[screenInfo.weapons.value.y:screenInfo.weapons.value.y + screenInfo.weapons.value.h, screenInfo.weapons.value.x:screenInfo.weapons.value.x + screenInfo.weapons.value.w]
-        valueImage = convertToBlackWhite(valueImage)
-        valueHash = hash(valueImage.tobytes())
-
         if valueHash in _cache:
             valueText = _cache[valueHash]
         else:
-            valueText = imageToString(valueImage, '', allowedChars=string.digits)
+            valueText = texts['value']
             _cache[valueHash] = valueText
         
         itemID, value = processItem(name, valueText)
@@ -76,62 +125,117 @@ def processGridItem(inventory: dict, weapons: list, image: np.ndarray, screenInf
         return True
     elif name in weaponsID:
         if weaponsID[name]['rarity'] >= cfg.get(cfg.weaponsMinRarity):
-            levelImage = image[screenInfo.weapons.level.y:screenInfo.weapons.level.y + screenInfo.weapons.level.h, screenInfo.weapons.level.x:screenInfo.weapons.level.x + screenInfo.weapons.level.w]
-            # levelImage = convertToBlackWhite(levelImage)
-            levelHash = hash(levelImage.tobytes())
-
             if levelHash in _cache:
                 levelText = _cache[levelHash]
             else:
-                levelText = imageToString(levelImage, '', allowedChars=string.digits + '/')
+                levelText = readText('level', levelImage)
                 _cache[levelHash] = levelText
             
             if int(levelText.split('/')[0]) >= cfg.get(cfg.weaponsMinLevel):
-                rankImage = image[screenInfo.weapons.rank.y:screenInfo.weapons.rank.y + screenInfo.weapons.rank.h, screenInfo.weapons.rank.x:screenInfo.weapons.rank.x + screenInfo.weapons.rank.w]
-                rankImage = convertToBlackWhite(rankImage)
-                rankHash = hash(rankImage.tobytes())
-
                 if rankHash in _cache:
                     rankText = _cache[rankHash]
                 else:
-                    rankText = imageToString(rankImage, '', allowedChars=string.digits)
+                    rankText = readText('rank', rankImage)
                     _cache[rankHash] = rankText
                 weapons.append(processWeapon(name, levelText, rankText))
                 return True
         return False
     return True
 
-def weaponScraper(controller: WindowsInputController, x: float, y: float, screenInfo: ScreenInfo) -> tuple[dict[str, int], list[dict[str, dict[str, int]]]]:
-    inventory = dict()
-    weapons = list()
-    _cache = dict()
+def recognizeGridItem(images: dict[str, np.ndarray], screenInfo: ScreenInfo, _cache: dict, name: str = None) -> tuple[bool, tuple[dict[str, int], list[dict[str, dict[str, int]]]]]:
+    inventory, weapons = dict(), list()
+    continueScraping = processGridItem(inventory, weapons, images, screenInfo, _cache, name)
+    return continueScraping, (inventory, weapons)
+
+def weaponScraper(controller: WindowsInputController, x: float, y: float, screenInfo: ScreenInfo, pageStore: PageStore = None) -> list[str]:
+    _cache = ocrCache
+    pageStore = pageStore or PageStore()
+    # Only the detail panel is read for each cell
+    rois = {key: getattr(screenInfo.weapons, key) for key in ('name', 'value', 'level', 'rank')}
 
-    controller.pressKey(cfg.get(cfg.inventoryKeybind), 2, False)
-    controller.leftClick(x, y)
+    controller.pressKey(cfg.get(cfg.inventoryKeybind), 2, False, region=screenInfo.weapons.start)
+    controller.leftClick(x, y, region=screenInfo.weapons.page)
 
     weaponCount, pages = getWeaponPages(screenInfo)
-    continueScraping = False
-
-    for page in range(pages):
-        for row in range(ROWS):
-            for col in range(COLS):
-                if page == pages - 1 and (page * (ROWS * COLS) + row * COLS + col) > (page * 24) + (weaponCount % 24):
-                    del _cache
-                    return inventory, weapons
-
-                center_x = screenInfo.weapons.start.x + (col * (screenInfo.weapons.start.w + screenInfo.offsets.page.x)) + screenInfo.weapons.start.w // 2
-                center_y = screenInfo.weapons.start.y + (row * (screenInfo.weapons.start.h + screenInfo.offsets.page.y)) + screenInfo.weapons.start.h // 2
-                
-                controller.leftClick(center_x, center_y)
-                image = screenshot(width=screenInfo.width, height=screenInfo.height, monitor=screenInfo.monitor)
-                
-                continueScraping = processGridItem(inventory, weapons, image, screenInfo, _cache)
-                if not continueScraping:
-                    del _cache
-                    return inventory, weapons
-
-        if page < pages - 1 and continueScraping:
-            controller.mouseScroll(screenInfo.scroll.page.y, 1.2)
-
-    del _cache
-    return inventory, weapons
\ No newline at end of file
+    continueScraping = True
+    # Results of the pages still being recognized, the inventory as pairs so that it is stored as is
+    pageResults = dict()
+    fingerprints = dict()
+    # Fingerprints of the pages sent, in order
+    sent = list()
+
+    def recognize(page: int, *args) -> tuple[bool, tuple]:
+        continueScraping, (cellInventory, cellWeapons) = recognizeGridItem(*args)
+        return continueScraping, (page, continueScraping, cellInventory, cellWeapons)
+
+    def collect(result: tuple[int, bool, dict[str, int], list[dict[str, dict[str, int]]]]):
+        page, continueScraping, cellInventory, cellWeapons = result
+        pageResults[page]['inventory'].extend(cellInventory.items())
+        pageResults[page]['weapons'].extend(cellWeapons)
+        pageResults[page]['stop'] = pageResults[page]['stop'] or not continueScraping
+
+    # The cells are recognized by the workers while the next ones are clicked
+    with GridPipeline(recognize, collect) as pipeline:
+        for page in range(pages):
+            if not continueScraping:
+                break
+            # Cells failing the thresholds on their thumbnail are never clicked
+            thumbnails = capturePage(screenInfo, screenInfo.weapons.start, ROWS, COLS)
+
+            # A page identical to the previous scan is not clicked through again
+            fingerprint = pageFingerprint(thumbnails, screenInfo, cfg.get(cfg.weaponsMinRarity), cfg.get(cfg.weaponsMinLevel))
+            previous = pageStore.get('weapons', fingerprint)
+            if previous is not None:
+                pageResults[page] = previous
+                continueScraping = not previous['stop']
+            else:
+                pageResults[page] = {'inventory': [], 'weapons': [], 'stop': False}
+                fingerprints[page] = fingerprint
+
+                # Cells identified by their icon skip the name OCR
+                cells = list(thumbnails)
+                names = dict(zip(cells, weaponIcons.match([cropThumbnail(thumbnails[cell], screenInfo.thumbnail.icon) for cell in cells])))
+                inspected = 0
+                for row in range(ROWS):
+                    for col in range(COLS):
+                        if not continueScraping or (page == pages - 1 and (page * (ROWS * COLS) + row * COLS + col) > (page * 24) + (weaponCount % 24)):
+                            break
+                        # Items are kept whatever their rarity, so only a cell known to hold a weapon is skipped
+                        if names[row, col] in weaponsID and not passesThresholds(thumbnails[row, col], screenInfo, cfg.get(cfg.weaponsMinRarity)):
+                            continue
+                        inspected += 1
+
+                        center_x = screenInfo.weapons.start.x + (col * (screenInfo.weapons.start.w + screenInfo.offsets.page.x)) + screenInfo.weapons.start.w // 2
+                        center_y = screenInfo.weapons.start.y + (row * (screenInfo.weapons.start.h + screenInfo.offsets.page.y)) + screenInfo.weapons.start.h // 2
+                        
+                        controller.leftClick(center_x, center_y, region=screenInfo.weapons.name)
+                        images = screenshotRegions(rois, screenInfo.monitor, copy=True)
+                        
+                        continueScraping = pipeline.submit(page, images, screenInfo, _cache, names[row, col])
+                        # A weapon below a threshold ends the scan, so no cell is clicked past one until it is recognized.
+                        # Items never end it, nor do weapons whose thumbnail shows both thresholds passed.
+                        if continueScraping and names[row, col] not in itemsID and thresholdVerdict(
+                            thumbnails[row, col], screenInfo, cfg.get(cfg.weaponsMinRarity), cfg.get(cfg.weaponsMinLevel)
+                        ) is not True:
+                            continueScraping = pipeline.drain()
+
+                # The grid is sorted by rarity, so a page of weapons all below the minimum ends the scan
+                if not inspected:
+                    pageResults[page]['stop'] = True
+                    continueScraping = False
+
+            if page < pages - 1 and continueScraping:
+                controller.mouseScroll(screenInfo.scroll.page.y, 1.2, region=screenInfo.weapons.start)
+
+            # The page is complete once its last cells are recognized, which overlaps the scroll
+            continueScraping = pipeline.drain() and continueScraping
+            if page in fingerprints:
+                pageStore.put('weapons', fingerprints[page], pageResults[page])
+            getChannel().results('weapons', pageResults[page])
+            getChannel().progress('weapons', page + 1, pages)
+            # Sent and stored, the page isn't kept in this process
+            del pageResults[page]
+            sent.append(fingerprint)
+
+    _cache.flush()
+    return sent
@@ -1,8 +1,9 @@
 import os
 import logging
+import multiprocessing
 from pathlib import Path
 
-from PySide6.QtCore import Qt, Signal
+from PySide6.QtCore import Qt, QThread, Signal
 from PySide6.QtGui import QPixmap, QImage
 from PySide6.QtWidgets import (
 	QHBoxLayout, QVBoxLayout, QFrame,
@@ -18,10 +19,42 @@ from qfluentwidgets import (
 
 from properties.config import cfg, FAILED, INVENTORY
 from scraping.scraperExectuter import startScraper
-from scraping.utils import itemsID, savingScraped
+from scraping.scraperManager import applyResults
+from scraping.utils import itemsID, savingScraped, nameResolver
 
 logger = logging.getLogger('HomeInterface')
 
+class ScraperThread(QThread):
+	"""
+	Runs the scan outside the UI thread, relaying its telemetry.
+
+	The results are kept until the UI thread applies them, as the inventory
+	is also changed by the manual recognition.
+	"""
+	telemetryUpdated = Signal(dict)
+	scanFinished = Signal(tuple)
+
+	def __init__(self, parent=None):
+		super().__init__(parent)
+		self.results = None
+		self.stopFLAG = multiprocessing.Event()
+
+	def run(self):
+		try:
+			notification = startScraper(self.telemetryUpdated.emit, self.keepResults, self.stopFLAG)
+		except Exception as e:
+			logger.error(f"Error running the scan: {e}", exc_info=True)
+			notification = ('error', 'Error', str(e))
+		self.scanFinished.emit(tuple(notification or ()))
+
+	def keepResults(self, *results):
+		"""Keep the date, inventory and failed items of the scan for `applyResults`."""
+		self.results = results
+
+	def stop(self):
+		"""Stop the scan, as the stop key would."""
+		self.stopFLAG.set()
+
 class HomeInterface(QWidget):
 	"""Main Widget with Control Panel on the left and other widgets on the right."""
 	updateUISignal = Signal()
@@ -34,10 +67,15 @@ class HomeInterface(QWidget):
 		self.lControlPanel.signalNotifier.connect(self.showNotification)
 
 		self.tControlPanel = TControlPanel(self)
+		self.telemetryPanel = TelemetryPanel(self)
+		self.lControlPanel.telemetryUpdated.connect(self.telemetryPanel.updateTelemetry)
 		self.rightWidget = QWidget(self)
+		# The manual recognition changes the inventory, so it waits for the scan
+		self.lControlPanel.scanningChanged.connect(self.rightWidget.setDisabled)
 
 		self.rightSide = QVBoxLayout()
 		self.rightSide.addWidget(self.tControlPanel)
+		self.rightSide.addWidget(self.telemetryPanel)
 		self.rightSide.addWidget(self.rightWidget)
 
 		self.hBoxLayout = QHBoxLayout(self)
@@ -130,11 +168,14 @@ class HomeInterface(QWidget):
 
 		selected_item = self.list_widget.currentItem()
 		if selected_item:
-			item_id = itemsID.get(selected_item.text().lower().replace(' ', ''))['id']
+			name = selected_item.text().lower().replace(' ', '')
+			item_id = itemsID.get(name)['id']
 			INVENTORY['items'][item_id] = self.owned_spinbox.value()
 			savingScraped(START_DATE=INVENTORY['date'])
 		
 			if FAILED:
+				nameResolver.learn(FAILED[0].get('name'), name)
+				nameResolver.flush()
 				FAILED.pop(0)
 			
 			self.updateUISignal.emit()
@@ -194,9 +235,12 @@ class HomeInterface(QWidget):
 class LControlPanel(QFrame):
 	"""Left Control Panel Interface."""
 	signalNotifier = Signal(str, str, str)
+	telemetryUpdated = Signal(dict)
+	scanningChanged = Signal(bool)
 
 	def __init__(self, parent=None):
 		super().__init__(parent=parent)
+		self.scraperThread = None
 		self.__initUI()
 
 	def __initUI(self):
@@ -305,13 +349,39 @@ class LControlPanel(QFrame):
 		self.scanResources.setDisabled(not enabled)
 
 	def runScraper(self):
-		"""Run the scraper and emit notifications if needed."""
-
-		notification = startScraper()
+		"""Run the scraper in the background, the telemetry being relayed while it runs."""
+		if self.scraperThread is not None and self.scraperThread.isRunning():
+			return
+
+		self.startScanning.setDisabled(True)
+		self.scanningChanged.emit(True)
+		self.scraperThread = ScraperThread(self)
+		self.scraperThread.telemetryUpdated.connect(self.telemetryUpdated.emit)
+		self.scraperThread.scanFinished.connect(self.onScanFinished)
+		self.scraperThread.start()
+
+	def onScanFinished(self, notification: tuple):
+		"""Apply the results of the completed scan, and emit its notification, if any."""
+		self.applyScanResults()
+		self.startScanning.setDisabled(False)
+		self.scanningChanged.emit(False)
 		if notification:
 			logger.debug(f"Notification: {notification}")
 			self.signalNotifier.emit(notification[0], notification[1], notification[2])
 
+	def applyScanResults(self):
+		"""Apply the results kept by the scraper thread, once."""
+		if self.scraperThread is not None and self.scraperThread.results is not None:
+			applyResults(*self.scraperThread.results)
+			self.scraperThread.results = None
+
+	def stopScan(self):
+		"""Stop the running scan and wait for its thread, e.g. before the window closes."""
+		if self.scraperThread is not None and self.scraperThread.isRunning():
+			self.scraperThread.stop()
+			self.scraperThread.wait()
+			self.applyScanResults()
+
 	def openFolder(self):
 		"""Open the export folder."""
 		path = Path(cfg.get(cfg.exportFolder))
@@ -404,3 +474,47 @@ class TControlPanel(QFrame):
 		cfg.weaponsMinLevel.value = self.weaponsMinLevel.value()
 		cfg.weaponsMinRarity.value = self.weaponsMinRarity.value()
 		cfg.save()
+
+class TelemetryPanel(QFrame):
+	"""Live throughput and stage timings of the running scan."""
+
+	def __init__(self, parent=None):
+		super().__init__(parent=parent)
+		self.__initUI()
+
+	def __initUI(self):
+		"""Initialize UI components and layout."""
+		self.progressLabel = BodyLabel(self)
+		self.throughputLabel = BodyLabel(self)
+		self.cacheLabel = BodyLabel(self)
+		self.stagesLabel = BodyLabel(self)
+
+		self.panelLayout = QVBoxLayout(self)
+		self.panelLayout.setSpacing(4)
+		self.panelLayout.setContentsMargins(14, 8, 14, 8)
+		self.panelLayout.addWidget(self.progressLabel)
+		self.panelLayout.addWidget(self.throughputLabel)
+		self.panelLayout.addWidget(self.cacheLabel)
+		self.panelLayout.addWidget(self.stagesLabel)
+
+		self.hide()
+
+	def updateTelemetry(self, summary: dict):
+		"""Show a summary of `ScanTelemetry`."""
+		progress = 'Starting...'
+		if summary.get('scraper'):
+			page = f"page {summary['page']}" + (f" of {summary['pages']}" if summary.get('pages') else '')
+			progress = f"{summary['scraper'].capitalize()}, {page}"
+			if summary.get('eta') is not None:
+				progress += f" - {int(summary['eta'] // 60)}:{int(summary['eta'] % 60):02d} left"
+		self.progressLabel.setText(progress)
+
+		self.throughputLabel.setText(f"{summary['results']} results, {summary['resultsPerSecond']:.2f}/s in {summary['elapsed']:.0f}s")
+
+		hitRate = summary.get('cacheHitRate')
+		self.cacheLabel.setText(f"OCR cache hit rate: {'-' if hitRate is None else f'{hitRate:.0%}'}")
+
+		stages = summary.get('stages') or {}
+		self.stagesLabel.setText('Stages: ' + (', '.join(f'{stage} {seconds:.1f}s' for stage, seconds in stages.items()) or '-'))
+
+		self.show()
@@ -10,9 +10,7 @@ from qfluentwidgets import (
 )
 
 from properties.config import basePATH
-from ui.mainUI import WuWaInventoryKamera
-from updater.databaseUpdater import DataUpdater
-from updater.assetsUpdater import AssetsUpdater
+from properties.profiler import startupProfiler
 
 logger = logging.getLogger('LoadingScreen')
 
@@ -22,14 +20,18 @@ class DataUpdaterThread(QThread):
 
 	def __init__(self):
 		super().__init__()
-		self.dataUpdater = DataUpdater()
-		self.dataUpdater.updateProgress.connect(self.updateProgress.emit)
-		self.dataUpdater.updateFinished.connect(self.updateFinished.emit)
+		self.dataUpdater = None
 		logger.debug("DataUpdaterThread initialized")
 
 	def run(self):
 		logger.info("Starting data update process")
 		try:
+			# The updater pulls in the scraping modules, imported here rather than before the first paint
+			from updater.databaseUpdater import DataUpdater
+
+			self.dataUpdater = DataUpdater()
+			self.dataUpdater.updateProgress.connect(self.updateProgress.emit)
+			self.dataUpdater.updateFinished.connect(self.updateFinished.emit)
 			self.dataUpdater.run()
 			logger.info("Data update process completed successfully")
 		except Exception as e:
@@ -41,14 +43,17 @@ class AssetsUpdaterThread(QThread):
 
 	def __init__(self):
 		super().__init__()
-		self.assetsUpdater = AssetsUpdater()
-		self.assetsUpdater.updateProgress.connect(self.updateProgress.emit)
-		self.assetsUpdater.updateFinished.connect(self.updateFinished.emit)
+		self.assetsUpdater = None
 		logger.debug("AssetsUpdaterThread initialized")
 
 	def run(self):
 		logger.info("Starting assets update process")
 		try:
+			from updater.assetsUpdater import AssetsUpdater
+
+			self.assetsUpdater = AssetsUpdater()
+			self.assetsUpdater.updateProgress.connect(self.updateProgress.emit)
+			self.assetsUpdater.updateFinished.connect(self.updateFinished.emit)
 			self.assetsUpdater.run()
 			logger.info("Assets update process completed successfully")
 		except Exception as e:
@@ -118,8 +123,13 @@ class LoadingScreen(QWidget):
 		logger.info("Data update finished, transitioning to main window")
 		self.close()
 		try:
+			from ui.mainUI import WuWaInventoryKamera
+
 			self.main_window = WuWaInventoryKamera()
 			self.main_window.show()
 			logger.info("Main window displayed successfully")
 		except Exception as e:
-			logger.error(f"Error initializing main window: {e}", exc_info=True)
\ No newline at end of file
+			logger.error(f"Error initializing main window: {e}", exc_info=True)
+
+		startupProfiler.mark('Main window shown')
+		startupProfiler.finish(basePATH / 'logs' / 'startup-profile.log')
\ No newline at end of file
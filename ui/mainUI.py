@@ -58,6 +58,11 @@ class WuWaInventoryKamera(MSFluentWindow):
 		desktop = QApplication.primaryScreen().availableGeometry()
 		self.move(desktop.width() // 2 - self.width() // 2, desktop.height() // 2 - self.height() // 2)
 
+	def closeEvent(self, event):
+		"""Stop a running scan first, as its thread can't outlive the window."""
+		self.homeInterface.lControlPanel.stopScan()
+		super().closeEvent(event)
+
 	def warningInfoBar(self):
 		"""Display a warning InfoBar if the application is not run as an administrator."""
 		if not isUserAdmin():
@@ -9,7 +9,7 @@ from qfluentwidgets import (
 	SettingCardGroup, SwitchSettingCard, PushSettingCard,
 	HyperlinkCard, PrimaryPushSettingCard, ScrollArea,
 	ExpandLayout, InfoBar, ComboBoxSettingCard, BodyLabel,
-	OptionsSettingCard, Theme, setTheme
+	OptionsSettingCard, RangeSettingCard, Theme, setTheme
 )
 
 from ui.custom_widgets import FieldSettingCard
@@ -105,6 +105,31 @@ class SettingInterface(ScrollArea):
 			self.inGameGroup
 		)
 
+		# Scanner
+		self.scannerGroup = SettingCardGroup(self.tr("Scanner"), self.scrollWidget)
+		self.deltaScanCard = SwitchSettingCard(
+			FIF.SYNC,
+			self.tr('Delta scan'),
+			self.tr('Skip the weapon and echo pages unchanged since the last scan. Weapon rank and echo tuning changes are not detected'),
+			configItem=cfg.deltaScan,
+			parent=self.scannerGroup
+		)
+		self.ocrWorkersCard = RangeSettingCard(
+			cfg.ocrWorkers,
+			FIF.SPEED_HIGH,
+			self.tr('OCR workers'),
+			self.tr('Text recognition threads, 0 for one per physical core'),
+			parent=self.scannerGroup
+		)
+		self.achievementsModeCard = ComboBoxSettingCard(
+			cfg.achievementsMode,
+			FIF.CERTIFICATE,
+			self.tr('Achievements scan'),
+			self.tr('Search every achievement, or read the lists of each category'),
+			[self.tr('Search'), self.tr('List')],
+			self.scannerGroup
+		)
+
 		# Software update
 		self.updateSoftwareGroup = SettingCardGroup(self.tr("Software update"), self.scrollWidget)
 		self.updateOnStartUpCard = SwitchSettingCard(
@@ -151,6 +176,9 @@ class SettingInterface(ScrollArea):
 		self.inGameGroup.addSettingCard(self.languageGame)
 		self.inGameGroup.addSettingCard(self.inventoryKey)
 		self.inGameGroup.addSettingCard(self.resonatorKey)
+		self.scannerGroup.addSettingCard(self.deltaScanCard)
+		self.scannerGroup.addSettingCard(self.ocrWorkersCard)
+		self.scannerGroup.addSettingCard(self.achievementsModeCard)
 		self.updateSoftwareGroup.addSettingCard(self.updateOnStartUpCard)
 		self.aboutGroup.addSettingCard(self.helpCard)
 		self.aboutGroup.addSettingCard(self.feedbackCard)
@@ -160,6 +188,7 @@ class SettingInterface(ScrollArea):
 		self.expandLayout.setContentsMargins(60, 10, 60, 0)
 		self.expandLayout.addWidget(self.personalizationGroup)
 		self.expandLayout.addWidget(self.inGameGroup)
+		self.expandLayout.addWidget(self.scannerGroup)
 		self.expandLayout.addWidget(self.updateSoftwareGroup)
 		self.expandLayout.addWidget(self.aboutGroup)
 
@@ -6,6 +6,7 @@ from dataclasses import dataclass
 from PySide6.QtCore import QObject, Signal
 
 from properties.config import basePATH
+from scraping.utils.icons import IconIndex, buildIconIndex
 
 logger = logging.getLogger('AssetsUpdater')
 
@@ -49,6 +50,7 @@ class AssetsUpdater(QObject):
 			path='/'.join(self.pathConfig.folder)
 		)
 
+		downloaded = False
 		for folder in self.pathConfig.sub:
 			path: Path = basePATH / 'assets' / folder
 			self.makeFolder(path)
@@ -66,8 +68,16 @@ class AssetsUpdater(QObject):
 								filePath,
 								reporthook=lambda block_num, block_size, total_size: self.reportProgress(f'{folder}/{data["name"]}', block_num, block_size, total_size)
 							)
+							downloaded = True
 						except Exception as e:
 							logger.error(f'Failed while downloading {folder}/{data["name"]}. Error: {e}')
+
+		# The icon descriptors are computed here once, scans only memory-map them
+		if downloaded or IconIndex(basePATH / 'assets').isStale():
+			try:
+				buildIconIndex(basePATH / 'assets')
+			except Exception as e:
+				logger.error(f'Failed to build the icon index. Error: {e}', exc_info=True)
 		self.updateFinished.emit()
 	
 	def reportProgress(self, file_name, block_num, block_size, total_size):
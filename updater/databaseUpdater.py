@@ -11,7 +11,7 @@ from properties.config import cfg
 from scraping.utils import (
 	itemsID, charactersID, weaponsID,
 	echoesID, achievementsID, echoStats,
-	definedText, sonataName
+	definedText, sonataName, compileDatabase
 )
 
 logger = logging.getLogger('DatabaseManager')
@@ -258,6 +258,13 @@ class DataUpdater(QObject):
 		except Exception as e:
 			logger.error(f'Failed to update definedText. Error: {e}', exc_info=True)
 
+	def compileDatabase(self):
+		# Read by the next launch, memory-mapped instead of parsing every JSON table
+		try:
+			compileDatabase(Path('data'))
+		except Exception as e:
+			logger.error(f'Failed to compile the ID database. Error: {e}', exc_info=True)
+
 	def run(self):
 		self.updateFiles()
 		if self.updated:
@@ -268,4 +275,5 @@ class DataUpdater(QObject):
 			self.updateAchievements()
 			self.updateCharacters()
 			self.updateEcho()
+		self.compileDatabase()
 		self.updateFinished.emit()
\ No newline at end of file